@@ -0,0 +1,49 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Un solo ejecutable para las cuatro herramientas. Se genera en modo carpeta (onedir):
+# pandas, numpy y pyproj quedan descomprimidos junto al .exe en vez de extraerse a una
+# carpeta temporal en cada inicio, como ocurre con los ejecutables de un solo archivo.
+
+
+a = Analysis(
+    ['0_Lanzador.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    # Las herramientas se importan con importlib al abrir su pestaña; PyInstaller no las ve solo.
+    hiddenimports=['1_Filtrar_DB', '2_1956_to_1984', '3_1969_to_1984', '4_Conversor_final', 'openpyxl', 'pyproj'],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=[],
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='Herramientas Derechos de Agua',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=True,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+    icon=['icon.ico'],
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=True,
+    upx_exclude=[],
+    name='Herramientas Derechos de Agua',
+)
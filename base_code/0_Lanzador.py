@@ -0,0 +1,181 @@
+"""
+Lanzador de la suite: una sola ventana con las cuatro herramientas como pestañas.
+
+La ventana aparece de inmediato, porque el lanzador sólo importa tkinter y la biblioteca
+estándar. Cada herramienta (y con ella pandas y numpy) se importa en un hilo aparte la
+primera vez que se abre su pestaña, que mientras tanto muestra un aviso. pyproj y openpyxl,
+que sólo se usan al transformar coordenadas o al leer/escribir Excel, se precargan en
+segundo plano cuando la herramienta que los usa ya está lista.
+
+Los tiempos de importación de cada módulo se muestran en la barra de estado. Para seguir
+el arranque entre versiones se pueden medir sin abrir la ventana, cada herramienta en un
+intérprete nuevo (ver también benchmark.py):
+
+    python 0_Lanzador.py --medir-arranque
+    python 0_Lanzador.py --medir-arranque --json arranque.json
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import queue
+import sys
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk
+
+from instrumentacion import importar_medido, medir_importaciones
+
+# Referencia para medir cuánto tarda en aparecer la ventana (sin contar el intérprete ni
+# estas importaciones, que --medir-arranque mide como '0_Lanzador').
+INICIO = time.perf_counter()
+
+# (pestaña, módulo, dependencias que se importan antes y se miden por separado, precarga posterior)
+HERRAMIENTAS = (
+    ("1. Filtrar Base de Datos", '1_Filtrar_DB', ('numpy', 'pandas'), ('openpyxl',)),
+    ("2. Datum 1956 a 1984", '2_1956_to_1984', ('numpy', 'pandas'), ('pyproj',)),
+    ("3. Datum 1969 a 1984", '3_1969_to_1984', ('numpy', 'pandas'), ('pyproj',)),
+    ("4. Unificar Archivos", '4_Conversor_final', ('numpy', 'pandas'), ('openpyxl',)),
+)
+
+
+def cargar_modulos(pedidos: queue.Queue, respuestas: queue.Queue):
+    """
+    Atiende los pedidos de importación de a uno, en un hilo aparte. Cada pedido es
+    (índice de la herramienta o None, módulos); la respuesta lleva el último módulo
+    importado, las medidas y el error, si lo hubo.
+    """
+    while True:
+        indice, modulos = pedidos.get()
+        modulo, medidas, error = None, [], None
+        try:
+            for nombre in modulos:
+                modulo, medida = importar_medido(nombre)
+                medidas.append(medida)
+        except Exception as e:
+            error = e
+        respuestas.put((indice, modulo, medidas, error))
+
+
+class Lanzador(tk.Tk):
+    def __init__(self):
+        super().__init__()
+        self.title("Herramientas de Derechos de Agua")
+        self.geometry("820x900")
+
+        self.style = ttk.Style(self)
+        self.style.theme_use('clam')
+        self.style.configure('TButton', font=('Helvetica', 10))
+        self.style.configure('TLabel', font=('Helvetica', 10))
+        self.style.configure('TEntry', font=('Helvetica', 10))
+        self.style.configure('TLabelframe.Label', font=('Helvetica', 11, 'bold'))
+        self.style.configure('Accent.TButton', font=('Helvetica', 10, 'bold'))
+
+        self.estado = tk.StringVar(value="Iniciando...")
+        # Medidas de importación en el orden en que ocurrieron (sólo los módulos nuevos).
+        self.tiempos: list[dict] = []
+        self.segundos_ventana = None
+        self.cargadas: dict[int, str] = {}  # índice -> 'cargando', 'lista' o 'error'
+        self.pedidos: queue.Queue = queue.Queue()
+        self.respuestas: queue.Queue = queue.Queue()
+        threading.Thread(target=cargar_modulos, args=(self.pedidos, self.respuestas), daemon=True).start()
+
+        ttk.Label(self, textvariable=self.estado, anchor=tk.W, padding=(8, 2)).pack(side=tk.BOTTOM, fill=tk.X)
+        self.cuaderno = ttk.Notebook(self)
+        self.cuaderno.pack(fill=tk.BOTH, expand=True)
+        self.pestanas = []
+        for titulo, modulo, _, _ in HERRAMIENTAS:
+            pestana = ttk.Frame(self.cuaderno)
+            ttk.Label(pestana, text="⏳ Cargando la herramienta...", anchor=tk.CENTER).pack(fill=tk.BOTH, expand=True)
+            self.cuaderno.add(pestana, text=titulo)
+            self.pestanas.append(pestana)
+        self.cuaderno.bind('<<NotebookTabChanged>>', self.al_cambiar_pestana)
+
+        self.after_idle(self.ventana_visible)
+        self.after(100, self.procesar_respuestas)
+
+    def ventana_visible(self):
+        self.segundos_ventana = time.perf_counter() - INICIO
+        self.al_cambiar_pestana()
+        self.actualizar_estado()
+
+    def al_cambiar_pestana(self, event=None):
+        """Pide la herramienta de la pestaña visible si todavía no se cargó."""
+        indice = self.cuaderno.index(self.cuaderno.select())
+        if indice in self.cargadas:
+            return
+        self.cargadas[indice] = 'cargando'
+        _, modulo, dependencias, _ = HERRAMIENTAS[indice]
+        self.pedidos.put((indice, (*dependencias, modulo)))
+
+    def procesar_respuestas(self):
+        while not self.respuestas.empty():
+            indice, modulo, medidas, error = self.respuestas.get()
+            self.tiempos.extend(m for m in medidas if not m['ya_cargado'])
+            if indice is not None:
+                self.mostrar_herramienta(indice, modulo, error)
+            self.actualizar_estado()
+        self.after(100, self.procesar_respuestas)
+
+    def mostrar_herramienta(self, indice: int, modulo, error: Exception | None):
+        pestana = self.pestanas[indice]
+        for hijo in pestana.winfo_children():
+            hijo.destroy()
+        if error is not None:
+            self.cargadas[indice] = 'error'
+            ttk.Label(pestana, text=f"❌ No se pudo cargar la herramienta: {error}", anchor=tk.CENTER).pack(fill=tk.BOTH, expand=True)
+            return
+        modulo.Herramienta(pestana).pack(fill=tk.BOTH, expand=True)
+        self.cargadas[indice] = 'lista'
+        precarga = HERRAMIENTAS[indice][3]
+        if precarga:
+            self.pedidos.put((None, precarga))
+
+    def actualizar_estado(self):
+        partes = []
+        if self.segundos_ventana is not None:
+            partes.append(f"Ventana: {self.segundos_ventana:.2f} s")
+        partes += [f"{m['modulo']}: {m['segundos']:.2f} s" for m in self.tiempos]
+        if 'cargando' in self.cargadas.values():
+            partes.append("cargando...")
+        self.estado.set("⏱️ " + " · ".join(partes))
+
+
+# --- MEDICIÓN DEL ARRANQUE ---
+def medir_arranque() -> dict:
+    """
+    Mide, cada uno en un intérprete nuevo, el lanzador (hasta poder abrir la ventana) y cada
+    herramienta con sus dependencias y su precarga.
+    """
+    resultados = {'0_Lanzador': medir_importaciones(['0_Lanzador'])}
+    for _, modulo, dependencias, precarga in HERRAMIENTAS:
+        resultados[modulo] = medir_importaciones(['0_Lanzador', *dependencias, modulo, *precarga])[1:]
+    return resultados
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Abre las herramientas de la suite en una sola ventana.")
+    parser.add_argument('--medir-arranque', action='store_true', help="Mide el tiempo de importación de cada herramienta sin abrir la ventana.")
+    parser.add_argument('--json', metavar='ARCHIVO', help="Con --medir-arranque, guarda las medidas en este JSON.")
+    args = parser.parse_args(argv)
+
+    if not args.medir_arranque:
+        Lanzador().mainloop()
+        return 0
+
+    resultados = medir_arranque()
+    for herramienta, medidas in resultados.items():
+        total = sum(m['segundos'] for m in medidas)
+        print(f"{herramienta:<20} {total:>7.3f} s  " + "  ".join(f"{m['modulo']} {m['segundos']:.3f}" for m in medidas))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'python': platform.python_version(), 'plataforma': platform.platform(), 'herramientas': resultados},
+                      f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    # Necesario para el modo en paralelo de los conversores en el ejecutable de PyInstaller.
+    multiprocessing.freeze_support()
+    sys.exit(main())
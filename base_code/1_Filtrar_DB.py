@@ -6,6 +6,16 @@ from tkinter import ttk, filedialog, scrolledtext
 import threading
 import queue
 import os
+import hashlib
+import json
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from registro import CanalRegistro, mostrar_en_registro
+from expresiones import COMPARADORES, ExpresionFiltro, compilar_expresion, normalizar_nombre, resolver_campo
+from filtro_espacial import IndiceGrilla, coordenadas_en_wgs84, mascara_espacial, validar_espacial
+from instrumentacion import MedidorEtapas, ruta_informe
+from intercambio import abrir_texto, guardar_intermedio, nombre_archivo
+from transformacion import clasificar_datum
 
 # --- CONFIGURACIÓN DE COLUMNAS ---
 COL_EXPEDIENTE = 'Código de \nExpediente'
@@ -18,31 +28,201 @@ COL_CAUDAL = 'Caudal \nAnual\nProm'
 COL_NORTE = 'UTM \nNorte \nCaptación\n(m)'
 COL_ESTE = 'UTM \nEste \nCaptación\n(m)'
 COL_DATUM = 'Datum'
+COL_FECHA_RESOLUCION = 'Fecha de Resolución'
+
+# Columnas que realmente usa el flujo (filtros, coordenadas y exportación).
+COLUMNAS_PIPELINE = [
+    COL_EXPEDIENTE, COL_SOLICITUD, COL_COMUNA, COL_NATURALEZA, COL_TIPO_DERECHO,
+    COL_CAUDAL, COL_NORTE, COL_ESTE, COL_DATUM, COL_SOLICITANTE
+]
+# Columnas de texto que se filtran por coincidencia y que se guardan como categorías.
+COLUMNAS_INDEXADAS = [COL_COMUNA, COL_NATURALEZA, COL_TIPO_DERECHO]
+# En modo ligero también el Datum (una decena de variantes de texto) se guarda como categoría.
+COLUMNAS_CATEGORICAS_LIGERO = COLUMNAS_INDEXADAS + [COL_DATUM]
+VALORES_SIN_INFO = ['S/I', 's/i', 'S/D', 's/d']
+FILA_ENCABEZADO = 7   # Fila (base 1) con los títulos de las columnas.
+MAX_COLUMNAS = 68     # Rango A:BP.
+
+# Nombres cortos de columnas para las expresiones de filtro (ver expresiones.py).
+CAMPOS_EXPRESION = {'caudal': COL_CAUDAL, 'norte': COL_NORTE, 'este': COL_ESTE, 'fecha': COL_FECHA_RESOLUCION}
+# El modo ligero carga además las columnas de los nombres cortos de las expresiones.
+COLUMNAS_LIGERO = COLUMNAS_PIPELINE + [col for col in CAMPOS_EXPRESION.values() if col not in COLUMNAS_PIPELINE]
+DIGITOS_COORDENADA = {COL_NORTE: 7, COL_ESTE: 6}
+
+# --- CACHÉ PERSISTENTE DEL LIBRO DE ORIGEN ---
+VERSION_CACHE = 3
+
+def directorio_cache() -> str:
+    """
+    Carpeta de caché del usuario (LOCALAPPDATA en Windows, XDG_CACHE_HOME o ~/.cache en el resto).
+    """
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'auto_filter')
+
+def hash_contenido(ruta_archivo: str, tam_bloque: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(ruta_archivo, 'rb') as f:
+        for bloque in iter(lambda: f.read(tam_bloque), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+def _rutas_cache(ruta_archivo: str, variante: str = '') -> tuple[str, str]:
+    """
+    Devuelve las rutas (metadatos, datos sin extensión) de la caché asociada a un libro.
+    El nombre se deriva de la ruta absoluta, así cada libro tiene una sola entrada vigente
+    por variante ('' para la tabla completa, 'ligero' para la del modo ligero).
+    """
+    clave = hashlib.sha1((os.path.abspath(ruta_archivo) + variante).encode('utf-8')).hexdigest()[:16]
+    base = os.path.join(directorio_cache(), clave)
+    return base + '.json', base
+
+def leer_cache(ruta_archivo: str, log_queue: queue.Queue, variante: str = '') -> pd.DataFrame | None:
+    """
+    Devuelve el DataFrame limpio guardado para el libro, o None si no hay caché válida.
+    La caché se considera válida si coinciden ruta, tamaño y fecha de modificación; si sólo
+    cambió la fecha (archivo copiado o tocado) se recalcula el hash del contenido para decidir.
+    """
+    ruta_meta, base_datos = _rutas_cache(ruta_archivo, variante)
+    try:
+        with open(ruta_meta, encoding='utf-8') as f:
+            meta = json.load(f)
+        stat = os.stat(ruta_archivo)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get('version') != VERSION_CACHE or meta.get('ruta') != os.path.abspath(ruta_archivo) or meta.get('tamano') != stat.st_size:
+        return None
+    if meta.get('mtime_ns') != stat.st_mtime_ns:
+        if meta.get('sha256') != hash_contenido(ruta_archivo):
+            return None
+        meta['mtime_ns'] = stat.st_mtime_ns
+        with open(ruta_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    ruta_datos = base_datos + meta.get('extension', '')
+    try:
+        if meta.get('formato') == 'parquet':
+            df = pd.read_parquet(ruta_datos)
+        else:
+            df = pd.read_pickle(ruta_datos)
+    except Exception as e:
+        log_queue.put(f"   - ⚠️ Advertencia: No se pudo leer la caché ({e}). Se cargará el Excel.")
+        return None
+    log_queue.put("⚡ Datos cargados desde la caché (el libro no ha cambiado desde la última lectura).")
+    return df
+
+def guardar_cache(ruta_archivo: str, df: pd.DataFrame, log_queue: queue.Queue, variante: str = ''):
+    """
+    Guarda el DataFrame limpio en la caché del usuario. Se intenta Parquet (requiere pyarrow);
+    si las columnas tienen tipos mezclados que Parquet no admite, se usa pickle.
+    Un fallo al escribir la caché nunca interrumpe el proceso.
+    """
+    ruta_meta, base_datos = _rutas_cache(ruta_archivo, variante)
+    try:
+        os.makedirs(directorio_cache(), exist_ok=True)
+        stat = os.stat(ruta_archivo)
+        meta = {
+            'version': VERSION_CACHE,
+            'ruta': os.path.abspath(ruta_archivo),
+            'tamano': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': hash_contenido(ruta_archivo),
+        }
+        try:
+            df.to_parquet(base_datos + '.parquet', index=False)
+            meta.update(formato='parquet', extension='.parquet')
+        except Exception:
+            df.to_pickle(base_datos + '.pkl')
+            meta.update(formato='pickle', extension='.pkl')
+
+        # Los metadatos se escriben al final: una caché a medio escribir nunca se considera válida.
+        with open(ruta_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+    except Exception as e:
+        log_queue.put(f"   - ⚠️ Advertencia: No se pudo guardar la caché del libro: {e}")
+
+# --- NORMALIZACIÓN DE TEXTO ---
+def _limpiar_codigo(valores: pd.Series) -> pd.Series:
+    return valores.astype(str).str.strip()
+
+def _limpiar_solicitante(valores: pd.Series) -> pd.Series:
+    return valores.astype(str).str.strip().str.title().replace('Nan', '')
+
+# Limpieza propia de algunas columnas; el resto de COLUMNAS_PIPELINE sólo pasa por VALORES_SIN_INFO.
+LIMPIEZA_COLUMNAS = {
+    COL_EXPEDIENTE: _limpiar_codigo,
+    COL_SOLICITUD: _limpiar_codigo,
+    COL_SOLICITANTE: _limpiar_solicitante,
+}
+
+def normalizar_por_valores_unicos(serie: pd.Series, limpiar=None) -> pd.Series:
+    """
+    Limpia una columna de texto trabajando sólo sobre sus valores distintos: se factoriza,
+    se aplica limpiar (si se indica) y el reemplazo de VALORES_SIN_INFO por NaN a la tabla
+    de valores, y se expande con los códigos. El resultado es el mismo que limpiar la
+    columna completa, con un costo que depende de los valores distintos y no de las filas
+    (los valores que Python considera iguales, como 1 y 1.0, se limpian una sola vez).
+    Las columnas numéricas sin limpieza propia se devuelven sin cambios.
+    """
+    if limpiar is None and not (pd.api.types.is_object_dtype(serie) or pd.api.types.is_string_dtype(serie)):
+        return serie
+    codigos, valores = pd.factorize(serie, use_na_sentinel=False)
+    unicos = pd.Series(valores, dtype=serie.dtype)
+    if limpiar is not None:
+        unicos = limpiar(unicos)
+    unicos = unicos.replace(VALORES_SIN_INFO, np.nan)
+    return unicos.take(codigos).set_axis(serie.index).rename(serie.name)
 
 # --- LÓGICA DE PROCESAMIENTO ---
-def cargar_datos(ruta_archivo: str, log_queue: queue.Queue) -> pd.DataFrame | None:
+def columnas_de_expresiones(filtros: list[dict]) -> tuple[str, ...]:
+    """
+    Campos de las expresiones de una lista de filtros que no son nombres cortos (ej. una
+    columna entre comillas). Se pasan a cargar_datos para que el modo ligero los cargue.
+    """
+    campos = set()
+    for f in filtros:
+        if f.get('expresion'):
+            campos.update(c for c in compilar_expresion(f['expresion']).campos if c not in CAMPOS_EXPRESION)
+    return tuple(sorted(campos))
+
+def cargar_datos(ruta_archivo: str, log_queue: queue.Queue, usar_cache: bool = True, ligero: bool = False,
+                 columnas_extra: tuple[str, ...] = ()) -> pd.DataFrame | None:
+    """
+    Lee y limpia el libro completo. Con ligero=True sólo se leen COLUMNAS_LIGERO, más las
+    columnas_extra que usen las expresiones (ver columnas_de_expresiones), y la tabla queda
+    con tipos compactos (ver aligerar_tabla); su caché se guarda aparte.
+    """
     log_queue.put(f"🔄 Cargando datos desde '{ruta_archivo}'...")
+    extra = {normalizar_nombre(c) for c in columnas_extra} - {normalizar_nombre(c) for c in COLUMNAS_LIGERO}
+    variante = ('ligero' + ''.join(f"|{c}" for c in sorted(extra))) if ligero else ''
+    if usar_cache:
+        df = leer_cache(ruta_archivo, log_queue, variante)
+        if df is not None:
+            return df
     try:
-        df = pd.read_excel(ruta_archivo, header=6, usecols='A:BP')
+        if ligero:
+            # Las columnas que no se usan no llegan a construirse.
+            df = pd.read_excel(ruta_archivo, header=6,
+                               usecols=lambda nombre: str(nombre).strip() in COLUMNAS_LIGERO or normalizar_nombre(nombre) in extra)
+        else:
+            df = pd.read_excel(ruta_archivo, header=6, usecols='A:BP')
         df.columns = df.columns.str.strip()
         log_queue.put("✅ Datos cargados exitosamente.")
         
-        # Limpia espacios en columnas de texto clave.
-        if COL_EXPEDIENTE in df.columns:
-            df[COL_EXPEDIENTE] = df[COL_EXPEDIENTE].astype(str).str.strip()
-        if 'N° \nSolicitud' in df.columns:
-            df['N° \nSolicitud'] = df['N° \nSolicitud'].astype(str).str.strip()
-            
-        # Limpia y estandariza mayúsculas/minúsculas en Nombre Solicitante.
+        # Limpia espacios en los códigos, estandariza mayúsculas/minúsculas en Nombre Solicitante
+        # y marca los valores sin información, sólo en las columnas que usa el proceso.
         if COL_SOLICITANTE in df.columns:
             log_queue.put("   - Estandarizando nombres de solicitantes...")
-            df[COL_SOLICITANTE] = df[COL_SOLICITANTE].astype(str).str.strip().str.title()
-            
-            # --- LÍNEA CORREGIDA ---
-            # Se reasigna el resultado a la columna en lugar de usar 'inplace=True'.
-            df[COL_SOLICITANTE] = df[COL_SOLICITANTE].replace('Nan', '')
+        for col in COLUMNAS_PIPELINE:
+            if col in df.columns:
+                df[col] = normalizar_por_valores_unicos(df[col], LIMPIEZA_COLUMNAS.get(col))
 
-        df.replace(['S/I', 's/i', 'S/D', 's/d'], np.nan, inplace=True)
+        if ligero:
+            df = aligerar_tabla(df, log_queue)
+        else:
+            categorizar_columnas_filtro(df)
+        if usar_cache:
+            guardar_cache(ruta_archivo, df, log_queue, variante)
         return df
     except FileNotFoundError:
         log_queue.put(f"❌ ERROR: El archivo no fue encontrado en la ruta: {ruta_archivo}")
@@ -52,107 +232,476 @@ def cargar_datos(ruta_archivo: str, log_queue: queue.Queue) -> pd.DataFrame | No
         log_queue.put("   Asegúrate de tener instaladas las librerías necesarias: pip install pandas openpyxl xlrd")
         return None
 
-def filtrar_datos(df: pd.DataFrame, filtros: dict, log_queue: queue.Queue) -> pd.DataFrame:
+def coordenadas_a_numero(serie: pd.Series, n_muestra: int = 5) -> tuple[pd.Series, dict]:
+    """
+    Convierte una columna de coordenadas a float64 con el mismo criterio que
+    estandarizar_coordenadas (espacios y coma decimal). Se usa float64 y no float32
+    porque éste no conserva los 7 dígitos del Norte con decimales. Devuelve además el
+    resumen de valores no convertibles, que desde aquí quedan como NaN.
+    """
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return serie.astype(np.float64), {'km': 0, 'invalidas': 0}
+    texto = serie.astype(str).str.strip()
+    vacio = (serie.isna() | (texto == '')).to_numpy()
+    numeros = pd.to_numeric(texto.str.replace(',', '.', regex=False), errors='coerce').astype(np.float64)
+    invalido = ~vacio & numeros.isna().to_numpy()
+    resumen = {
+        'km': 0,
+        'invalidas': int(invalido.sum()),
+        'muestra_invalidas': serie.to_numpy()[invalido][:n_muestra].tolist(),
+    }
+    return numeros.where(~vacio), resumen
+
+def aligerar_tabla(df: pd.DataFrame, log_queue: queue.Queue) -> pd.DataFrame:
+    """
+    Modo ligero: deja COLUMNAS_PIPELINE con las coordenadas como float64, el caudal como
+    float32 y las columnas de COLUMNAS_CATEGORICAS_LIGERO como categorías. Las demás columnas
+    cargadas (las que usan las expresiones, ej. la fecha) se conservan tal cual, al final.
+    La tabla se arma de una vez a partir de las columnas convertidas, sin copiar la original.
+    """
+    columnas = {}
+    for col in COLUMNAS_PIPELINE:
+        if col not in df.columns:
+            continue
+        if col in (COL_NORTE, COL_ESTE):
+            columnas[col], resumen = coordenadas_a_numero(df[col])
+            # Los valores no numéricos se informan aquí: después ya no se distinguen de los vacíos.
+            _informar_resumen_coordenadas('Norte' if col == COL_NORTE else 'Este', resumen, log_queue)
+        elif col == COL_CAUDAL:
+            columnas[col] = pd.to_numeric(df[col], errors='coerce').astype(np.float32)
+        else:
+            columnas[col] = df[col]
+    for col in df.columns:
+        columnas.setdefault(col, df[col])
+    return categorizar_columnas_filtro(pd.DataFrame(columnas), COLUMNAS_CATEGORICAS_LIGERO)
+
+# --- ÍNDICE DE FILTROS ---
+def quitar_tildes(texto: str) -> str:
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+def normalizar_texto(texto: str) -> str:
+    """
+    Quita tildes y pasa a minúsculas, para comparar 'Subterránea' con 'subterranea'.
+    """
+    return quitar_tildes(texto).casefold()
+
+def compilar_patrones(patrones: str | list[str]) -> list[re.Pattern]:
+    """
+    Compila uno o varios patrones de filtro (expresiones regulares) para buscarlos en texto
+    normalizado. Al patrón sólo se le quitan las tildes: pasarlo a minúsculas cambiaría el
+    sentido de clases como \\D o \\S. Los elementos vacíos se ignoran.
+    """
+    if isinstance(patrones, str):
+        patrones = [patrones]
+    return [re.compile(quitar_tildes(p.strip()), re.IGNORECASE) for p in patrones if p and p.strip()]
+
+def describir_patrones(patrones: str | list[str]) -> str:
+    return patrones if isinstance(patrones, str) else ', '.join(patrones)
+
+def categorizar_columnas_filtro(df: pd.DataFrame, columnas: list[str] = COLUMNAS_INDEXADAS) -> pd.DataFrame:
+    """
+    Convierte a categoría las columnas de COLUMNAS_INDEXADAS (pocas centenas de valores
+    distintos), lo que permite resolver los filtros sobre los valores distintos en vez de
+    recorrer todas las filas.
+    """
+    for col in columnas:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            codigos, valores = pd.factorize(df[col])
+            df[col] = pd.Categorical.from_codes(codigos, categories=pd.Index(valores, dtype=object))
+    return df
+
+class IndiceFiltros:
+    """
+    Índice de las columnas filtrables de un DataFrame ya cargado.
+
+    Para cada columna de COLUMNAS_INDEXADAS guarda los códigos de categoría de cada fila
+    y una tabla de búsqueda con los valores distintos normalizados (sin tildes ni
+    mayúsculas). Un filtro se resuelve contra esa tabla y se convierte en máscara con una
+    búsqueda por código, sin recorrer los textos de todas las filas. Las columnas numéricas
+    convertidas con pd.to_numeric, y las que usan las expresiones de filtro, también se
+    guardan para reutilizarlas entre filtros.
+    Los códigos se calculan al construirlo; las columnas convertidas, la primera vez que
+    se piden, con un candado. Así el índice puede compartirse entre hilos (los perfiles
+    de pipeline.ejecutar_perfiles, las consultas de servicio_consultas).
+    """
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        # Reentrante: columna_expresion llama a numerica con el candado tomado.
+        self._lock = threading.RLock()
+        self._codigos = {}
+        self._normalizados = {}
+        self._numericas = {}
+        self._expresiones = {}
+        for col in COLUMNAS_INDEXADAS:
+            if col not in df.columns:
+                continue
+            serie = df[col]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                codigos, valores = serie.cat.codes.to_numpy(), serie.cat.categories
+            else:
+                codigos, valores = pd.factorize(serie)
+            self._codigos[col] = codigos
+            self._normalizados[col] = [normalizar_texto(v) if isinstance(v, str) else None for v in valores]
+
+    def mascara(self, col: str, patrones: str | list[str], incluir_vacios: bool = False) -> np.ndarray:
+        """
+        Máscara booleana de las filas cuyo valor en col coincide con alguno de los patrones
+        (búsqueda parcial, sin distinguir mayúsculas ni tildes). Con incluir_vacios, las filas
+        sin valor también se incluyen.
+        """
+        regexes = compilar_patrones(patrones)
+        coincide = np.zeros(len(self._normalizados[col]) + 1, dtype=bool)
+        for i, valor in enumerate(self._normalizados[col]):
+            coincide[i] = valor is not None and any(r.search(valor) for r in regexes)
+        # El código -1 (sin valor) toma la última posición de la tabla.
+        coincide[-1] = incluir_vacios
+        return coincide[self._codigos[col]]
+
+    def numerica(self, col: str) -> pd.Series:
+        if col not in self._numericas:
+            with self._lock:
+                if col not in self._numericas:
+                    serie = self.df[col]
+                    if isinstance(serie.dtype, pd.CategoricalDtype):
+                        serie = serie.astype(object)
+                    self._numericas[col] = pd.to_numeric(serie, errors='coerce')
+        return self._numericas[col]
+
+    def columna_expresion(self, campo: str, tipo: str) -> np.ndarray:
+        """
+        Columna de un campo de expresión como arreglo: las fechas con pd.to_datetime, las
+        coordenadas ya estandarizadas en metros (como quedarán en los archivos) y el resto
+        con pd.to_numeric. Cada columna se convierte una sola vez, aunque la pidan varios
+        hilos a la vez.
+        """
+        col = resolver_campo(campo, CAMPOS_EXPRESION, self.df.columns)
+        if (col, tipo) not in self._expresiones:
+            with self._lock:
+                if (col, tipo) not in self._expresiones:
+                    if tipo == 'fecha':
+                        valores = pd.to_datetime(self.df[col], errors='coerce', dayfirst=True, format='mixed').to_numpy()
+                    elif col in DIGITOS_COORDENADA:
+                        metros, _ = estandarizar_coordenadas(self.df[col], DIGITOS_COORDENADA[col], como_entero=True)
+                        valores = metros.to_numpy(dtype=np.float64, na_value=np.nan)
+                    else:
+                        numeros = self.numerica(col)
+                        # El caudal float32 del modo ligero se conserva: el umbral se compara con su precisión.
+                        valores = numeros.to_numpy() if numeros.dtype.kind == 'f' else numeros.to_numpy(dtype=np.float64, na_value=np.nan)
+                    self._expresiones[(col, tipo)] = valores
+        return self._expresiones[(col, tipo)]
+
+def validar_campos_expresion(filtros: dict, columnas) -> None:
+    """
+    Comprueba que la expresión de filtros['expresion'] sea válida y que cada campo que
+    nombra exista en columnas. Lanza ValueError con el motivo.
+    """
+    if filtros.get('expresion'):
+        for campo in compilar_expresion(filtros['expresion']).campos:
+            resolver_campo(campo, CAMPOS_EXPRESION, columnas)
+
+def filtrar_datos(df: pd.DataFrame, filtros: dict, log_queue: queue.Queue, indice: IndiceFiltros | None = None) -> pd.DataFrame | None:
+    """
+    Aplica los filtros de Comuna (uno o varios valores), Naturaleza, Tipo de Derecho,
+    Caudal y, si se indica, la expresión de filtros['expresion'] (ver expresiones.py).
+    Las condiciones se combinan en una sola máscara y la tabla se recorta una vez.
+    Para filtrar varias veces la misma tabla, conviene construir el IndiceFiltros una sola
+    vez y pasarlo en cada llamada.
+    Devuelve None si la expresión no es válida o nombra una columna que no está en la
+    tabla: un error no debe confundirse con un filtro sin resultados.
+    """
     log_queue.put("\n🔄 Aplicando filtros...")
-    df_filtrado = df.copy()
+    if indice is None:
+        indice = IndiceFiltros(df)
+    try:
+        validar_campos_expresion(filtros, indice.df.columns)
+    except ValueError as e:
+        log_queue.put(f"❌ ERROR: {e}")
+        return None
 
     if filtros['comuna']:
-        log_queue.put(f"   - Aplicando filtro de Comuna: '{filtros['comuna']}'")
-        df_filtrado = df_filtrado[df_filtrado[COL_COMUNA].str.contains(filtros['comuna'], case=False, na=False)]
-
-    condicion_naturaleza = (
-        df_filtrado[COL_NATURALEZA].str.contains(filtros['naturaleza'], case=False, na=False) |
-        df_filtrado[COL_NATURALEZA].isnull()
-    )
-    df_filtrado = df_filtrado[condicion_naturaleza]
-
-    df_filtrado = df_filtrado[df_filtrado[COL_TIPO_DERECHO].str.contains(filtros['tipo_derecho'], case=False, na=False)]
-
-    if filtros['caudal']:
-        match = re.match(r'^\s*([<>=!]+)\s*(\d+\.?\d*)\s*$', filtros['caudal'])
-        if match:
-            operador = match.group(1)
-            valor = float(match.group(2))
-            caudal_numerico = pd.to_numeric(df_filtrado[COL_CAUDAL], errors='coerce')
-            log_queue.put(f"   - Aplicando filtro de caudal: {COL_CAUDAL.replace(chr(10), ' ')} {operador} {valor}")
-            if operador == '<=':
-                df_filtrado = df_filtrado[caudal_numerico <= valor]
-            elif operador == '>=':
-                df_filtrado = df_filtrado[caudal_numerico >= valor]
-            elif operador == '<':
-                df_filtrado = df_filtrado[caudal_numerico < valor]
-            elif operador == '>':
-                df_filtrado = df_filtrado[caudal_numerico > valor]
-            elif operador in ('==', '='):
-                df_filtrado = df_filtrado[caudal_numerico == valor]
-            elif operador == '!=':
-                 df_filtrado = df_filtrado[caudal_numerico != valor]
-            else:
-                log_queue.put(f"⚠️ Advertencia: Operador de caudal '{operador}' no reconocido. Se omitirá este filtro.")
-        else:
-            log_queue.put("⚠️ Advertencia: Formato de filtro de caudal no válido. Se omitirá este filtro.")
+        log_queue.put(f"   - Aplicando filtro de Comuna: '{describir_patrones(filtros['comuna'])}'")
+        mascara = indice.mascara(COL_COMUNA, filtros['comuna'])
+    else:
+        mascara = np.ones(len(df), dtype=bool)
 
+    mascara &= indice.mascara(COL_NATURALEZA, filtros['naturaleza'], incluir_vacios=True)
+    mascara &= indice.mascara(COL_TIPO_DERECHO, filtros['tipo_derecho'])
+
+    try:
+        for expresion in compilar_filtros_numericos(filtros, log_queue):
+            mascara &= expresion.evaluar(indice.columna_expresion)
+    except ValueError as e:
+        log_queue.put(f"❌ ERROR: {e}")
+        return None
+
+    df_filtrado = df[mascara]
     log_queue.put(f"✅ Filtro aplicado. Se encontraron {len(df_filtrado)} registros.")
     return df_filtrado
 
-def estandarizar_coordenada(coord: float, digitos: int) -> str:
-    if pd.isna(coord) or coord == 0:
-        return ""
-    s = str(int(coord))
-    if len(s) > digitos:
-        return s[:digitos]
+def interpretar_filtro_caudal(texto: str, log_queue: queue.Queue) -> tuple[str, float] | None:
+    """
+    Convierte un filtro como '>= 10.5' en (operador, valor). Devuelve None si no es válido.
+    """
+    match = re.match(r'^\s*([<>=!]+)\s*(\d+\.?\d*)\s*$', texto)
+    if not match:
+        log_queue.put("⚠️ Advertencia: Formato de filtro de caudal no válido. Se omitirá este filtro.")
+        return None
+    operador = match.group(1)
+    if operador not in COMPARADORES:
+        log_queue.put(f"⚠️ Advertencia: Operador de caudal '{operador}' no reconocido. Se omitirá este filtro.")
+        return None
+    return operador, float(match.group(2))
+
+def compilar_filtros_numericos(filtros: dict, log_queue: queue.Queue) -> list[ExpresionFiltro]:
+    """
+    Traduce el filtro de caudal ('>= 10.5') y la expresión de filtros['expresion'] a
+    expresiones compiladas. Lanza ValueError si la expresión no es válida.
+    """
+    expresiones = []
+    if filtros.get('caudal'):
+        filtro_caudal = interpretar_filtro_caudal(filtros['caudal'], log_queue)
+        if filtro_caudal:
+            operador, valor = filtro_caudal
+            log_queue.put(f"   - Aplicando filtro de caudal: {COL_CAUDAL.replace(chr(10), ' ')} {operador} {valor}")
+            expresiones.append(compilar_expresion(f"caudal {operador} {np.format_float_positional(valor, trim='-')}"))
+    if filtros.get('expresion'):
+        log_queue.put(f"   - Aplicando expresión: {filtros['expresion']}")
+        expresiones.append(compilar_expresion(filtros['expresion']))
+    return expresiones
+
+# --- LECTURA EN STREAMING ---
+def _valor_celda(valor):
+    """
+    Normaliza una celda leída con openpyxl/xlrd igual que lo hace pd.read_excel.
+    """
+    if valor is None or valor == '':
+        return np.nan
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+def _iterar_filas_excel(ruta_archivo: str):
+    """
+    Recorre las filas de la primera hoja desde la fila de encabezados, limitadas al rango A:BP.
+    La primera fila entregada es la de encabezados. Usa openpyxl en modo sólo lectura para
+    .xlsx y xlrd para .xls, sin construir nunca la hoja completa en memoria.
+    """
+    if ruta_archivo.lower().endswith('.xls'):
+        import xlrd
+        libro = xlrd.open_workbook(ruta_archivo, on_demand=True)
+        try:
+            hoja = libro.sheet_by_index(0)
+            for i in range(FILA_ENCABEZADO - 1, hoja.nrows):
+                yield hoja.row_values(i, 0, min(MAX_COLUMNAS, hoja.ncols))
+        finally:
+            libro.release_resources()
     else:
-        return s.ljust(digitos, '0')
+        import openpyxl
+        libro = openpyxl.load_workbook(ruta_archivo, read_only=True, data_only=True)
+        try:
+            hoja = libro.worksheets[0]
+            hoja.reset_dimensions()
+            yield from hoja.iter_rows(min_row=FILA_ENCABEZADO, max_col=MAX_COLUMNAS, values_only=True)
+        finally:
+            libro.close()
 
-def estandarizar_y_convertir_coord(valor_celda, digitos, log_queue):
+def construir_predicado_fila(filtros: dict, log_queue: queue.Queue):
     """
-    Función auxiliar que convierte y estandariza una coordenada.
+    Traduce los filtros de texto a una función que evalúa una fila ya limpia
+    (dict columna -> valor) con la misma semántica que filtrar_datos. El caudal y la
+    expresión se evalúan después, sobre la tabla de las filas que pasan este filtro.
     """
-    if pd.isna(valor_celda) or str(valor_celda).strip() == '':
-        return ""
+    condiciones = []
+
+    def contiene(patrones):
+        regexes = compilar_patrones(patrones)
+        return lambda v: isinstance(v, str) and any(r.search(normalizar_texto(v)) for r in regexes)
+
+    if filtros['comuna']:
+        comuna_ok = contiene(filtros['comuna'])
+        condiciones.append(lambda fila: comuna_ok(fila[COL_COMUNA]))
+
+    naturaleza_ok = contiene(filtros['naturaleza'])
+    condiciones.append(lambda fila: pd.isna(fila[COL_NATURALEZA]) or naturaleza_ok(fila[COL_NATURALEZA]))
 
+    tipo_ok = contiene(filtros['tipo_derecho'])
+    condiciones.append(lambda fila: tipo_ok(fila[COL_TIPO_DERECHO]))
+
+    return lambda fila: all(condicion(fila) for condicion in condiciones)
+
+def _limpiar_fila(fila: dict) -> dict:
+    """
+    Aplica a una fila la misma limpieza que cargar_datos aplica a la tabla completa.
+    """
+    for col in (COL_EXPEDIENTE, COL_SOLICITUD):
+        if col in fila:
+            fila[col] = str(fila[col]).strip()
+    if COL_SOLICITANTE in fila:
+        nombre = str(fila[COL_SOLICITANTE]).strip().title()
+        fila[COL_SOLICITANTE] = '' if nombre == 'Nan' else nombre
+    for col, valor in fila.items():
+        if isinstance(valor, str) and valor in VALORES_SIN_INFO:
+            fila[col] = np.nan
+    return fila
+
+def cargar_datos_filtrados(ruta_archivo: str, filtros: dict, log_queue: queue.Queue) -> pd.DataFrame | None:
+    """
+    Lee el Excel fila a fila, conservando sólo COLUMNAS_PIPELINE y sólo las filas que
+    cumplen los filtros. La memoria usada depende de los registros encontrados, no del
+    tamaño del libro. El resultado es equivalente a filtrar_datos(cargar_datos(...)).
+    Las columnas que usa la expresión de filtro (ej. fecha) también se conservan.
+    """
+    log_queue.put(f"🔄 Leyendo en streaming desde '{ruta_archivo}'...")
+    try:
+        expresiones = compilar_filtros_numericos(filtros, log_queue)
+    except ValueError as e:
+        log_queue.put(f"❌ ERROR: {e}")
+        return None
     try:
-        numero = float(str(valor_celda).replace(',', '.'))
-    except (ValueError, TypeError):
-        log_queue.put(f"   - ⚠️ Advertencia: No se pudo convertir la coordenada '{valor_celda}'. Se tratará como vacía.")
-        return ""
+        filas = _iterar_filas_excel(ruta_archivo)
+        encabezados = [str(h).strip() if h is not None else '' for h in next(filas)]
+        posiciones = {col: encabezados.index(col) for col in COLUMNAS_PIPELINE if col in encabezados}
+        faltantes = [col for col in COLUMNAS_PIPELINE if col not in posiciones and col != COL_SOLICITUD]
+        if faltantes:
+            nombres = ', '.join(f"'{c.replace(chr(10), ' ')}'" for c in faltantes)
+            log_queue.put(f"❌ ERROR: No se encontraron las columnas requeridas en la fila {FILA_ENCABEZADO}: {nombres}")
+            return None
+        try:
+            for expresion in expresiones:
+                for campo in expresion.campos:
+                    col = resolver_campo(campo, CAMPOS_EXPRESION, encabezados)
+                    posiciones.setdefault(col, encabezados.index(col))
+        except ValueError as e:
+            log_queue.put(f"❌ ERROR: {e}")
+            return None
 
-    if numero == 0:
-        return ""
-        
-    numero_en_metros = numero
+        cumple_filtros = construir_predicado_fila(filtros, log_queue)
+        registros = []
+        leidas = 0
+        for valores in filas:
+            leidas += 1
+            fila = {col: _valor_celda(valores[i]) if i < len(valores) else np.nan for col, i in posiciones.items()}
+            fila = _limpiar_fila(fila)
+            if cumple_filtros(fila):
+                registros.append(fila)
+
+        df = pd.DataFrame(registros, columns=list(posiciones))
+        if expresiones and not df.empty:
+            # Caudal y expresión, vectorizados sobre las filas que ya pasaron los filtros de texto.
+            indice = IndiceFiltros(df)
+            mascara = np.ones(len(df), dtype=bool)
+            for expresion in expresiones:
+                mascara &= expresion.evaluar(indice.columna_expresion)
+            df = df[mascara]
+        log_queue.put(f"✅ Se leyeron {leidas} filas. Se encontraron {len(df)} registros.")
+        return df
+    except FileNotFoundError:
+        log_queue.put(f"❌ ERROR: El archivo no fue encontrado en la ruta: {ruta_archivo}")
+        return None
+    except Exception as e:
+        log_queue.put(f"❌ ERROR: Ocurrió un error inesperado al leer el archivo: {e}")
+        log_queue.put("   Asegúrate de tener instaladas las librerías necesarias: pip install pandas openpyxl xlrd")
+        return None
 
-    if numero != int(numero):
-        if len(str(int(numero))) <= 5:
-            numero_en_metros = numero * 1000
-            log_queue.put(f"✅ Coordenada en KM detectada y convertida: {valor_celda}")
+# Potencias de 10 usadas para contar dígitos sin pasar por cadenas de texto.
+_POTENCIAS_10 = 10 ** np.arange(1, 19, dtype=np.int64)
+_LIMITE_ENTERO = 10 ** 15
 
-    # Se elimina round() para truncar en vez de redondear. int() por sí solo elimina los decimales.
-    s_final = str(int(numero_en_metros))
-    
-    if len(s_final) > digitos:
-        return s_final[:digitos]
+def estandarizar_coordenadas(serie: pd.Series, digitos: int, n_muestra: int = 5, como_entero: bool = False) -> tuple[pd.Series, dict]:
+    """
+    Estandariza una columna de coordenadas a texto de `digitos` dígitos: acepta coma
+    decimal, pasa a metros los valores con decimales y parte entera de 5 caracteres o
+    menos (en KM), trunca los decimales y luego trunca o rellena con ceros a la derecha.
+    Las celdas vacías, en cero o no numéricas (ej. 'S/I') quedan como ''. Devuelve además
+    un resumen con la cantidad de coordenadas en KM convertidas y de valores no
+    convertibles, más una muestra de cada uno, en lugar de un aviso por fila.
+    Con como_entero (modo ligero) la columna es Int32 con NA en vez de texto con ''.
+    """
+    resultado = np.full(len(serie), '', dtype=object)
+    enteros = np.zeros(len(serie), dtype=np.int32)
+    originales = serie.to_numpy()
+
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        vacio = serie.isna().to_numpy()
+        numeros = serie.to_numpy(dtype=float, na_value=np.nan)
     else:
-        return s_final.ljust(digitos, '0')
+        texto = serie.astype(str).str.strip()
+        vacio = (serie.isna() | (texto == '')).to_numpy()
+        numeros = pd.to_numeric(texto.str.replace(',', '.', regex=False), errors='coerce').to_numpy(dtype=float)
+
+    invalido = ~vacio & ~np.isfinite(numeros)
+    valido = ~vacio & ~invalido & (numeros != 0)
+
+    # Coordenadas con decimales y parte entera de 5 caracteres o menos se asumen en KM.
+    x = np.where(valido, numeros, 0.0)
+    entero = np.trunc(x)
+    es_km = valido & (x != entero) & (entero <= 99999) & (entero >= -9999)
+    metros = np.trunc(np.where(es_km, x * 1000, x))
+
+    # Camino rápido: enteros positivos, se truncan o rellenan con ceros de forma aritmética.
+    simple = valido & (metros >= 1) & (metros < _LIMITE_ENTERO)
+    if simple.any():
+        v = metros[simple].astype(np.int64)
+        n_digitos = np.searchsorted(_POTENCIAS_10, v, side='right') + 1
+        exceso = n_digitos - digitos
+        ajustado = np.where(
+            exceso > 0,
+            v // (10 ** np.clip(exceso, 0, None)),
+            v * (10 ** np.clip(-exceso, 0, None)),
+        )
+        if como_entero:
+            enteros[simple] = ajustado
+        else:
+            resultado[simple] = ajustado.astype(str).astype(object)
 
-def procesar_coordenadas(df: pd.DataFrame, log_queue: queue.Queue) -> pd.DataFrame:
+    # Casos raros (negativos, cero tras truncar, valores enormes): se ajusta el texto del entero.
+    for i in np.flatnonzero(valido & ~simple):
+        s_final = str(int(metros[i]))
+        resultado[i] = s_final[:digitos] if len(s_final) > digitos else s_final.ljust(digitos, '0')
+        enteros[i] = int(resultado[i])
+
+    resumen = {
+        'km': int(es_km.sum()),
+        'muestra_km': originales[es_km][:n_muestra].tolist(),
+        'invalidas': int(invalido.sum()),
+        'muestra_invalidas': originales[invalido][:n_muestra].tolist(),
+    }
+    if como_entero:
+        return pd.Series(pd.arrays.IntegerArray(enteros, ~valido), index=serie.index, name=serie.name), resumen
+    return pd.Series(resultado, index=serie.index, name=serie.name), resumen
+
+def coordenada_vacia(serie: pd.Series) -> np.ndarray:
+    """Filas sin coordenada estandarizada: '' en las columnas de texto, NA en las Int32."""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.isna().to_numpy()
+    return (serie == '').to_numpy()
+
+def _informar_resumen_coordenadas(nombre: str, resumen: dict, log_queue: queue.Queue):
+    if resumen['km']:
+        muestra = ', '.join(str(v) for v in resumen['muestra_km'])
+        log_queue.put(f"✅ Coordenadas {nombre} en KM detectadas y convertidas: {resumen['km']} (ej.: {muestra})")
+    if resumen['invalidas']:
+        muestra = ', '.join(f"'{v}'" for v in resumen['muestra_invalidas'])
+        log_queue.put(f"   - ⚠️ Advertencia: No se pudieron convertir {resumen['invalidas']} coordenadas {nombre}. Se tratarán como vacías (ej.: {muestra}).")
+
+def procesar_coordenadas(df: pd.DataFrame, log_queue: queue.Queue, como_entero: bool = False) -> pd.DataFrame:
     """
     Limpia y estandariza las columnas de coordenadas, manejando la conversión de KM a M.
+    Con como_entero (modo ligero) las coordenadas quedan como Int32 en vez de texto.
     """
     log_queue.put("\n🔄 Procesando y estandarizando coordenadas...")
-    df_procesado = df.copy()
-
-    df_procesado[COL_NORTE] = df_procesado[COL_NORTE].apply(
-        lambda x: estandarizar_y_convertir_coord(x, 7, log_queue)
-    )
-    df_procesado[COL_ESTE] = df_procesado[COL_ESTE].apply(
-        lambda x: estandarizar_y_convertir_coord(x, 6, log_queue)
-    )
+    coordenadas = {}
+    for col, nombre in ((COL_NORTE, 'Norte'), (COL_ESTE, 'Este')):
+        coordenadas[col], resumen = estandarizar_coordenadas(df[col], DIGITOS_COORDENADA[col], como_entero=como_entero)
+        _informar_resumen_coordenadas(nombre, resumen, log_queue)
 
     # Este filtro ahora funcionará correctamente, ya que los '0' se habrán convertido en ""
-    condicion_eliminar = (df_procesado[COL_NORTE] == "") & (df_procesado[COL_ESTE] == "")
-    n_eliminados = condicion_eliminar.sum()
-    df_procesado = df_procesado[~condicion_eliminar]
+    condicion_eliminar = coordenada_vacia(coordenadas[COL_NORTE]) & coordenada_vacia(coordenadas[COL_ESTE])
+    n_eliminados = int(condicion_eliminar.sum())
+    # Se recorta primero y se reemplazan las coordenadas después, sin copiar la tabla completa.
+    conservar = ~condicion_eliminar
+    df_procesado = df[conservar].assign(**{col: serie[conservar] for col, serie in coordenadas.items()})
     
     if n_eliminados > 0:
         log_queue.put(f"   - Se eliminaron {n_eliminados} filas con coordenadas nulas o inválidas.")
@@ -160,7 +709,51 @@ def procesar_coordenadas(df: pd.DataFrame, log_queue: queue.Queue) -> pd.DataFra
     log_queue.put("✅ Coordenadas procesadas y estandarizadas.")
     return df_procesado
 
-def exportar_por_datum(df: pd.DataFrame, log_queue: queue.Queue, carpeta_destino: str):
+# --- FILTRO ESPACIAL ---
+def construir_indice_espacial(df: pd.DataFrame) -> IndiceGrilla:
+    """
+    Índice de grilla sobre las coordenadas ya estandarizadas (texto o Int32), proyectadas
+    a WGS 84 / UTM 19S según el Datum de cada fila. Las filas sin alguna de las dos
+    coordenadas no se indexan y nunca cumplen un filtro espacial.
+    """
+    este = pd.to_numeric(df[COL_ESTE], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    norte = pd.to_numeric(df[COL_NORTE], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    datum = np.asarray(clasificar_datum(df[COL_DATUM]), dtype=object)
+    return IndiceGrilla(*coordenadas_en_wgs84(este, norte, datum))
+
+def filtrar_espacial(df: pd.DataFrame, espacial: dict, log_queue: queue.Queue, indice: IndiceGrilla | None = None) -> pd.DataFrame:
+    """
+    Etapa opcional después de procesar_coordenadas: conserva los registros dentro del
+    rectángulo, del radio y/o de los polígonos de filtros['espacial'] (ver filtro_espacial.py).
+    Para consultar varias veces la misma tabla, conviene construir el índice una vez.
+    """
+    log_queue.put("\n🔄 Aplicando filtro espacial...")
+    try:
+        if indice is None:
+            indice = construir_indice_espacial(df)
+        mascara = mascara_espacial(indice, espacial, log_queue)
+    except (OSError, ValueError) as e:
+        log_queue.put(f"❌ ERROR: {e}")
+        return df.iloc[0:0]
+    df_filtrado = df[mascara]
+    log_queue.put(f"✅ Filtro espacial aplicado. Quedan {len(df_filtrado)} registros.")
+    return df_filtrado
+
+COLUMNAS_EXPORTAR = [COL_EXPEDIENTE, COL_SOLICITANTE, COL_NORTE, COL_ESTE, COL_DATUM]
+RENOMBRAR_COLUMNAS = {
+    COL_EXPEDIENTE: 'Expediente',
+    COL_SOLICITANTE: 'Nombre Solicitante',
+    COL_NORTE: 'Norte',
+    COL_ESTE: 'Este',
+    COL_DATUM: 'Datum'
+}
+ARCHIVOS_POR_DATUM = {'1956': '1956.csv', '1969': '1969.csv', '1984': '1984.csv'}
+
+def preparar_exportacion(df: pd.DataFrame, log_queue: queue.Queue) -> pd.DataFrame:
+    """
+    Aplica el formato 'Expediente/N° Solicitud' y deja sólo las columnas que se exportan,
+    con los nombres que usan los CSV (Expediente, Nombre Solicitante, Norte, Este, Datum).
+    """
     log_queue.put("\n🔄 Preparando expedientes para exportación...")
 
     # --- CONCATENACIÓN DIRECTA ---
@@ -179,57 +772,105 @@ def exportar_por_datum(df: pd.DataFrame, log_queue: queue.Queue, carpeta_destino
 
     log_queue.put("   - Se aplicó el formato 'Expediente/N° Solicitud' a todos los registros.")
     # --- FIN DE LA NUEVA LÓGICA ---
+    return df[COLUMNAS_EXPORTAR].rename(columns=RENOMBRAR_COLUMNAS)
 
-    log_queue.put("\n🔄 Exportando archivos por Datum...")
-    columnas_a_exportar = [COL_EXPEDIENTE, COL_SOLICITANTE, COL_NORTE, COL_ESTE, COL_DATUM]
-    renombrar_columnas = {
-        COL_EXPEDIENTE: 'Expediente',
-        COL_SOLICITANTE: 'Nombre Solicitante',
-        COL_NORTE: 'Norte',
-        COL_ESTE: 'Este',
-        COL_DATUM: 'Datum'
+def agrupar_por_datum(df_exportacion: pd.DataFrame) -> tuple[dict[str, pd.DataFrame], pd.DataFrame]:
+    """
+    Separa en una sola pasada los registros ya preparados para exportar. Devuelve un
+    DataFrame por cada clave de ARCHIVOS_POR_DATUM y, aparte, los registros sin Datum que
+    tienen ambas coordenadas (los que se agregan a todos los archivos).
+    """
+    datum = df_exportacion['Datum']
+    condicion_datum_vacio = (datum.isna() | (datum.astype(str).str.strip() == '')).to_numpy()
+    condicion_coords_validas = ~coordenada_vacia(df_exportacion['Norte']) & ~coordenada_vacia(df_exportacion['Este'])
+    df_datum_vacios = df_exportacion[condicion_datum_vacio & condicion_coords_validas]
+
+    # La misma clasificación que usan los conversores para elegir qué registros transformar.
+    codigos = clasificar_datum(datum)
+    grupos = {datum_val: df_exportacion.iloc[0:0] for datum_val in ARCHIVOS_POR_DATUM}
+    for datum_val, df_grupo in df_exportacion.groupby(codigos, observed=True, sort=False):
+        grupos[datum_val] = df_grupo
+    return grupos, df_datum_vacios
+
+def particionar_por_datum(df: pd.DataFrame, log_queue: queue.Queue) -> dict[str, pd.DataFrame]:
+    """
+    Separa los registros por Datum. Devuelve un DataFrame por cada clave de
+    ARCHIVOS_POR_DATUM, con las columnas tal como se escriben en los CSV. Los registros
+    sin Datum (pero con coordenadas) se incluyen en los tres grupos.
+    """
+    grupos, df_datum_vacios = agrupar_por_datum(preparar_exportacion(df, log_queue))
+    return {
+        datum_val: pd.concat([df_grupo, df_datum_vacios], ignore_index=True)
+        for datum_val, df_grupo in grupos.items()
     }
 
-    condicion_datum_vacio = df[COL_DATUM].isna() | (df[COL_DATUM].astype(str).str.strip() == '')
-    condicion_coords_validas = (df[COL_NORTE] != '') & (df[COL_ESTE] != '')
-    df_datum_vacios = df[condicion_datum_vacio & condicion_coords_validas]
-    df_con_datum = df[~condicion_datum_vacio]
+def _escribir_archivo_datum(df_grupo: pd.DataFrame, df_datum_vacios: pd.DataFrame, csv_vacios: str | None,
+                            ruta_salida: str, formato: str, compresion: str | None):
+    """
+    Escribe el archivo de un Datum. En CSV, los registros sin Datum ya vienen convertidos a
+    texto (csv_vacios) y sólo se agregan al final, sin volver a generarlos en cada archivo.
+    """
+    if formato == 'csv':
+        with abrir_texto(ruta_salida, encoding='utf-8-sig') as f:
+            f.write(df_grupo.to_csv(index=False, sep=';'))
+            if csv_vacios:
+                f.write(csv_vacios)
+    else:
+        df_final = pd.concat([df_grupo, df_datum_vacios], ignore_index=True) if len(df_datum_vacios) else df_grupo
+        guardar_intermedio(df_final, ruta_salida, compresion=compresion)
+
+def exportar_por_datum(df: pd.DataFrame, log_queue: queue.Queue, carpeta_destino: str, formato: str = 'csv',
+                       compresion: str | None = None, datum_vacio_aparte: bool = False) -> int:
+    """
+    Escribe un archivo por Datum en carpeta_destino, en una sola pasada sobre los datos y
+    con los archivos escritos en paralelo. formato puede ser 'csv' (por defecto), 'parquet'
+    o 'arrow'; los dos últimos conservan los tipos de cada columna. compresion puede ser
+    None, 'gzip' o 'zstd'. Los registros sin Datum se agregan a los tres archivos, salvo
+    con datum_vacio_aparte=True, que los escribe una sola vez en 'sin_datum'.
+    """
+    grupos, df_datum_vacios = agrupar_por_datum(preparar_exportacion(df, log_queue))
+
+    log_queue.put("\n🔄 Exportando archivos por Datum...")
+    archivos = {}
+    if datum_vacio_aparte:
+        if len(df_datum_vacios):
+            archivos['sin_datum'] = (df_datum_vacios, df_datum_vacios.iloc[0:0], None)
+        df_datum_vacios = df_datum_vacios.iloc[0:0]
+    elif len(df_datum_vacios):
+        log_queue.put(f"   - {len(df_datum_vacios)} registros sin Datum se agregarán a cada archivo.")
+    csv_vacios = df_datum_vacios.to_csv(index=False, header=False, sep=';') if formato == 'csv' and len(df_datum_vacios) else None
+
+    for datum_val, nombre_csv in ARCHIVOS_POR_DATUM.items():
+        if grupos[datum_val].empty and df_datum_vacios.empty:
+            log_queue.put(f"   - ⚠️ No se encontraron registros para Datum '{datum_val}' (ni vacíos con coordenadas).")
+            continue
+        archivos[os.path.splitext(nombre_csv)[0]] = (grupos[datum_val], df_datum_vacios, csv_vacios)
 
-    datums_a_exportar = {'1956': '1956.csv', '1969': '1969.csv', '1984': '1984.csv'}
-    
     archivos_generados = 0
-    for datum_val, nombre_archivo in datums_a_exportar.items():
-        try:
-            df_especifico = df_con_datum[df_con_datum[COL_DATUM].astype(str).str.contains(datum_val, case=False)]
-            df_final = pd.concat([df_especifico, df_datum_vacios], ignore_index=True)
-
-            if not df_final.empty:
-                df_exportar = df_final[columnas_a_exportar].rename(columns=renombrar_columnas)
-                ruta_salida = os.path.join(carpeta_destino, nombre_archivo)
-                df_exportar.to_csv(ruta_salida, index=False, encoding='utf-8-sig', sep=';')
-                log_queue.put(f"   - ✅ Archivo '{nombre_archivo}' generado exitosamente.")
+    with ThreadPoolExecutor(max_workers=max(1, len(archivos))) as pool:
+        tareas = {}
+        for base, (df_grupo, df_vacios, texto_vacios) in archivos.items():
+            nombre = nombre_archivo(base, formato, compresion)
+            ruta_salida = os.path.join(carpeta_destino, nombre)
+            tareas[nombre] = pool.submit(_escribir_archivo_datum, df_grupo, df_vacios, texto_vacios, ruta_salida, formato, compresion)
+        for nombre, tarea in tareas.items():
+            try:
+                tarea.result()
+                log_queue.put(f"   - ✅ Archivo '{nombre}' generado exitosamente.")
                 archivos_generados += 1
-            else:
-                log_queue.put(f"   - ⚠️ No se encontraron registros para Datum '{datum_val}' (ni vacíos con coordenadas).")
-        
-        except Exception as e:
-            log_queue.put(f"   - ❌ ERROR al exportar el archivo '{nombre_archivo}': {e}")
+            except Exception as e:
+                log_queue.put(f"   - ❌ ERROR al exportar el archivo '{nombre}': {e}")
 
     log_queue.put(f"FIN_PROCESO_EXITO:{archivos_generados}")
+    return archivos_generados
 
-class App(tk.Tk):
-    def __init__(self):
-        super().__init__()
-        self.title("Procesador de Derechos de Agua")
-        self.geometry("800x650")
+class Herramienta(ttk.Frame):
+    """Interfaz de la herramienta: App la muestra en su propia ventana y 0_Lanzador.py como pestaña."""
+    titulo = "Procesador de Derechos de Agua"
+    tamano = "800x850"
 
-        self.style = ttk.Style(self)
-        self.style.theme_use('clam')
-        self.style.configure('TButton', font=('Helvetica', 10))
-        self.style.configure('TLabel', font=('Helvetica', 10))
-        self.style.configure('TEntry', font=('Helvetica', 10))
-        self.style.configure('TLabelframe.Label', font=('Helvetica', 11, 'bold'))
-        self.style.configure('Accent.TButton', font=('Helvetica', 10, 'bold'))
+    def __init__(self, master):
+        super().__init__(master, padding="10")
 
         # Variables
         self.ruta_archivo = tk.StringVar()
@@ -239,12 +880,18 @@ class App(tk.Tk):
         self.tipo_derecho = tk.StringVar()
         self.caudal_operador = tk.StringVar()
         self.caudal_valor = tk.StringVar()
-        self.log_queue = queue.Queue()
-
-        main_frame = ttk.Frame(self, padding="10")
-        main_frame.pack(fill=tk.BOTH, expand=True)
+        self.expresion = tk.StringVar()
+        self.poligono = tk.StringVar()
+        self.seleccion_poligono = tk.StringVar()
+        self.radio = tk.StringVar()
+        self.rectangulo = tk.StringVar()
+        self.modo_streaming = tk.BooleanVar(value=False)
+        self.modo_ligero = tk.BooleanVar(value=False)
+        self.formato_salida = tk.StringVar(value='CSV')
+        self.compresion = tk.StringVar(value='Ninguna')
+        self.log_queue = CanalRegistro()
 
-        self.crear_widgets(main_frame)
+        self.crear_widgets(self)
         self.after(100, self.procesar_log_queue)
 
     def crear_widgets(self, parent):
@@ -259,13 +906,18 @@ class App(tk.Tk):
         ttk.Label(io_frame, text="Carpeta Destino:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=2)
         ttk.Entry(io_frame, textvariable=self.ruta_destino, state='readonly').grid(row=1, column=1, sticky=tk.EW, padx=5, pady=2)
         ttk.Button(io_frame, text="Explorar...", command=self.seleccionar_destino).grid(row=1, column=2, padx=5)
+
+        ttk.Label(io_frame, text="Formato de Salida:").grid(row=2, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Combobox(io_frame, textvariable=self.formato_salida, values=['CSV', 'Parquet', 'Arrow'], state='readonly', width=12).grid(row=2, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Label(io_frame, text="Compresión:").grid(row=3, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Combobox(io_frame, textvariable=self.compresion, values=['Ninguna', 'gzip', 'zstd'], state='readonly', width=12).grid(row=3, column=1, sticky=tk.W, padx=5, pady=2)
         io_frame.columnconfigure(1, weight=1)
 
         # --- Frame de Filtros ---
         filters_frame = ttk.LabelFrame(parent, text="2. Criterios de Filtrado", padding="10")
         filters_frame.pack(fill=tk.X, pady=5)
 
-        ttk.Label(filters_frame, text="Comuna (opcional):").grid(row=0, column=0, sticky=tk.W, padx=5, pady=3)
+        ttk.Label(filters_frame, text="Comuna(s) (opcional, separadas por coma):").grid(row=0, column=0, sticky=tk.W, padx=5, pady=3)
         ttk.Entry(filters_frame, textvariable=self.comuna).grid(row=0, column=1, columnspan=2, sticky=tk.EW, padx=5, pady=3)
 
         ttk.Label(filters_frame, text="Naturaleza del Agua:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=3)
@@ -281,8 +933,32 @@ class App(tk.Tk):
         ttk.Combobox(filters_frame, textvariable=self.caudal_operador, values=caudal_operators, state='readonly', width=18).grid(row=3, column=1, sticky=tk.W, padx=5, pady=3)
         ttk.Entry(filters_frame, textvariable=self.caudal_valor).grid(row=3, column=2, sticky=tk.EW, padx=5, pady=3)
 
+        ttk.Label(filters_frame, text="Expresión (opcional, ej. 1 <= caudal < 50):").grid(row=4, column=0, sticky=tk.W, padx=5, pady=3)
+        ttk.Entry(filters_frame, textvariable=self.expresion).grid(row=4, column=1, columnspan=2, sticky=tk.EW, padx=5, pady=3)
+
+        ttk.Checkbutton(filters_frame, text="Lectura en streaming (menor uso de memoria, para libros muy grandes)", variable=self.modo_streaming).grid(row=5, column=0, columnspan=3, sticky=tk.W, padx=5, pady=3)
+        ttk.Checkbutton(filters_frame, text="Modo ligero (sólo las columnas usadas y tipos compactos, menor uso de memoria)", variable=self.modo_ligero).grid(row=6, column=0, columnspan=3, sticky=tk.W, padx=5, pady=3)
+
         filters_frame.columnconfigure(2, weight=1)
 
+        # --- Frame de Filtro Espacial ---
+        spatial_frame = ttk.LabelFrame(parent, text="3. Filtro Espacial (opcional, UTM 19S WGS 84)", padding="10")
+        spatial_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(spatial_frame, text="Polígonos (GeoJSON/WKT):").grid(row=0, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Entry(spatial_frame, textvariable=self.poligono, state='readonly').grid(row=0, column=1, sticky=tk.EW, padx=5, pady=2)
+        ttk.Button(spatial_frame, text="Explorar...", command=self.seleccionar_poligono).grid(row=0, column=2, padx=5)
+
+        ttk.Label(spatial_frame, text="Selección (ej. NOM_CUENCA=Rio Loa):").grid(row=1, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Entry(spatial_frame, textvariable=self.seleccion_poligono).grid(row=1, column=1, columnspan=2, sticky=tk.EW, padx=5, pady=2)
+
+        ttk.Label(spatial_frame, text="Radio (Este, Norte, metros):").grid(row=2, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Entry(spatial_frame, textvariable=self.radio).grid(row=2, column=1, columnspan=2, sticky=tk.EW, padx=5, pady=2)
+
+        ttk.Label(spatial_frame, text="Rectángulo (Este mín, Norte mín, Este máx, Norte máx):").grid(row=3, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Entry(spatial_frame, textvariable=self.rectangulo).grid(row=3, column=1, columnspan=2, sticky=tk.EW, padx=5, pady=2)
+        spatial_frame.columnconfigure(1, weight=1)
+
         # --- Frame de Procesamiento ---
         process_frame = ttk.Frame(parent, padding="10")
         process_frame.pack(fill=tk.X, pady=5)
@@ -317,6 +993,15 @@ class App(tk.Tk):
         self.tipo_derecho.set("")
         self.caudal_operador.set("")
         self.caudal_valor.set("")
+        self.expresion.set("")
+        self.poligono.set("")
+        self.seleccion_poligono.set("")
+        self.radio.set("")
+        self.rectangulo.set("")
+        self.modo_streaming.set(False)
+        self.modo_ligero.set(False)
+        self.formato_salida.set('CSV')
+        self.compresion.set('Ninguna')
         self.progress_bar['value'] = 0
 
         # Limpiar el área de registro
@@ -330,9 +1015,27 @@ class App(tk.Tk):
         if filepath: self.ruta_archivo.set(filepath)
 
     def seleccionar_destino(self):
-        folderpath = filedialog.askdirectory(title="Seleccionar carpeta de destino para los CSV")
+        folderpath = filedialog.askdirectory(title="Seleccionar carpeta de destino para los archivos por Datum")
         if folderpath: self.ruta_destino.set(folderpath)
 
+    def seleccionar_poligono(self):
+        filepath = filedialog.askopenfilename(title="Seleccionar archivo de polígonos", filetypes=(("GeoJSON o WKT", "*.geojson *.json *.wkt *.txt"), ("Todos los archivos", "*.*")))
+        if filepath: self.poligono.set(filepath)
+
+    def leer_filtro_espacial(self) -> dict | None:
+        """Arma filtros['espacial'] desde los campos (ValueError si algún valor no es válido)."""
+        espacial = {}
+        for clave, texto in (('radio', self.radio.get()), ('rectangulo', self.rectangulo.get())):
+            if texto.strip():
+                espacial[clave] = re.split(r'[;,\s]+', texto.strip())
+        if self.poligono.get():
+            espacial['poligono'] = self.poligono.get()
+            espacial['seleccion'] = self.seleccion_poligono.get().strip() or None
+        if not espacial:
+            return None
+        validar_espacial(espacial)
+        return espacial
+
     def iniciar_procesamiento(self):
         if not self.ruta_archivo.get() or not self.ruta_destino.get():
             tk.messagebox.showwarning("Advertencia", "Debe seleccionar un archivo de Excel y una carpeta de destino.")
@@ -348,73 +1051,133 @@ class App(tk.Tk):
                 tk.messagebox.showerror("Error", "El valor del caudal debe ser numérico.")
                 return
 
+        # Se admiten varias comunas separadas por coma.
+        comunas = [c.strip() for c in self.comuna.get().split(',') if c.strip()]
         filtros = {
-            "comuna": self.comuna.get(), "naturaleza": self.naturaleza.get(),
-            "tipo_derecho": self.tipo_derecho.get(), "caudal": caudal_str
+            "comuna": comunas, "naturaleza": self.naturaleza.get(),
+            "tipo_derecho": self.tipo_derecho.get(), "caudal": caudal_str,
+            "expresion": self.expresion.get().strip()
         }
 
         if not filtros['naturaleza'] or not filtros['tipo_derecho']:
             tk.messagebox.showwarning("Advertencia", "'Naturaleza del Agua' y 'Tipo de Derecho' son campos obligatorios.")
             return
 
+        if filtros['expresion']:
+            try:
+                compilar_expresion(filtros['expresion'])
+            except ValueError as e:
+                tk.messagebox.showerror("Error", f"La expresión de filtro no es válida: {e}")
+                return
+
+        try:
+            filtros['espacial'] = self.leer_filtro_espacial()
+        except (OSError, ValueError) as e:
+            tk.messagebox.showerror("Error", f"El filtro espacial no es válido: {e}")
+            return
+
         self.process_button.config(state='disabled')
         self.clear_button.config(state='disabled') # Deshabilitar también al procesar
         self.log_area.config(state='normal')
         self.log_area.delete(1.0, tk.END)
         self.log_area.config(state='disabled')
+        self.log_queue.reiniciar()
         self.progress_bar['value'] = 0
 
-        thread = threading.Thread(target=self.proceso_en_hilo, args=(self.ruta_archivo.get(), self.ruta_destino.get(), filtros))
+        compresion = None if self.compresion.get() == 'Ninguna' else self.compresion.get()
+        thread = threading.Thread(target=self.proceso_en_hilo, args=(self.ruta_archivo.get(), self.ruta_destino.get(), filtros, self.modo_streaming.get(), self.formato_salida.get().lower(), compresion, self.modo_ligero.get()))
         thread.start()
 
-    def proceso_en_hilo(self, ruta_archivo, ruta_destino, filtros):
-        self.progress_bar['value'] = 10
-        df_original = cargar_datos(ruta_archivo, self.log_queue)
-        if df_original is None:
+    def proceso_en_hilo(self, ruta_archivo, ruta_destino, filtros, modo_streaming=False, formato='csv', compresion=None, ligero=False):
+        # Cada etapa queda medida; el informe se guarda en la carpeta destino al terminar.
+        medidor = MedidorEtapas(self.log_queue)
+        try:
+            self.ejecutar_etapas(medidor, ruta_archivo, ruta_destino, filtros, modo_streaming, formato, compresion, ligero)
+        finally:
+            medidor.guardar_informe(ruta_informe(ruta_destino), extra={'herramienta': 'filtrar_db', 'archivo': ruta_archivo})
+            # Cierra el registro también cuando el proceso se detuvo por un error.
+            self.log_queue.put("FIN_PROCESO")
             self.finalizar_proceso()
-            return
-        self.progress_bar['value'] = 25
 
-        df_filtrado = filtrar_datos(df_original, filtros, self.log_queue)
+    def ejecutar_etapas(self, medidor, ruta_archivo, ruta_destino, filtros, modo_streaming, formato, compresion, ligero=False):
+        self.progress_bar['value'] = 10
+        if modo_streaming:
+            # La lectura en streaming ya aplica los filtros mientras recorre el libro.
+            with medidor.etapa('cargar_datos_filtrados') as etapa:
+                df_filtrado = cargar_datos_filtrados(ruta_archivo, filtros, self.log_queue)
+                etapa.filas_salida = len(df_filtrado) if df_filtrado is not None else 0
+            if df_filtrado is None:
+                return
+        else:
+            with medidor.etapa('cargar_datos') as etapa:
+                df_original = cargar_datos(ruta_archivo, self.log_queue, ligero=ligero,
+                                           columnas_extra=columnas_de_expresiones([filtros]))
+                etapa.filas_salida = len(df_original) if df_original is not None else 0
+            if df_original is None:
+                return
+            self.progress_bar['value'] = 25
+            with medidor.etapa('filtrar_datos', filas_entrada=len(df_original)) as etapa:
+                df_filtrado = filtrar_datos(df_original, filtros, self.log_queue)
+                etapa.filas_salida = len(df_filtrado) if df_filtrado is not None else 0
+            # La tabla completa ya no se necesita: se libera antes de las etapas siguientes.
+            del df_original
+            if df_filtrado is None:
+                return
+
         if df_filtrado.empty:
             self.log_queue.put("FIN_PROCESO_SIN_DATOS")
-            self.finalizar_proceso()
             return
         self.progress_bar['value'] = 50
 
-        df_procesado = procesar_coordenadas(df_filtrado, self.log_queue)
+        with medidor.etapa('procesar_coordenadas', filas_entrada=len(df_filtrado)) as etapa:
+            df_procesado = procesar_coordenadas(df_filtrado, self.log_queue, como_entero=ligero)
+            etapa.filas_salida = len(df_procesado)
+        if filtros.get('espacial'):
+            with medidor.etapa('filtrar_espacial', filas_entrada=len(df_procesado)) as etapa:
+                df_procesado = filtrar_espacial(df_procesado, filtros['espacial'], self.log_queue)
+                etapa.filas_salida = len(df_procesado)
         if df_procesado.empty:
             self.log_queue.put("FIN_PROCESO_SIN_DATOS")
-            self.finalizar_proceso()
             return
         self.progress_bar['value'] = 75
 
-        exportar_por_datum(df_procesado, self.log_queue, ruta_destino)
+        with medidor.etapa('exportar_por_datum', filas_entrada=len(df_procesado)) as etapa:
+            etapa.filas_salida = exportar_por_datum(df_procesado, self.log_queue, ruta_destino, formato=formato, compresion=compresion)
         self.progress_bar['value'] = 100
-        self.finalizar_proceso()
 
     def finalizar_proceso(self):
         self.process_button.config(state='normal')
         self.clear_button.config(state='normal') # Volver a habilitar
 
     def procesar_log_queue(self):
-        try:
-            while True:
-                msg = self.log_queue.get_nowait()
-                if isinstance(msg, str) and msg.startswith("FIN_PROCESO_EXITO:"):
-                    num_archivos = msg.split(":")[1]
-                    tk.messagebox.showinfo("Proceso Completado", f"¡Proceso finalizado!\nSe generaron {num_archivos} archivos en la carpeta de destino.")
-                elif msg == "FIN_PROCESO_SIN_DATOS":
-                     tk.messagebox.showinfo("Proceso Finalizado", "El proceso terminó pero no se encontraron registros que cumplan los criterios para exportar.")
-                else:
-                    self.log_area.config(state='normal')
-                    self.log_area.insert(tk.END, str(msg) + '\n')
-                    self.log_area.config(state='disabled')
-                    self.log_area.see(tk.END)
-        except queue.Empty:
-            pass
+        # Un solo ciclo por tick: las líneas llegan agrupadas y se insertan de una vez.
+        for tipo, msg in self.log_queue.drenar():
+            if tipo == 'texto':
+                mostrar_en_registro(self.log_area, msg)
+                continue
+            if isinstance(msg, str) and msg.startswith("FIN_PROCESO_EXITO:"):
+                num_archivos = msg.split(":")[1]
+                tk.messagebox.showinfo("Proceso Completado", f"¡Proceso finalizado!\nSe generaron {num_archivos} archivos en la carpeta de destino.")
+            elif msg == "FIN_PROCESO_SIN_DATOS":
+                 tk.messagebox.showinfo("Proceso Finalizado", "El proceso terminó pero no se encontraron registros que cumplan los criterios para exportar.")
         self.after(100, self.procesar_log_queue)
 
+class App(tk.Tk):
+    def __init__(self):
+        super().__init__()
+        self.title(Herramienta.titulo)
+        self.geometry(Herramienta.tamano)
+
+        self.style = ttk.Style(self)
+        self.style.theme_use('clam')
+        self.style.configure('TButton', font=('Helvetica', 10))
+        self.style.configure('TLabel', font=('Helvetica', 10))
+        self.style.configure('TEntry', font=('Helvetica', 10))
+        self.style.configure('TLabelframe.Label', font=('Helvetica', 11, 'bold'))
+        self.style.configure('Accent.TButton', font=('Helvetica', 10, 'bold'))
+
+        Herramienta(self).pack(fill=tk.BOTH, expand=True)
+
 if __name__ == "__main__":
     app = App()
     app.mainloop()
\ No newline at end of file
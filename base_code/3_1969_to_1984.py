@@ -1,61 +1,99 @@
 import pandas as pd
-import numpy as np
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext, messagebox
 import threading
+import multiprocessing
+from registro import CanalRegistro, mostrar_en_registro
+from instrumentacion import MedidorEtapas, ruta_informe
+from intercambio import formato_de_ruta, guardar_intermedio, leer_intermedio
 import queue
-import pyproj
+from transformacion import CRS_POR_DATUM, seleccionar_registros as _seleccionar_registros, transformar_datum, transformar_csv_por_bloques
 
 # --- CONFIGURACIÓN DE SISTEMAS DE REFERENCIA (CRS) ---
-CRS_ORIGEN = "EPSG:24819"  # SAD69 / UTM zone 19S
-CRS_DESTINO = "EPSG:32719" # WGS 84 / UTM zone 19S
+DATUM_ORIGEN = '1969'
+CRS_ORIGEN = CRS_POR_DATUM[DATUM_ORIGEN]  # SAD69 / UTM zone 19S
 
-def proceso_de_transformacion(ruta_entrada: str, ruta_salida: str, log_queue: queue.Queue):
+def seleccionar_registros(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Devuelve los registros con Datum no vacío y que contenga '1969'.
+    """
+    return _seleccionar_registros(df, DATUM_ORIGEN)
+
+def transformar_coordenadas(df_filtrado: pd.DataFrame, log_queue: queue.Queue, paralelo: bool = False) -> pd.DataFrame:
+    """
+    Transforma las coordenadas Norte/Este desde CRS_ORIGEN a WGS 84 (transformacion.CRS_DESTINO).
+    Descarta filas con coordenadas inválidas, en cero o que no se pudieron transformar.
+    """
+    return transformar_datum(df_filtrado, DATUM_ORIGEN, log_queue, paralelo=paralelo)
+
+def proceso_por_bloques(ruta_entrada: str, ruta_salida: str, log_queue: queue.Queue, paralelo: bool = False):
+    """
+    Variante de proceso_de_transformacion para archivos muy grandes: lee, transforma y
+    escribe por bloques, con memoria constante y avance informado en cada bloque.
+    """
+    if formato_de_ruta(ruta_entrada) != 'csv' or formato_de_ruta(ruta_salida) != 'csv':
+        log_queue.put("   - ℹ️ El modo por bloques sólo admite CSV; se procesará el archivo completo.")
+        proceso_de_transformacion(ruta_entrada, ruta_salida, log_queue, paralelo=paralelo)
+        return
+    medidor = MedidorEtapas(log_queue)
+    try:
+        log_queue.put(f"🔄 Procesando por bloques el archivo: {ruta_entrada.split('/')[-1]}")
+        with medidor.etapa('transformar_por_bloques') as etapa:
+            n_seleccionados, n_escritos = transformar_csv_por_bloques(ruta_entrada, ruta_salida, DATUM_ORIGEN, log_queue, paralelo=paralelo)
+            etapa.filas_entrada, etapa.filas_salida = n_seleccionados, n_escritos
+
+        if n_seleccionados == 0:
+            log_queue.put("⏹️ No se encontraron registros con Datum 1969 para procesar.")
+            log_queue.put("FIN_SIN_DATOS")
+            return
+        if n_escritos == 0:
+            log_queue.put("⏹️ Ningún registro pudo ser transformado exitosamente.")
+            log_queue.put("FIN_CON_ERROR")
+            return
+
+        log_queue.put(f"✅ Se procesaron y transformaron {n_escritos} registros.")
+        log_queue.put(f"✨ ¡Éxito! Archivo guardado en: {ruta_salida.split('/')[-1]}")
+        log_queue.put(f"FIN_CON_EXITO:{n_escritos}")
+
+    except Exception as e:
+        log_queue.put(f"❌ Ocurrió un error: {e}")
+        log_queue.put("FIN_CON_ERROR")
+    finally:
+        medidor.guardar_informe(ruta_informe(ruta_salida), extra={'herramienta': f'conversor_{DATUM_ORIGEN}', 'archivo': ruta_entrada})
+
+def proceso_de_transformacion(ruta_entrada: str, ruta_salida: str, log_queue: queue.Queue, paralelo: bool = False):
     """
     Función principal de procesamiento que se ejecuta en un hilo separado.
     """
+    medidor = MedidorEtapas(log_queue)
     try:
         log_queue.put(f"🔄 Procesando archivo: {ruta_entrada.split('/')[-1]}")
-        df = pd.read_csv(ruta_entrada, sep=';', dtype={'Expediente': str})
+        with medidor.etapa('leer_intermedio') as etapa:
+            df = leer_intermedio(ruta_entrada)
+            etapa.filas_salida = len(df)
         
         # 1. Filtrar por Datum no vacío y que contenga '1969'
-        df.dropna(subset=['Datum'], inplace=True)
-        df_filtrado = df[df['Datum'].astype(str).str.contains('1969', case=False)]
+        df_filtrado = seleccionar_registros(df)
 
         if df_filtrado.empty:
             log_queue.put("⏹️ No se encontraron registros con Datum 1969 para procesar.")
             log_queue.put("FIN_SIN_DATOS")
             return
 
-        # 2. Asegurar que las coordenadas son numéricas y eliminar filas inválidas o con ceros
-        df_filtrado['Norte'] = pd.to_numeric(df_filtrado['Norte'], errors='coerce')
-        df_filtrado['Este'] = pd.to_numeric(df_filtrado['Este'], errors='coerce')
-        df_filtrado.dropna(subset=['Norte', 'Este'], inplace=True)
-        df_filtrado = df_filtrado[(df_filtrado['Norte'] != 0) & (df_filtrado['Este'] != 0)]
-        
-        # 3. Transformar
-        log_queue.put(f"   - Transformando {len(df_filtrado)} registros desde {CRS_ORIGEN}...")
-        transformer = pyproj.Transformer.from_crs(pyproj.CRS(CRS_ORIGEN), pyproj.CRS(CRS_DESTINO), always_xy=True)
-        este_transformado, norte_transformado = transformer.transform(df_filtrado['Este'].values, df_filtrado['Norte'].values)
-        
-        norte_transformado[np.isinf(norte_transformado)] = np.nan
-        este_transformado[np.isinf(este_transformado)] = np.nan
-
-        df_filtrado['Este'] = este_transformado
-        df_filtrado['Norte'] = norte_transformado
-        df_filtrado.dropna(subset=['Norte', 'Este'], inplace=True)
+        # 2. Limpiar y transformar las coordenadas
+        with medidor.etapa('transformar_coordenadas', filas_entrada=len(df_filtrado)) as etapa:
+            df_filtrado = transformar_coordenadas(df_filtrado, log_queue, paralelo=paralelo)
+            etapa.filas_salida = len(df_filtrado)
 
         if df_filtrado.empty:
             log_queue.put("⏹️ Ningún registro pudo ser transformado exitosamente.")
             log_queue.put("FIN_CON_ERROR")
             return
 
-        # 4. Finalizar y guardar
-        df_filtrado['Norte'] = df_filtrado['Norte'].round(0).astype(np.int64)
-        df_filtrado['Este'] = df_filtrado['Este'].round(0).astype(np.int64)
-        df_filtrado['Datum'] = 'WGS 84'
-
-        df_filtrado.to_csv(ruta_salida, index=False, sep=';')
+        # 3. Guardar
+        with medidor.etapa('guardar_intermedio', filas_entrada=len(df_filtrado)) as etapa:
+            guardar_intermedio(df_filtrado, ruta_salida)
+            etapa.filas_salida = len(df_filtrado)
         log_queue.put(f"✅ Se procesaron y transformaron {len(df_filtrado)} registros.")
         log_queue.put(f"✨ ¡Éxito! Archivo guardado en: {ruta_salida.split('/')[-1]}")
         log_queue.put(f"FIN_CON_EXITO:{len(df_filtrado)}")
@@ -63,27 +101,24 @@ def proceso_de_transformacion(ruta_entrada: str, ruta_salida: str, log_queue: qu
     except Exception as e:
         log_queue.put(f"❌ Ocurrió un error: {e}")
         log_queue.put("FIN_CON_ERROR")
+    finally:
+        medidor.guardar_informe(ruta_informe(ruta_salida), extra={'herramienta': f'conversor_{DATUM_ORIGEN}', 'archivo': ruta_entrada})
 
-class App(tk.Tk):
-    def __init__(self):
-        super().__init__()
-        self.title("Convertidor de Datum 1969 a 1984")
-        self.geometry("800x400")
+class Herramienta(ttk.Frame):
+    """Interfaz de la herramienta: App la muestra en su propia ventana y 0_Lanzador.py como pestaña."""
+    titulo = "Convertidor de Datum 1969 a 1984"
+    tamano = "800x400"
 
-        self.style = ttk.Style(self)
-        self.style.theme_use('clam')
-        self.style.configure('TButton', font=('Helvetica', 10))
-        self.style.configure('TLabel', font=('Helvetica', 10))
-        self.style.configure('TLabelframe.Label', font=('Helvetica', 11, 'bold'))
-        self.style.configure('Accent.TButton', font=('Helvetica', 10, 'bold'))
+    def __init__(self, master):
+        super().__init__(master, padding="10")
 
         self.ruta_entrada = tk.StringVar()
         self.ruta_salida = tk.StringVar()
-        self.log_queue = queue.Queue()
+        self.por_bloques = tk.BooleanVar(value=False)
+        self.paralelo = tk.BooleanVar(value=False)
+        self.log_queue = CanalRegistro()
 
-        main_frame = ttk.Frame(self, padding="10")
-        main_frame.pack(fill=tk.BOTH, expand=True)
-        self.crear_widgets(main_frame)
+        self.crear_widgets(self)
         self.after(100, self.procesar_log_queue)
 
     def crear_widgets(self, parent):
@@ -98,6 +133,9 @@ class App(tk.Tk):
         ttk.Entry(io_frame, textvariable=self.ruta_salida, state='readonly').grid(row=1, column=1, sticky=tk.EW, padx=5, pady=4)
         ttk.Button(io_frame, text="Guardar como...", command=self.seleccionar_salida).grid(row=1, column=2, padx=5)
         
+        ttk.Checkbutton(io_frame, text="Procesar por bloques (archivos muy grandes, memoria constante)", variable=self.por_bloques).grid(row=2, column=0, columnspan=3, sticky=tk.W, padx=5, pady=4)
+        ttk.Checkbutton(io_frame, text="Usar todos los núcleos del procesador (transformación en paralelo)", variable=self.paralelo).grid(row=3, column=0, columnspan=3, sticky=tk.W, padx=5, pady=4)
+
         io_frame.columnconfigure(1, weight=1)
 
         process_frame = ttk.Frame(parent, padding="10")
@@ -115,16 +153,18 @@ class App(tk.Tk):
         self.log_area.pack(fill=tk.BOTH, expand=True)
 
     def seleccionar_entrada(self):
-        filepath = filedialog.askopenfilename(title="Seleccione el archivo CSV con Datum 1969", filetypes=(("Archivos CSV", "*.csv"),))
+        filepath = filedialog.askopenfilename(title="Seleccione el archivo con Datum 1969", filetypes=(("Archivos CSV", "*.csv"), ("Parquet", "*.parquet"), ("Arrow", "*.arrow *.feather")))
         if filepath: self.ruta_entrada.set(filepath)
 
     def seleccionar_salida(self):
-        filepath = filedialog.asksaveasfilename(title="Guardar archivo transformado como...", defaultextension=".csv", filetypes=(("Archivos CSV", "*.csv"),))
+        filepath = filedialog.asksaveasfilename(title="Guardar archivo transformado como...", defaultextension=".csv", filetypes=(("Archivos CSV", "*.csv"), ("Parquet", "*.parquet"), ("Arrow", "*.arrow *.feather")))
         if filepath: self.ruta_salida.set(filepath)
 
     def limpiar_campos(self):
         self.ruta_entrada.set("")
         self.ruta_salida.set("")
+        self.por_bloques.set(False)
+        self.paralelo.set(False)
         self.log_area.config(state='normal')
         self.log_area.delete(1.0, tk.END)
         self.log_area.insert(tk.END, "Campos limpiados. Listo para un nuevo proceso.\n")
@@ -140,37 +180,51 @@ class App(tk.Tk):
         self.log_area.config(state='normal')
         self.log_area.delete(1.0, tk.END)
         self.log_area.config(state='disabled')
+        self.log_queue.reiniciar()
 
-        thread = threading.Thread(target=proceso_de_transformacion, args=(self.ruta_entrada.get(), self.ruta_salida.get(), self.log_queue))
+        proceso = proceso_por_bloques if self.por_bloques.get() else proceso_de_transformacion
+        thread = threading.Thread(target=proceso, args=(self.ruta_entrada.get(), self.ruta_salida.get(), self.log_queue, self.paralelo.get()))
         thread.start()
 
     def procesar_log_queue(self):
-        try:
-            while True:
-                msg = self.log_queue.get_nowait()
-                if isinstance(msg, str) and msg.startswith("FIN_CON_EXITO:"):
-                    self.finalizar_proceso()
-                    num_reg = msg.split(":")[1]
-                    messagebox.showinfo("Proceso Completado", f"¡Transformación finalizada!\nSe generó un archivo con {num_reg} registros.")
-                elif msg == "FIN_SIN_DATOS":
-                    self.finalizar_proceso()
-                    messagebox.showinfo("Proceso Finalizado", "No se encontraron registros válidos para procesar.")
-                elif msg == "FIN_CON_ERROR":
-                     self.finalizar_proceso()
-                     messagebox.showerror("Error", "El proceso falló. Revise el registro de actividad.")
-                else:
-                    self.log_area.config(state='normal')
-                    self.log_area.insert(tk.END, str(msg) + '\n')
-                    self.log_area.config(state='disabled')
-                    self.log_area.see(tk.END)
-        except queue.Empty:
-            pass
+        # Un solo ciclo por tick: las líneas llegan agrupadas y se insertan de una vez.
+        for tipo, msg in self.log_queue.drenar():
+            if tipo == 'texto':
+                mostrar_en_registro(self.log_area, msg)
+                continue
+            if isinstance(msg, str) and msg.startswith("FIN_CON_EXITO:"):
+                self.finalizar_proceso()
+                num_reg = msg.split(":")[1]
+                messagebox.showinfo("Proceso Completado", f"¡Transformación finalizada!\nSe generó un archivo con {num_reg} registros.")
+            elif msg == "FIN_SIN_DATOS":
+                self.finalizar_proceso()
+                messagebox.showinfo("Proceso Finalizado", "No se encontraron registros válidos para procesar.")
+            elif msg == "FIN_CON_ERROR":
+                 self.finalizar_proceso()
+                 messagebox.showerror("Error", "El proceso falló. Revise el registro de actividad.")
         self.after(100, self.procesar_log_queue)
 
     def finalizar_proceso(self):
         self.process_button.config(state='normal')
         self.clear_button.config(state='normal')
 
+class App(tk.Tk):
+    def __init__(self):
+        super().__init__()
+        self.title(Herramienta.titulo)
+        self.geometry(Herramienta.tamano)
+
+        self.style = ttk.Style(self)
+        self.style.theme_use('clam')
+        self.style.configure('TButton', font=('Helvetica', 10))
+        self.style.configure('TLabel', font=('Helvetica', 10))
+        self.style.configure('TLabelframe.Label', font=('Helvetica', 11, 'bold'))
+        self.style.configure('Accent.TButton', font=('Helvetica', 10, 'bold'))
+
+        Herramienta(self).pack(fill=tk.BOTH, expand=True)
+
 if __name__ == "__main__":
+    # Necesario para el modo en paralelo en los ejecutables de PyInstaller.
+    multiprocessing.freeze_support()
     app = App()
     app.mainloop()
\ No newline at end of file
@@ -4,68 +4,232 @@ from tkinter import ttk, filedialog, messagebox, scrolledtext
 import threading
 import queue
 import os
+import math
+import itertools
+import numpy as np
+from registro import CanalRegistro, mostrar_en_registro
+from instrumentacion import MedidorEtapas, ruta_informe
+from intercambio import leer_intermedio
 
-def procesar_y_combinar(rutas: dict, log_queue: queue.Queue):
+# --- DEDUPLICACIÓN POR EXPEDIENTE ---
+PRECEDENCIA_ORIGEN = ('1984', '1956', '1969')  # Origen preferido cuando un Expediente se repite.
+TOLERANCIA_CONFLICTO_M = 1.0                   # Diferencia de coordenadas (m) que se informa como conflicto.
+COLUMNAS_CONFLICTOS = ['Expediente', 'Registros', 'Origenes', 'Origen Elegido', 'Norte Min', 'Norte Max', 'Este Min', 'Este Max']
+
+def deduplicar_por_expediente(df: pd.DataFrame, log_queue: queue.Queue, precedencia: tuple = PRECEDENCIA_ORIGEN,
+                              tolerancia: float = TOLERANCIA_CONFLICTO_M) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Deja un registro canónico por Expediente. Entre los repetidos gana el de la columna
+    'Origen' que aparece primero en precedencia; a igual origen, el que tiene ambas
+    coordenadas y, si aún empatan, el primero. Los registros sin Expediente se conservan.
+    Las claves se agrupan por hash (factorize), sin ordenar la tabla.
+    Devuelve (registros canónicos sin la columna Origen, conflictos), donde conflictos tiene
+    una fila por Expediente repetido cuyas coordenadas difieren en más de tolerancia metros.
+    """
+    clave = df['Expediente'].astype('string').str.strip().replace('', pd.NA)
+    codigos, claves_unicas = pd.factorize(clave)  # -1 para los registros sin Expediente
+    norte = pd.to_numeric(df['Norte'], errors='coerce').to_numpy(dtype=float)
+    este = pd.to_numeric(df['Este'], errors='coerce').to_numpy(dtype=float)
+    origen = df['Origen'].astype(str).to_numpy()
+
+    # Rango de cada registro: primero la precedencia del origen, luego si tiene ambas coordenadas.
+    rango_origen = pd.Series(origen).map({o: i for i, o in enumerate(precedencia)}).fillna(len(precedencia)).to_numpy(dtype=int)
+    rango = rango_origen * 2 + (np.isnan(norte) | np.isnan(este))
+    con_clave = codigos >= 0
+    por_clave = pd.DataFrame({'clave': codigos, 'rango': rango})
+    rango_minimo = por_clave.groupby('clave', sort=False)['rango'].transform('min').to_numpy()
+    candidato = rango == rango_minimo
+    canonico = ~con_clave | (candidato & ~por_clave['clave'].where(candidato).duplicated().to_numpy())
+
+    # Conflictos: Expedientes repetidos cuyas coordenadas no coinciden.
+    repetidos = con_clave & (pd.Series(codigos).map(pd.Series(codigos[con_clave]).value_counts()).to_numpy() > 1)
+    df_conflictos = pd.DataFrame(columns=COLUMNAS_CONFLICTOS)
+    if repetidos.any():
+        lista_origenes = sorted(pd.unique(origen[repetidos]), key=lambda o: precedencia.index(o) if o in precedencia else len(precedencia))
+        datos = pd.DataFrame({'clave': codigos[repetidos], 'Norte': norte[repetidos], 'Este': este[repetidos]})
+        for o in lista_origenes:
+            datos[o] = origen[repetidos] == o
+        resumen = datos.groupby('clave', sort=False).agg(**{
+            'Registros': ('Norte', 'size'), 'Norte Min': ('Norte', 'min'), 'Norte Max': ('Norte', 'max'),
+            'Este Min': ('Este', 'min'), 'Este Max': ('Este', 'max'), **{o: (o, 'max') for o in lista_origenes},
+        })
+        en_conflicto = ((resumen['Norte Max'] - resumen['Norte Min']) > tolerancia) | ((resumen['Este Max'] - resumen['Este Min']) > tolerancia)
+        resumen = resumen[en_conflicto]
+        if not resumen.empty:
+            # Orígenes presentes en cada clave, armados columna a columna y no grupo a grupo.
+            origenes = pd.Series('', index=resumen.index, dtype=object)
+            for o in lista_origenes:
+                origenes = origenes + np.where(resumen[o], o + ',', '')
+            elegido = pd.Series(origen[canonico & con_clave], index=codigos[canonico & con_clave])
+            resumen = resumen.assign(**{
+                'Expediente': claves_unicas[resumen.index],
+                'Origenes': origenes.str.rstrip(',').to_numpy(),
+                'Origen Elegido': elegido.reindex(resumen.index).to_numpy(),
+            })
+            df_conflictos = resumen[COLUMNAS_CONFLICTOS].reset_index(drop=True)
+
+    n_eliminados = int((~canonico).sum())
+    log_queue.put(f"   - Se eliminaron {n_eliminados} registros con Expediente repetido (precedencia: {' > '.join(precedencia)}).")
+    if not df_conflictos.empty:
+        log_queue.put(f"   - ⚠️ {len(df_conflictos)} Expedientes repetidos tienen coordenadas distintas (ver informe de conflictos).")
+    return df[canonico].drop(columns='Origen').reset_index(drop=True), df_conflictos
+
+def ruta_conflictos(ruta_salida: str) -> str:
+    """Ruta del informe de conflictos que acompaña al archivo final."""
+    return os.path.splitext(ruta_salida)[0] + '_conflictos.csv'
+
+def guardar_conflictos(df_conflictos: pd.DataFrame | None, ruta_salida: str, log_queue: queue.Queue):
+    """Escribe el informe de conflictos junto al archivo final (sólo si hay conflictos)."""
+    if df_conflictos is None or df_conflictos.empty:
+        return
+    ruta = ruta_conflictos(ruta_salida)
+    df_conflictos.to_csv(ruta, index=False, sep=';', encoding='utf-8-sig')
+    log_queue.put(f"   - 📄 Informe de conflictos guardado en: {ruta}")
+
+def combinar_dataframes(df_84: pd.DataFrame, df_56_convertido: pd.DataFrame, df_69_convertido: pd.DataFrame, log_queue: queue.Queue,
+                        deduplicar: bool = True, precedencia: tuple = PRECEDENCIA_ORIGEN) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Une los registros 1984 (descartando los que no tienen Datum) con los ya convertidos
+    desde 1956 y 1969, deja un registro por Expediente (ver deduplicar_por_expediente) y
+    estandariza la columna Datum. Devuelve (resultado, conflictos de coordenadas).
+    """
+    condicion_mantener = df_84['Datum'].notna() & (df_84['Datum'].astype(str).str.strip() != '')
+    df_84_filtrado = df_84[condicion_mantener]
+    log_queue.put(f"   - Se cargaron {len(df_84_filtrado)} registros válidos desde el archivo base 1984.")
+    log_queue.put(f"   - Se cargaron {len(df_56_convertido)} registros desde el archivo convertido de 1956.")
+    log_queue.put(f"   - Se cargaron {len(df_69_convertido)} registros desde el archivo convertido de 1969.")
+
+    # Combinar los tres DataFrames, recordando de qué archivo viene cada registro
+    df_final = pd.concat([
+        df_84_filtrado.assign(Origen='1984'),
+        df_56_convertido.assign(Origen='1956'),
+        df_69_convertido.assign(Origen='1969'),
+    ], ignore_index=True)
+    log_queue.put(f"\n✅ Combinación inicial completa. Total de filas: {len(df_final)}")
+    if deduplicar:
+        df_final, df_conflictos = deduplicar_por_expediente(df_final, log_queue, precedencia=precedencia)
+    else:
+        df_final, df_conflictos = df_final.drop(columns='Origen'), pd.DataFrame(columns=COLUMNAS_CONFLICTOS)
+    return unificar_datum(df_final, log_queue), df_conflictos
+
+def unificar_datum(df_final: pd.DataFrame, log_queue: queue.Queue) -> pd.DataFrame:
+    """
+    Estandariza la columna Datum a '1984' en el resultado ya combinado.
+    """
+    df_final['Datum'] = 1984
+    log_queue.put("   - Columna 'Datum' estandarizada a '1984'.")
+    return df_final
+
+# --- EXPORTACIÓN A EXCEL EN STREAMING ---
+MAX_FILAS_EXCEL = 1_048_576           # Límite de filas por hoja de Excel (incluye el encabezado).
+FILAS_POR_BLOQUE_EXCEL = 50_000       # Filas que se convierten y escriben de una vez.
+
+def exportar_excel_streaming(df: pd.DataFrame, ruta_salida: str, log_queue: queue.Queue,
+                             filas_por_hoja: int = MAX_FILAS_EXCEL - 1) -> int:
+    """
+    Escribe el DataFrame en un .xlsx con el modo de sólo escritura de openpyxl, que vuelca
+    las filas a disco a medida que se agregan, por lo que la memoria usada no crece con el
+    tamaño del archivo. Si se supera el límite de filas de Excel, los datos continúan en
+    hojas adicionales (Sheet1, Sheet2, ...), cada una con su encabezado. Informa el avance
+    por la cola con mensajes {'progreso_exportacion': porcentaje}. Devuelve el número de hojas.
+    """
+    import openpyxl
+
+    libro = openpyxl.Workbook(write_only=True)
+    columnas = list(df.columns)
+    n_filas = len(df)
+    n_hojas = max(1, math.ceil(n_filas / filas_por_hoja))
+    escritas = 0
+
+    for n_hoja in range(n_hojas):
+        hoja = libro.create_sheet(title=f"Sheet{n_hoja + 1}")
+        hoja.append(columnas)
+        fin_hoja = min(n_filas, (n_hoja + 1) * filas_por_hoja)
+        for inicio in range(n_hoja * filas_por_hoja, fin_hoja, FILAS_POR_BLOQUE_EXCEL):
+            bloque = df.iloc[inicio:min(inicio + FILAS_POR_BLOQUE_EXCEL, fin_hoja)]
+            # Las celdas vacías (NaN/NA) se escriben como celdas en blanco, igual que to_excel.
+            bloque = bloque.astype(object).where(bloque.notna(), None)
+            for fila in bloque.itertuples(index=False, name=None):
+                hoja.append(fila)
+            escritas += len(bloque)
+            log_queue.put({'progreso_exportacion': 100 * escritas / max(n_filas, 1)})
+
+    if n_hojas > 1:
+        log_queue.put(f"   - El resultado supera el límite de filas de Excel y se repartió en {n_hojas} hojas.")
+    libro.save(ruta_salida)
+    return n_hojas
+
+def guardar_excel_en_hilo(df: pd.DataFrame, ruta_salida: str, log_queue: queue.Queue, df_conflictos: pd.DataFrame | None = None,
+                          medidor: MedidorEtapas | None = None):
+    """
+    Guarda el resultado final (y su informe de conflictos, si lo hay) fuera del hilo de la
+    interfaz y avisa el término por la cola. Con medidor, también mide la exportación y
+    deja el informe de rendimiento junto al archivo.
+    """
+    medidor = medidor or MedidorEtapas(log_queue)
+    try:
+        log_queue.put(f"\n💾 Guardando {len(df)} registros en '{os.path.basename(ruta_salida)}'...")
+        with medidor.etapa('exportar_excel', filas_entrada=len(df)) as etapa:
+            exportar_excel_streaming(df, ruta_salida, log_queue)
+            etapa.filas_salida = len(df)
+        log_queue.put("✅ Archivo final guardado.")
+        guardar_conflictos(df_conflictos, ruta_salida, log_queue)
+        medidor.guardar_informe(ruta_informe(ruta_salida), extra={'herramienta': 'conversor_final'})
+        log_queue.put({'exportacion_finalizada': len(df)})
+    except Exception as e:
+        log_queue.put(f"❌ No se pudo guardar el archivo: {e}")
+        log_queue.put({'exportacion_finalizada': None, 'error': str(e)})
+
+def procesar_y_combinar(rutas: dict, log_queue: queue.Queue, deduplicar: bool = True, precedencia: tuple = PRECEDENCIA_ORIGEN):
     """
     Función que contiene toda la lógica de procesamiento de archivos.
     Se ejecuta en un hilo separado para no congelar la interfaz.
     """
+    medidor = MedidorEtapas(log_queue)
     try:
         log_queue.put("\n🔄 Cargando y procesando archivos...")
 
-        # Cargar y filtrar el archivo base 1984
-        df_84 = pd.read_csv(rutas['1984'], sep=';', dtype={'Expediente': str})
-        condicion_mantener = df_84['Datum'].notna() & (df_84['Datum'].astype(str).str.strip() != '')
-        df_84_filtrado = df_84[condicion_mantener]
-        log_queue.put(f"   - Se cargaron {len(df_84_filtrado)} registros válidos desde el archivo base 1984.")
+        # Cada archivo puede ser CSV, Parquet o Arrow (según su extensión).
+        with medidor.etapa('leer_intermedios') as etapa:
+            df_84 = leer_intermedio(rutas['1984'])
+            df_56_convertido = leer_intermedio(rutas['56_conv'])
+            df_69_convertido = leer_intermedio(rutas['69_conv'])
+            etapa.filas_salida = len(df_84) + len(df_56_convertido) + len(df_69_convertido)
 
-        # Cargar los archivos ya convertidos
-        df_56_convertido = pd.read_csv(rutas['56_conv'], sep=';', dtype={'Expediente': str})
-        log_queue.put(f"   - Se cargaron {len(df_56_convertido)} registros desde el archivo convertido de 1956.")
-
-        df_69_convertido = pd.read_csv(rutas['69_conv'], sep=';', dtype={'Expediente': str})
-        log_queue.put(f"   - Se cargaron {len(df_69_convertido)} registros desde el archivo convertido de 1969.")
-
-        # Combinar los tres DataFrames
-        df_final = pd.concat([df_84_filtrado, df_56_convertido, df_69_convertido], ignore_index=True)
-        log_queue.put(f"\n✅ Combinación inicial completa. Total de filas: {len(df_final)}")
+        with medidor.etapa('combinar_dataframes', filas_entrada=etapa.filas_salida) as etapa:
+            df_final, df_conflictos = combinar_dataframes(
+                df_84, df_56_convertido, df_69_convertido, log_queue, deduplicar=deduplicar, precedencia=precedencia
+            )
+            etapa.filas_salida = len(df_final)
         
-        # Estandarizar la columna Datum a '1984'
-        df_final['Datum'] = 1984
-        log_queue.put("   - Columna 'Datum' estandarizada a '1984'.")
-        
-        # Devolver el resultado a través de la cola
-        log_queue.put({'dataframe_final': df_final})
+        # Devolver el resultado a través de la cola (el informe se completa al guardar)
+        log_queue.put({'dataframe_final': df_final, 'conflictos': df_conflictos, 'medidor': medidor})
 
     except Exception as e:
         log_queue.put(f"❌ Ocurrió un error: {e}")
         log_queue.put({'dataframe_final': None})
 
 
-class App(tk.Tk):
-    def __init__(self):
-        super().__init__()
-        self.title("Unificador de Archivos Datum")
-        self.geometry("800x450")
+class Herramienta(ttk.Frame):
+    """Interfaz de la herramienta: App la muestra en su propia ventana y 0_Lanzador.py como pestaña."""
+    titulo = "Unificador de Archivos Datum"
+    tamano = "800x520"
 
-        self.style = ttk.Style(self)
-        self.style.theme_use('clam')
-        self.style.configure('TButton', font=('Helvetica', 10))
-        self.style.configure('TLabel', font=('Helvetica', 10))
-        self.style.configure('TLabelframe.Label', font=('Helvetica', 11, 'bold'))
-        self.style.configure('Accent.TButton', font=('Helvetica', 10, 'bold'))
+    def __init__(self, master):
+        super().__init__(master, padding="10")
 
         # Variables
         self.ruta_1984 = tk.StringVar()
         self.ruta_56_convertido = tk.StringVar()
         self.ruta_69_convertido = tk.StringVar()
-        self.log_queue = queue.Queue()
+        self.deduplicar = tk.BooleanVar(value=True)
+        self.precedencia = tk.StringVar(value=' > '.join(PRECEDENCIA_ORIGEN))
+        self.log_queue = CanalRegistro()
         self.dataframe_resultado = None
+        self.conflictos_resultado = None
+        self.medidor_resultado = None
 
-        main_frame = ttk.Frame(self, padding="10")
-        main_frame.pack(fill=tk.BOTH, expand=True)
-
-        self.crear_widgets(main_frame)
+        self.crear_widgets(self)
         self.after(100, self.procesar_log_queue)
 
     def crear_widgets(self, parent):
@@ -90,11 +254,21 @@ class App(tk.Tk):
         
         files_frame.columnconfigure(1, weight=1)
 
+        # --- Frame de Duplicados ---
+        dup_frame = ttk.LabelFrame(parent, text="2. Expedientes Repetidos", padding="10")
+        dup_frame.pack(fill=tk.X, pady=5)
+        ttk.Checkbutton(dup_frame, text="Dejar un registro por Expediente", variable=self.deduplicar).grid(row=0, column=0, sticky=tk.W, padx=5)
+        ttk.Label(dup_frame, text="Precedencia:").grid(row=0, column=1, sticky=tk.W, padx=5)
+        opciones = [' > '.join(orden) for orden in itertools.permutations(PRECEDENCIA_ORIGEN)]
+        ttk.Combobox(dup_frame, textvariable=self.precedencia, values=opciones, state='readonly', width=20).grid(row=0, column=2, sticky=tk.W, padx=5)
+
         # --- Frame de Procesamiento ---
         process_frame = ttk.Frame(parent, padding="10")
         process_frame.pack(fill=tk.X, pady=5)
         self.process_button = ttk.Button(process_frame, text="Unificar Archivos", command=self.iniciar_proceso, style='Accent.TButton')
         self.process_button.pack(pady=5)
+        self.progress_bar = ttk.Progressbar(process_frame, orient='horizontal', mode='determinate')
+        self.progress_bar.pack(fill=tk.X, pady=(5, 0))
 
         # --- Frame de Log ---
         log_frame = ttk.LabelFrame(parent, text="Registro de Actividad", padding="10")
@@ -103,7 +277,7 @@ class App(tk.Tk):
         self.log_area.pack(fill=tk.BOTH, expand=True)
 
     def seleccionar_archivo(self, string_var, title):
-        filepath = filedialog.askopenfilename(title=title, filetypes=(("Archivos CSV", "*.csv"), ("Todos los archivos", "*.*")))
+        filepath = filedialog.askopenfilename(title=title, filetypes=(("Archivos CSV", "*.csv"), ("Parquet", "*.parquet"), ("Arrow", "*.arrow *.feather"), ("Todos los archivos", "*.*")))
         if filepath: string_var.set(filepath)
 
     def iniciar_proceso(self):
@@ -120,24 +294,27 @@ class App(tk.Tk):
         self.log_area.config(state='normal')
         self.log_area.delete(1.0, tk.END)
         self.log_area.config(state='disabled')
+        self.log_queue.reiniciar()
         
-        thread = threading.Thread(target=procesar_y_combinar, args=(rutas, self.log_queue))
+        precedencia = tuple(self.precedencia.get().split(' > '))
+        thread = threading.Thread(target=procesar_y_combinar, args=(rutas, self.log_queue, self.deduplicar.get(), precedencia))
         thread.start()
 
     def procesar_log_queue(self):
-        try:
-            while True:
-                msg = self.log_queue.get_nowait()
-                if isinstance(msg, dict) and 'dataframe_final' in msg:
-                    self.dataframe_resultado = msg['dataframe_final']
-                    self.finalizar_proceso()
-                else:
-                    self.log_area.config(state='normal')
-                    self.log_area.insert(tk.END, str(msg) + '\n')
-                    self.log_area.config(state='disabled')
-                    self.log_area.see(tk.END)
-        except queue.Empty:
-            pass
+        # Un solo ciclo por tick: las líneas llegan agrupadas y se insertan de una vez.
+        for tipo, msg in self.log_queue.drenar():
+            if tipo == 'texto':
+                mostrar_en_registro(self.log_area, msg)
+                continue
+            if isinstance(msg, dict) and 'dataframe_final' in msg:
+                self.dataframe_resultado = msg['dataframe_final']
+                self.conflictos_resultado = msg.get('conflictos')
+                self.medidor_resultado = msg.get('medidor')
+                self.finalizar_proceso()
+            elif isinstance(msg, dict) and 'progreso_exportacion' in msg:
+                self.progress_bar['value'] = msg['progreso_exportacion']
+            elif isinstance(msg, dict) and 'exportacion_finalizada' in msg:
+                self.finalizar_exportacion(msg)
         self.after(100, self.procesar_log_queue)
 
     def finalizar_proceso(self):
@@ -152,11 +329,34 @@ class App(tk.Tk):
             filetypes=[("Archivo Excel", "*.xlsx")]
         )
         if output_path:
-            try:
-                self.dataframe_resultado.to_excel(output_path, index=False, engine='openpyxl')
-                messagebox.showinfo("Proceso Completado", f"El archivo final se ha generado exitosamente con {len(self.dataframe_resultado)} registros.")
-            except Exception as e:
-                messagebox.showerror("Error al Guardar", f"No se pudo guardar el archivo:\n{e}")
+            # La escritura se hace en otro hilo para no congelar la ventana con archivos grandes.
+            self.process_button.config(state='disabled')
+            self.progress_bar['value'] = 0
+            thread = threading.Thread(target=guardar_excel_en_hilo, args=(self.dataframe_resultado, output_path, self.log_queue, self.conflictos_resultado, self.medidor_resultado))
+            thread.start()
+
+    def finalizar_exportacion(self, msg):
+        self.process_button.config(state='normal')
+        if msg['exportacion_finalizada'] is None:
+            messagebox.showerror("Error al Guardar", f"No se pudo guardar el archivo:\n{msg.get('error', '')}")
+        else:
+            self.progress_bar['value'] = 100
+            messagebox.showinfo("Proceso Completado", f"El archivo final se ha generado exitosamente con {msg['exportacion_finalizada']} registros.")
+
+class App(tk.Tk):
+    def __init__(self):
+        super().__init__()
+        self.title(Herramienta.titulo)
+        self.geometry(Herramienta.tamano)
+
+        self.style = ttk.Style(self)
+        self.style.theme_use('clam')
+        self.style.configure('TButton', font=('Helvetica', 10))
+        self.style.configure('TLabel', font=('Helvetica', 10))
+        self.style.configure('TLabelframe.Label', font=('Helvetica', 11, 'bold'))
+        self.style.configure('Accent.TButton', font=('Helvetica', 10, 'bold'))
+
+        Herramienta(self).pack(fill=tk.BOTH, expand=True)
 
 if __name__ == "__main__":
     app = App()
@@ -0,0 +1,253 @@
+"""
+Medición de rendimiento de la suite con libros sintéticos (ver generar_libro_sintetico.py).
+
+Para cada tamaño se mide por separado cada etapa del filtrador (1_Filtrar_DB.py), los dos
+conversores, el unificador (4_Conversor_final.py) y el flujo completo de pipeline.py, y se
+guarda la mediana de varias repeticiones. Además se registra una huella (hash) de cada
+resultado, para detectar cambios de comportamiento y no sólo de velocidad. También se mide
+el arranque: cuánto tarda en importarse el lanzador y cada herramienta en un intérprete nuevo.
+
+Los resultados se pueden guardar como línea base y comparar en ejecuciones posteriores:
+una etapa se informa como regresión si tarda más que la línea base en más de la
+tolerancia, y un resultado distinto se informa siempre.
+
+Uso:
+    python benchmark.py --tamanos 10000 100000 --guardar-linea-base linea_base.json
+    python benchmark.py --tamanos 10000 100000 --linea-base linea_base.json
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import platform
+import queue
+import statistics
+import sys
+
+import pandas as pd
+
+import generar_libro_sintetico
+from instrumentacion import MedidorEtapas
+from pipeline import LogConsola, ejecutar_pipeline
+
+filtrar_db = importlib.import_module('1_Filtrar_DB')
+conversor_1956 = importlib.import_module('2_1956_to_1984')
+conversor_1969 = importlib.import_module('3_1969_to_1984')
+conversor_final = importlib.import_module('4_Conversor_final')
+lanzador = importlib.import_module('0_Lanzador')
+
+VERSION_RESULTADOS = 1
+FILTROS_BENCHMARK = {'comuna': '', 'naturaleza': 'Subterranea', 'tipo_derecho': 'Consuntivo', 'caudal': '>= 1'}
+TOLERANCIA = 0.15       # Aumento relativo de tiempo que se considera regresión.
+RUIDO_SEGUNDOS = 0.05   # Diferencias menores se ignoran (etapas demasiado cortas para medir).
+
+
+def huella_dataframe(df: pd.DataFrame) -> str:
+    """Hash del contenido de un DataFrame, independiente del orden de las filas."""
+    hashes = pd.util.hash_pandas_object(df.astype(str), index=False)
+    return hashlib.sha256(hashes.sort_values().to_numpy().tobytes()).hexdigest()[:16]
+
+
+def huella_archivo(ruta: str) -> str | None:
+    return filtrar_db.hash_contenido(ruta)[:16] if os.path.exists(ruta) else None
+
+
+def preparar_entradas(n_filas: int, carpeta: str, semilla: int) -> dict:
+    """Genera (o reutiliza) el libro y los CSV intermedios sintéticos de un tamaño."""
+    carpeta_entrada = os.path.join(carpeta, 'entradas', f"{n_filas}_{semilla}")
+    os.makedirs(carpeta_entrada, exist_ok=True)
+    ruta_libro = os.path.join(carpeta_entrada, 'libro.xlsx')
+    if n_filas > generar_libro_sintetico.MAX_FILAS_LIBRO:
+        ruta_libro = None
+    elif not os.path.exists(ruta_libro):
+        print(f"   Generando libro de {n_filas} filas...", flush=True)
+        generar_libro_sintetico.escribir_libro(generar_libro_sintetico.generar_tabla(n_filas, semilla), ruta_libro)
+    carpeta_csv = os.path.join(carpeta_entrada, 'csv')
+    rutas_csv = {d: os.path.join(carpeta_csv, nombre) for d, nombre in filtrar_db.ARCHIVOS_POR_DATUM.items()}
+    if not all(os.path.exists(r) for r in rutas_csv.values()):
+        print(f"   Generando CSV intermedios de {n_filas} filas...", flush=True)
+        rutas_csv = generar_libro_sintetico.escribir_csv_intermedios(n_filas, carpeta_csv, semilla)
+    return {'libro': ruta_libro, 'csv': rutas_csv}
+
+
+def medir_filtrador(medidor: MedidorEtapas, ruta_libro: str, carpeta_salida: str, log, ligero: bool = False) -> dict:
+    """Etapas de 1_Filtrar_DB.py por separado, sin caché."""
+    with medidor.etapa('filtrador.cargar_datos') as etapa:
+        df = filtrar_db.cargar_datos(ruta_libro, log, usar_cache=False, ligero=ligero)
+        etapa.filas_salida = len(df)
+    with medidor.etapa('filtrador.filtrar_datos', filas_entrada=len(df)) as etapa:
+        df_filtrado = filtrar_db.filtrar_datos(df, FILTROS_BENCHMARK, log)
+        etapa.filas_salida = len(df_filtrado)
+    with medidor.etapa('filtrador.procesar_coordenadas', filas_entrada=len(df_filtrado)) as etapa:
+        df_procesado = filtrar_db.procesar_coordenadas(df_filtrado, log, como_entero=ligero)
+        etapa.filas_salida = len(df_procesado)
+    with medidor.etapa('filtrador.exportar_por_datum', filas_entrada=len(df_procesado)) as etapa:
+        filtrar_db.exportar_por_datum(df_procesado, log, carpeta_salida)
+        etapa.filas_salida = len(df_procesado)
+    return {f"filtrador.{nombre}": huella_archivo(os.path.join(carpeta_salida, nombre))
+            for nombre in filtrar_db.ARCHIVOS_POR_DATUM.values()}
+
+
+def medir_conversores_y_unificador(medidor: MedidorEtapas, rutas_csv: dict, carpeta_salida: str, log) -> dict:
+    """Los dos conversores y el unificador, sobre los CSV intermedios sintéticos."""
+    rutas_conv = {}
+    for datum_val, modulo in (('1956', conversor_1956), ('1969', conversor_1969)):
+        rutas_conv[datum_val] = os.path.join(carpeta_salida, f"{datum_val}_conv.csv")
+        with medidor.etapa(f"conversor_{datum_val}") as etapa:
+            modulo.proceso_de_transformacion(rutas_csv[datum_val], rutas_conv[datum_val], log)
+            etapa.filas_salida = sum(1 for _ in open(rutas_conv[datum_val], encoding='utf-8')) - 1 if os.path.exists(rutas_conv[datum_val]) else 0
+
+    cola = queue.Queue()
+    with medidor.etapa('unificador') as etapa:
+        conversor_final.procesar_y_combinar({'1984': rutas_csv['1984'], '56_conv': rutas_conv['1956'], '69_conv': rutas_conv['1969']}, cola)
+        resultado = {}
+        while not cola.empty():
+            msg = cola.get()
+            if isinstance(msg, dict) and 'dataframe_final' in msg:
+                resultado = msg
+        df_final = resultado.get('dataframe_final')
+        etapa.filas_salida = len(df_final) if df_final is not None else 0
+    huellas = {f"conversor_{d}": huella_archivo(r) for d, r in rutas_conv.items()}
+    huellas['unificador'] = huella_dataframe(df_final) if df_final is not None else None
+    return huellas
+
+
+def medir_pipeline(medidor: MedidorEtapas, ruta_libro: str, carpeta_salida: str, log, ligero: bool = False) -> dict:
+    """El flujo completo de pipeline.py, de punta a punta."""
+    with medidor.etapa('pipeline.completo') as etapa:
+        df_final = ejecutar_pipeline(ruta_libro, FILTROS_BENCHMARK, None, log, usar_cache=False, ligero=ligero)
+        etapa.filas_salida = len(df_final) if df_final is not None else 0
+    return {'pipeline.completo': huella_dataframe(df_final) if df_final is not None else None}
+
+
+def medir_tamano(n_filas: int, carpeta: str, repeticiones: int, semilla: int, ligero: bool = False,
+                 trazar_memoria: bool = False) -> dict:
+    entradas = preparar_entradas(n_filas, carpeta, semilla)
+    log = LogConsola(silencioso=True)
+    tiempos: dict[str, list[dict]] = {}
+    huellas = {}
+    for i in range(repeticiones):
+        carpeta_salida = os.path.join(carpeta, 'salidas', str(n_filas))
+        os.makedirs(carpeta_salida, exist_ok=True)
+        medidor = MedidorEtapas(trazar_memoria=trazar_memoria)
+        if entradas['libro']:
+            huellas.update(medir_filtrador(medidor, entradas['libro'], carpeta_salida, log, ligero))
+        huellas.update(medir_conversores_y_unificador(medidor, entradas['csv'], carpeta_salida, log))
+        if entradas['libro']:
+            huellas.update(medir_pipeline(medidor, entradas['libro'], carpeta_salida, log, ligero))
+        for datos in medidor.informe()['etapas']:
+            tiempos.setdefault(datos['etapa'], []).append(datos)
+
+    etapas = {}
+    for nombre, medidas in tiempos.items():
+        segundos = statistics.median(m['segundos'] for m in medidas)
+        ultima = medidas[-1]
+        etapas[nombre] = {
+            'segundos': round(segundos, 4),
+            'cpu_segundos': round(statistics.median(m['cpu_segundos'] for m in medidas), 4),
+            'filas_salida': ultima['filas_salida'],
+            'rss_mb': ultima['rss_mb'],
+            'memoria_pico_mb': ultima['memoria_pico_mb'],
+        }
+        pico = f"  {ultima['memoria_pico_mb']:>8.1f} MB pico" if ultima['memoria_pico_mb'] is not None else ''
+        print(f"   {nombre:<35} {segundos:>9.3f} s  {ultima['filas_salida'] or 0:>9} filas{pico}", flush=True)
+    return {'etapas': etapas, 'huellas': huellas}
+
+
+def medir_arranque(repeticiones: int) -> dict:
+    """Mediana del tiempo de importación en frío del lanzador y de cada herramienta."""
+    medidas: dict[str, list[float]] = {}
+    for _ in range(repeticiones):
+        for herramienta, importaciones in lanzador.medir_arranque().items():
+            medidas.setdefault(herramienta, []).append(sum(m['segundos'] for m in importaciones))
+    arranque = {}
+    for herramienta, tiempos in medidas.items():
+        segundos = statistics.median(tiempos)
+        arranque[herramienta] = {'segundos': round(segundos, 4)}
+        print(f"   {'importar ' + herramienta:<35} {segundos:>9.3f} s", flush=True)
+    return arranque
+
+
+def comparar(resultados: dict, linea_base: dict, tolerancia: float = TOLERANCIA) -> list[str]:
+    """Devuelve la lista de regresiones (tiempo o resultado) respecto de la línea base."""
+    problemas = []
+    for herramienta, medida in resultados.get('arranque', {}).items():
+        referencia = linea_base.get('arranque', {}).get(herramienta)
+        if referencia is None:
+            continue
+        diferencia = medida['segundos'] - referencia['segundos']
+        if diferencia > RUIDO_SEGUNDOS and medida['segundos'] > referencia['segundos'] * (1 + tolerancia):
+            problemas.append(f"Arranque de {herramienta}: {referencia['segundos']:.3f} s -> {medida['segundos']:.3f} s "
+                             f"(+{diferencia / referencia['segundos']:.0%})")
+    for tamano, actual in resultados['tamanos'].items():
+        base = linea_base.get('tamanos', {}).get(tamano)
+        if base is None:
+            continue
+        for nombre, medida in actual['etapas'].items():
+            referencia = base['etapas'].get(nombre)
+            if referencia is None:
+                continue
+            diferencia = medida['segundos'] - referencia['segundos']
+            if diferencia > RUIDO_SEGUNDOS and medida['segundos'] > referencia['segundos'] * (1 + tolerancia):
+                problemas.append(f"{tamano} filas, {nombre}: {referencia['segundos']:.3f} s -> {medida['segundos']:.3f} s "
+                                 f"(+{diferencia / referencia['segundos']:.0%})")
+        for nombre, huella in actual['huellas'].items():
+            if nombre in base['huellas'] and base['huellas'][nombre] != huella:
+                problemas.append(f"{tamano} filas, {nombre}: el resultado cambió respecto de la línea base.")
+    return problemas
+
+
+def crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Mide el rendimiento de la suite con libros sintéticos.")
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[10_000, 100_000], help="Cantidades de filas a medir.")
+    parser.add_argument('--carpeta', default='benchmark_datos', help="Carpeta para los libros generados y las salidas.")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--salida', help="Guarda los resultados en este JSON.")
+    parser.add_argument('--linea-base', help="Compara con los resultados guardados en este JSON.")
+    parser.add_argument('--guardar-linea-base', metavar='ARCHIVO', help="Guarda los resultados como nueva línea base.")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA, help="Aumento relativo de tiempo tolerado (0.15 = 15%%).")
+    parser.add_argument('--ligero', action='store_true', help="Mide el filtrador y el pipeline en modo ligero.")
+    parser.add_argument('--trazar-memoria', action='store_true', help="Mide el pico de memoria de cada etapa con tracemalloc (más lento).")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = crear_parser().parse_args(argv)
+    resultados = {
+        'version': VERSION_RESULTADOS,
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'pandas': pd.__version__,
+        'repeticiones': args.repeticiones,
+        'ligero': args.ligero,
+        'tamanos': {},
+    }
+    print("\n🚀 Arranque", flush=True)
+    resultados['arranque'] = medir_arranque(args.repeticiones)
+    for n_filas in args.tamanos:
+        print(f"\n📏 {n_filas} filas", flush=True)
+        resultados['tamanos'][str(n_filas)] = medir_tamano(n_filas, args.carpeta, args.repeticiones, args.semilla,
+                                                            ligero=args.ligero, trazar_memoria=args.trazar_memoria)
+
+    for ruta in (args.salida, args.guardar_linea_base):
+        if ruta:
+            with open(ruta, 'w', encoding='utf-8') as f:
+                json.dump(resultados, f, ensure_ascii=False, indent=2)
+
+    if args.linea_base:
+        with open(args.linea_base, encoding='utf-8') as f:
+            linea_base = json.load(f)
+        problemas = comparar(resultados, linea_base, args.tolerancia)
+        if problemas:
+            print("\n❌ Regresiones respecto de la línea base:")
+            for problema in problemas:
+                print(f"   - {problema}")
+            return 1
+        print("\n✅ Sin regresiones respecto de la línea base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+Lenguaje de expresiones para filtrar por columnas numéricas y de fecha.
+
+Una expresión se compila una sola vez en un árbol de funciones; al evaluarla sobre una
+tabla, cada condición es una comparación vectorizada de NumPy sobre columnas ya
+convertidas a número (o a fecha), y todas se combinan en una única máscara booleana.
+La tabla no se recorta ni se copia hasta aplicar esa máscara.
+
+Ejemplos:
+    caudal >= 10
+    1 <= caudal < 50 y norte > 7000000
+    caudal en [1, 2, 5] o (este < 300000 y no caudal > 100)
+    fecha >= 2015-01-01
+    "Caudal Anual Prom" != 0
+
+Gramática (las palabras clave no distinguen mayúsculas):
+    expresion   := conjuncion (('o' | 'or' | '|') conjuncion)*
+    conjuncion  := negacion (('y' | 'and' | '&') negacion)*
+    negacion    := ('no' | 'not') negacion | '(' expresion ')' | condicion
+    condicion   := operando (comparador operando)+       (cadenas como 1 <= caudal < 10)
+                 | campo ('en' | 'in') '[' valor (',' valor)* ']'
+    comparador  := '<' | '<=' | '>' | '>=' | '=' | '==' | '!='
+    operando    := campo | valor
+    campo       := nombre (ej. caudal) | nombre de columna entre comillas dobles
+    valor       := número (punto decimal) | fecha AAAA-MM-DD
+
+Los campos se resuelven al evaluar, con una función obtener(campo, tipo) que devuelve la
+columna como arreglo de NumPy ('numero': float, NaN si falta; 'fecha': datetime64, NaT si
+falta). Como en pandas, una comparación con un valor faltante es falsa, salvo '!='.
+"""
+import operator
+import re
+from functools import lru_cache
+
+import numpy as np
+
+COMPARADORES = {
+    '<=': operator.le, '>=': operator.ge, '<': operator.lt, '>': operator.gt,
+    '==': operator.eq, '=': operator.eq, '!=': operator.ne,
+}
+PALABRAS_O = ('o', 'or', '|')
+PALABRAS_Y = ('y', 'and', '&')
+PALABRAS_NO = ('no', 'not')
+PALABRAS_EN = ('en', 'in')
+
+_PATRON_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<fecha>\d{4}-\d{2}-\d{2})
+      | (?P<numero>-?\d+(?:\.\d+)?)
+      | (?P<comparador><=|>=|==|!=|<|>|=)
+      | (?P<simbolo>[()\[\],|&])
+      | "(?P<columna>[^"]+)"
+      | (?P<nombre>[^\W\d]\w*)
+    )""", re.VERBOSE)
+
+
+def _tokenizar(texto: str) -> list[tuple[str, object]]:
+    tokens = []
+    posicion = 0
+    texto = texto.rstrip()
+    while posicion < len(texto):
+        match = _PATRON_TOKEN.match(texto, posicion)
+        if not match:
+            raise ValueError(f"Expresión no válida cerca de '{texto[posicion:].strip()[:20]}'.")
+        tipo = match.lastgroup
+        valor = match.group(tipo)
+        if tipo == 'numero':
+            valor = float(valor)
+        elif tipo == 'fecha':
+            try:
+                valor = np.datetime64(valor, 'D')
+            except ValueError:
+                raise ValueError(f"Fecha no válida: '{valor}'.")
+        elif tipo == 'nombre':
+            valor = valor.casefold()
+        tokens.append((tipo, valor))
+        posicion = match.end()
+    return tokens
+
+
+class _Analizador:
+    """Descenso recursivo sobre la lista de tokens; cada regla devuelve una función."""
+
+    def __init__(self, tokens: list[tuple[str, object]]):
+        self.tokens = tokens
+        self.posicion = 0
+        self.campos: list[str] = []
+
+    def _actual(self):
+        return self.tokens[self.posicion] if self.posicion < len(self.tokens) else (None, None)
+
+    def _es(self, *palabras) -> bool:
+        tipo, valor = self._actual()
+        return tipo in ('nombre', 'simbolo') and valor in palabras
+
+    def _esperar(self, simbolo: str):
+        if not self._es(simbolo):
+            raise ValueError(f"Se esperaba '{simbolo}' en la expresión.")
+        self.posicion += 1
+
+    def analizar(self):
+        if not self.tokens:
+            raise ValueError("La expresión está vacía.")
+        funcion = self._expresion()
+        if self.posicion < len(self.tokens):
+            raise ValueError(f"Sobra '{self.tokens[self.posicion][1]}' al final de la expresión.")
+        return funcion
+
+    def _expresion(self):
+        partes = [self._conjuncion()]
+        while self._es(*PALABRAS_O):
+            self.posicion += 1
+            partes.append(self._conjuncion())
+        return partes[0] if len(partes) == 1 else _combinar(partes, np.logical_or)
+
+    def _conjuncion(self):
+        partes = [self._negacion()]
+        while self._es(*PALABRAS_Y):
+            self.posicion += 1
+            partes.append(self._negacion())
+        return partes[0] if len(partes) == 1 else _combinar(partes, np.logical_and)
+
+    def _negacion(self):
+        if self._es(*PALABRAS_NO):
+            self.posicion += 1
+            interna = self._negacion()
+            return lambda obtener: ~interna(obtener)
+        if self._es('('):
+            self.posicion += 1
+            interna = self._expresion()
+            self._esperar(')')
+            return interna
+        return self._condicion()
+
+    def _operando(self) -> tuple[str, object]:
+        tipo, valor = self._actual()
+        if tipo in ('numero', 'fecha'):
+            self.posicion += 1
+            return 'valor', valor
+        if tipo == 'columna' or (tipo == 'nombre' and valor not in PALABRAS_O + PALABRAS_Y + PALABRAS_NO + PALABRAS_EN):
+            self.posicion += 1
+            if valor not in self.campos:
+                self.campos.append(valor)
+            return 'campo', valor
+        raise ValueError(f"Se esperaba un campo o un valor en lugar de '{valor}'." if tipo else "La expresión está incompleta.")
+
+    def _condicion(self):
+        izquierdo = self._operando()
+        if self._es(*PALABRAS_EN):
+            if izquierdo[0] != 'campo':
+                raise ValueError("'en' debe ir después de un campo, ej. caudal en [1, 2].")
+            self.posicion += 1
+            self._esperar('[')
+            valores = [self._valor()]
+            while self._es(','):
+                self.posicion += 1
+                valores.append(self._valor())
+            self._esperar(']')
+            return _pertenencia(izquierdo[1], valores)
+
+        comparaciones = []
+        while self._actual()[0] == 'comparador':
+            comparador = self._actual()[1]
+            self.posicion += 1
+            derecho = self._operando()
+            comparaciones.append(_comparacion(izquierdo, comparador, derecho))
+            izquierdo = derecho
+        if not comparaciones:
+            raise ValueError(f"Falta un comparador después de '{izquierdo[1]}'.")
+        return comparaciones[0] if len(comparaciones) == 1 else _combinar(comparaciones, np.logical_and)
+
+    def _valor(self):
+        tipo, valor = self._actual()
+        if tipo not in ('numero', 'fecha'):
+            raise ValueError(f"Se esperaba un número o una fecha en lugar de '{valor}'.")
+        self.posicion += 1
+        return valor
+
+
+def _tipo_de(valor) -> str:
+    return 'fecha' if isinstance(valor, np.datetime64) else 'numero'
+
+
+def _combinar(partes: list, operacion):
+    def evaluar(obtener):
+        mascara = partes[0](obtener)
+        for parte in partes[1:]:
+            mascara = operacion(mascara, parte(obtener), out=mascara)
+        return mascara
+    return evaluar
+
+
+def _comparacion(izquierdo: tuple, comparador: str, derecho: tuple):
+    if izquierdo[0] == 'valor' and derecho[0] == 'valor':
+        raise ValueError("Cada comparación debe incluir al menos un campo.")
+    literales = [v for t, v in (izquierdo, derecho) if t == 'valor']
+    tipo = _tipo_de(literales[0]) if literales else 'numero'
+    funcion = COMPARADORES[comparador]
+
+    def operando(lado, obtener):
+        return obtener(lado[1], tipo) if lado[0] == 'campo' else lado[1]
+
+    return lambda obtener: np.asarray(funcion(operando(izquierdo, obtener), operando(derecho, obtener)))
+
+
+def _pertenencia(campo: str, valores: list):
+    tipos = {_tipo_de(v) for v in valores}
+    if len(tipos) > 1:
+        raise ValueError("Una lista 'en' no puede mezclar números y fechas.")
+    tipo = tipos.pop()
+    lista = np.array(valores, dtype='datetime64[ns]' if tipo == 'fecha' else float)
+    return lambda obtener: np.isin(obtener(campo, tipo), lista)
+
+
+class ExpresionFiltro:
+    """Expresión ya compilada. campos lista los nombres que usa, en orden de aparición."""
+
+    def __init__(self, texto: str):
+        analizador = _Analizador(_tokenizar(texto))
+        self._evaluar = analizador.analizar()
+        self.texto = texto.strip()
+        self.campos = tuple(analizador.campos)
+
+    def evaluar(self, obtener) -> np.ndarray:
+        """Máscara booleana de las filas que cumplen la expresión."""
+        return self._evaluar(obtener)
+
+    def __repr__(self):
+        return f"ExpresionFiltro({self.texto!r})"
+
+
+@lru_cache(maxsize=256)
+def compilar_expresion(texto: str) -> ExpresionFiltro:
+    """Compila una expresión (ValueError si no es válida). Las ya compiladas se reutilizan."""
+    return ExpresionFiltro(texto)
+
+
+def normalizar_nombre(nombre: str) -> str:
+    """Nombre de columna sin saltos de línea ni espacios repetidos, en minúsculas."""
+    return ' '.join(str(nombre).split()).casefold()
+
+
+def resolver_campo(campo: str, alias: dict[str, str], columnas) -> str:
+    """
+    Devuelve la columna de la tabla a la que se refiere un campo: primero por alias
+    (ej. 'caudal') y si no, por nombre de columna sin distinguir espacios ni mayúsculas.
+    """
+    candidatos = [alias[campo]] if campo in alias else []
+    candidatos.append(campo)
+    por_nombre = {normalizar_nombre(c): c for c in columnas}
+    for candidato in candidatos:
+        if normalizar_nombre(candidato) in por_nombre:
+            return por_nombre[normalizar_nombre(candidato)]
+    disponibles = ', '.join(sorted(alias))
+    raise ValueError(f"El campo '{campo}' no existe en la tabla (alias disponibles: {disponibles}).")
@@ -0,0 +1,301 @@
+"""
+Filtro espacial de los puntos de captación: rectángulo, radio alrededor de un punto y
+polígonos (cuencas, acuíferos) leídos de un archivo GeoJSON o WKT.
+
+Los puntos se ordenan en una grilla uniforme sobre Este/Norte (IndiceGrilla). Cada
+consulta toma primero, con búsquedas binarias, los puntos de las celdas que tocan el
+rectángulo envolvente de la geometría, y sólo a esos les aplica la prueba exacta
+(distancia, o punto en polígono por la regla par-impar). Una vez construido el índice,
+las consultas sobre millones de puntos toman milisegundos.
+
+Todas las coordenadas se comparan en WGS 84 / UTM 19S (transformacion.CRS_DESTINO): los
+puntos en PSAD56 o SAD69 se proyectan antes de consultar, y los polígonos en longitud/
+latitud (lo habitual en GeoJSON) también. pyproj sólo se usa si hace falta proyectar.
+
+Especificación del filtro (filtros['espacial']):
+    {'rectangulo': [este_min, norte_min, este_max, norte_max],
+     'radio': [este, norte, metros],
+     'poligono': 'cuencas.geojson', 'seleccion': 'NOM_CUENCA=Rio Loa'}
+Las condiciones que se indiquen se combinan con 'y'.
+"""
+import json
+import os
+import queue
+import re
+from functools import lru_cache
+
+import numpy as np
+
+PUNTOS_POR_CELDA = 64   # Ocupación media buscada al elegir el tamaño de celda.
+CRS_GEOGRAFICO = "EPSG:4326"
+
+# Un polígono es una lista de anillos (arreglos N x 2): el primero es el borde exterior
+# y los siguientes, los huecos.
+Poligono = list[np.ndarray]
+
+
+# --- ÍNDICE DE GRILLA ---
+class IndiceGrilla:
+    """
+    Índice de puntos en una grilla uniforme. Los puntos se ordenan por celda
+    (clave = columna * filas + fila), así los de una columna de celdas contiguas quedan en
+    un solo tramo del arreglo ordenado. Los puntos sin coordenadas (NaN) no se indexan.
+    """
+
+    def __init__(self, este: np.ndarray, norte: np.ndarray, puntos_por_celda: int = PUNTOS_POR_CELDA):
+        self.este = np.asarray(este, dtype=np.float64)
+        self.norte = np.asarray(norte, dtype=np.float64)
+        validos = np.flatnonzero(np.isfinite(self.este) & np.isfinite(self.norte))
+        self.n = len(self.este)
+        if len(validos) == 0:
+            self.tam_celda, self.x0, self.y0, self.columnas, self.filas = 1.0, 0.0, 0.0, 1, 1
+            self.orden = self.claves = np.empty(0, dtype=np.int64)
+            return
+
+        x, y = self.este[validos], self.norte[validos]
+        self.x0, self.y0 = float(x.min()), float(y.min())
+        ancho, alto = float(x.max()) - self.x0, float(y.max()) - self.y0
+        n_celdas = max(1, len(validos) // puntos_por_celda)
+        self.tam_celda = max(1.0, np.sqrt(max(ancho * alto, 1.0) / n_celdas), max(ancho, alto) / 65_536)
+        self.columnas = int(ancho // self.tam_celda) + 1
+        self.filas = int(alto // self.tam_celda) + 1
+
+        claves = ((x - self.x0) // self.tam_celda).astype(np.int64) * self.filas + ((y - self.y0) // self.tam_celda).astype(np.int64)
+        orden = np.argsort(claves, kind='stable')
+        self.orden = validos[orden]
+        self.claves = claves[orden]
+
+    def _celda(self, valor: float, origen: float, limite: int) -> int:
+        return int(np.clip((valor - origen) // self.tam_celda, 0, limite - 1))
+
+    def candidatos(self, este_min: float, norte_min: float, este_max: float, norte_max: float) -> np.ndarray:
+        """Índices de los puntos en las celdas que tocan el rectángulo (sin prueba exacta)."""
+        if (len(self.orden) == 0 or este_max < self.x0 or norte_max < self.y0
+                or este_min > self.x0 + self.columnas * self.tam_celda or norte_min > self.y0 + self.filas * self.tam_celda):
+            return np.empty(0, dtype=np.int64)
+        columnas = np.arange(self._celda(este_min, self.x0, self.columnas), self._celda(este_max, self.x0, self.columnas) + 1)
+        fila_min, fila_max = self._celda(norte_min, self.y0, self.filas), self._celda(norte_max, self.y0, self.filas)
+        inicios = np.searchsorted(self.claves, columnas * self.filas + fila_min, side='left')
+        fines = np.searchsorted(self.claves, columnas * self.filas + fila_max, side='right')
+        largos = fines - inicios
+        # Concatena los tramos [inicio, fin) sin recorrerlos uno a uno.
+        desplazamientos = np.repeat(inicios - np.concatenate(([0], np.cumsum(largos)[:-1])), largos)
+        return self.orden[desplazamientos + np.arange(largos.sum())]
+
+    def _mascara(self, indices: np.ndarray) -> np.ndarray:
+        mascara = np.zeros(self.n, dtype=bool)
+        mascara[indices] = True
+        return mascara
+
+    def en_rectangulo(self, este_min: float, norte_min: float, este_max: float, norte_max: float) -> np.ndarray:
+        """Máscara de los puntos dentro del rectángulo (bordes incluidos)."""
+        c = self.candidatos(este_min, norte_min, este_max, norte_max)
+        x, y = self.este[c], self.norte[c]
+        return self._mascara(c[(x >= este_min) & (x <= este_max) & (y >= norte_min) & (y <= norte_max)])
+
+    def en_radio(self, este: float, norte: float, metros: float) -> np.ndarray:
+        """Máscara de los puntos a metros o menos de (este, norte)."""
+        c = self.candidatos(este - metros, norte - metros, este + metros, norte + metros)
+        dx, dy = self.este[c] - este, self.norte[c] - norte
+        return self._mascara(c[dx * dx + dy * dy <= metros * metros])
+
+    def en_poligonos(self, poligonos: list[Poligono]) -> np.ndarray:
+        """Máscara de los puntos dentro de alguno de los polígonos."""
+        mascara = np.zeros(self.n, dtype=bool)
+        for poligono in poligonos:
+            exterior = poligono[0]
+            c = self.candidatos(*exterior.min(axis=0), *exterior.max(axis=0))
+            if len(c):
+                mascara[c[puntos_en_poligono(self.este[c], self.norte[c], poligono)]] = True
+        return mascara
+
+
+def puntos_en_poligono(x: np.ndarray, y: np.ndarray, poligono: Poligono) -> np.ndarray:
+    """
+    Regla par-impar vectorizada: un punto está dentro si una semirrecta hacia la izquierda
+    cruza un número impar de lados (los huecos quedan fuera de forma natural). Los puntos
+    se ordenan por Norte para que cada lado sólo evalúe los que están a su altura.
+    """
+    orden = np.argsort(y, kind='stable')
+    xs, ys = x[orden], y[orden]
+    dentro = np.zeros(len(x), dtype=bool)
+    for anillo in poligono:
+        x1, y1, x2, y2 = anillo[:-1, 0], anillo[:-1, 1], anillo[1:, 0], anillo[1:, 1]
+        bajo, alto = np.minimum(y1, y2), np.maximum(y1, y2)
+        inicios = np.searchsorted(ys, bajo, side='left')
+        fines = np.searchsorted(ys, alto, side='left')
+        for i in np.flatnonzero((fines > inicios) & (y1 != y2)):
+            tramo = slice(inicios[i], fines[i])
+            x_cruce = x1[i] + (ys[tramo] - y1[i]) * (x2[i] - x1[i]) / (y2[i] - y1[i])
+            dentro[tramo] ^= xs[tramo] < x_cruce
+    resultado = np.empty(len(x), dtype=bool)
+    resultado[orden] = dentro
+    return resultado
+
+
+# --- LECTURA DE POLÍGONOS ---
+def _anillo(coordenadas) -> np.ndarray:
+    anillo = np.asarray(coordenadas, dtype=np.float64)[:, :2]
+    if len(anillo) < 3:
+        raise ValueError("Un polígono necesita al menos tres vértices.")
+    if not np.array_equal(anillo[0], anillo[-1]):
+        anillo = np.vstack((anillo, anillo[:1]))
+    return anillo
+
+
+def _poligonos_geojson(geometria: dict) -> list[Poligono]:
+    tipo = geometria.get('type')
+    if tipo == 'Polygon':
+        return [[_anillo(a) for a in geometria['coordinates']]]
+    if tipo == 'MultiPolygon':
+        return [[_anillo(a) for a in p] for p in geometria['coordinates']]
+    if tipo == 'GeometryCollection':
+        return [p for g in geometria.get('geometries', []) for p in _poligonos_geojson(g)]
+    return []
+
+
+def _cumple_seleccion(propiedades: dict | None, seleccion: tuple[str, str] | None) -> bool:
+    if seleccion is None:
+        return True
+    clave, valor = seleccion
+    propiedades = {str(k).casefold(): v for k, v in (propiedades or {}).items()}
+    return str(propiedades.get(clave.casefold(), '')).strip().casefold() == valor.casefold()
+
+
+def _leer_geojson(texto: str, seleccion) -> tuple[list[Poligono], str | None]:
+    datos = json.loads(texto)
+    crs = None
+    nombre_crs = ((datos.get('crs') or {}).get('properties') or {}).get('name', '')
+    match = re.search(r'EPSG:*(\d+)', nombre_crs)
+    if match:
+        crs = f"EPSG:{match.group(1)}"
+    if datos.get('type') == 'FeatureCollection':
+        elementos = datos.get('features', [])
+    elif datos.get('type') == 'Feature':
+        elementos = [datos]
+    else:
+        elementos = [{'geometry': datos, 'properties': {}}]
+    poligonos = []
+    for elemento in elementos:
+        if elemento.get('geometry') and _cumple_seleccion(elemento.get('properties'), seleccion):
+            poligonos.extend(_poligonos_geojson(elemento['geometry']))
+    return poligonos, crs
+
+
+def _leer_wkt(texto: str) -> list[Poligono]:
+    """POLYGON y MULTIPOLYGON en texto WKT (uno o varios, separados por saltos de línea)."""
+    poligonos = []
+    for match in re.finditer(r'(MULTIPOLYGON|POLYGON)\s*(?:Z|M|ZM)?\s*(\(.*?\)\s*\))(?=\s*(?:MULTIPOLYGON|POLYGON|$))', texto, re.IGNORECASE | re.DOTALL):
+        cuerpo = match.group(2)
+        grupos = re.findall(r'\(\s*\(.*?\)\s*\)', cuerpo, re.DOTALL) if match.group(1).upper() == 'MULTIPOLYGON' else [cuerpo]
+        for grupo in grupos:
+            anillos = re.findall(r'\(([^()]+)\)', grupo)
+            poligonos.append([_anillo([[float(v) for v in par.split()] for par in anillo.split(',')]) for anillo in anillos])
+    return poligonos
+
+
+def _es_geografico(poligonos: list[Poligono]) -> bool:
+    return all(np.abs(a[:, 0]).max() <= 180 and np.abs(a[:, 1]).max() <= 90 for p in poligonos for a in p)
+
+
+@lru_cache(maxsize=16)
+def _leer_poligonos(ruta: str, mtime_ns: int, seleccion: tuple[str, str] | None, crs: str | None) -> tuple:
+    with open(ruta, encoding='utf-8-sig') as f:
+        texto = f.read()
+    if texto.lstrip().startswith('{'):
+        poligonos, crs_archivo = _leer_geojson(texto, seleccion)
+    else:
+        poligonos, crs_archivo = _leer_wkt(texto), None
+    if not poligonos:
+        detalle = f" que cumplan {seleccion[0]}={seleccion[1]}" if seleccion else ''
+        raise ValueError(f"No se encontraron polígonos{detalle} en '{os.path.basename(ruta)}'.")
+
+    import transformacion
+    crs_origen = crs or crs_archivo or (CRS_GEOGRAFICO if _es_geografico(poligonos) else transformacion.CRS_DESTINO)
+    if crs_origen != transformacion.CRS_DESTINO:
+        proyectados = []
+        for poligono in poligonos:
+            anillos = []
+            for anillo in poligono:
+                este, norte = transformacion.transformar_arreglos(anillo[:, 0].copy(), anillo[:, 1].copy(), crs_origen)
+                anillos.append(np.column_stack((este, norte)))
+            proyectados.append(anillos)
+        poligonos = proyectados
+    return tuple(poligonos)
+
+
+def leer_poligonos(ruta: str, seleccion: str | None = None, crs: str | None = None) -> list[Poligono]:
+    """
+    Lee los polígonos de un archivo GeoJSON (Polygon, MultiPolygon, Feature o
+    FeatureCollection) o WKT y los devuelve en WGS 84 / UTM 19S. Con seleccion
+    ('PROPIEDAD=valor', sin distinguir mayúsculas) sólo se toman las Features con esa
+    propiedad. Si el archivo no declara su CRS, se asume longitud/latitud cuando todas las
+    coordenadas caben en ese rango, y UTM 19S en otro caso. Lanza ValueError si el archivo
+    no tiene polígonos.
+    """
+    clave_valor = None
+    if seleccion:
+        if '=' not in seleccion:
+            raise ValueError("La selección de polígonos debe tener la forma PROPIEDAD=valor.")
+        clave, valor = seleccion.split('=', 1)
+        clave_valor = (clave.strip(), valor.strip())
+    return list(_leer_poligonos(os.path.abspath(ruta), os.stat(ruta).st_mtime_ns, clave_valor, crs))
+
+
+# --- FILTRO ---
+def coordenadas_en_wgs84(este: np.ndarray, norte: np.ndarray, datum: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Proyecta a WGS 84 / UTM 19S los puntos con datum '1956' o '1969' (el resto, incluidos
+    los sin Datum, se consideran ya en WGS 84). Devuelve arreglos nuevos.
+    """
+    este, norte = np.array(este, dtype=np.float64), np.array(norte, dtype=np.float64)
+    grupos = {d: datum == d for d in ('1956', '1969')}
+    if not any(g.any() for g in grupos.values()):
+        return este, norte
+    import transformacion
+    for datum_val, grupo in grupos.items():
+        if grupo.any():
+            este[grupo], norte[grupo], _ = transformacion.transformar_pares_unicos(
+                este[grupo], norte[grupo], transformacion.CRS_POR_DATUM[datum_val])
+    return este, norte
+
+
+def _numeros(valores, cantidad: int, descripcion: str) -> list[float]:
+    try:
+        numeros = [float(v) for v in valores]
+    except (TypeError, ValueError):
+        numeros = []
+    if len(numeros) != cantidad:
+        raise ValueError(f"{descripcion} necesita {cantidad} números.")
+    return numeros
+
+
+def validar_espacial(espacial: dict):
+    """Comprueba la especificación del filtro (y que el archivo de polígonos se puede leer)."""
+    if espacial.get('rectangulo') is not None:
+        este_min, norte_min, este_max, norte_max = _numeros(espacial['rectangulo'], 4, "El rectángulo")
+        if este_min > este_max or norte_min > norte_max:
+            raise ValueError("El rectángulo debe indicarse como Este mín, Norte mín, Este máx, Norte máx.")
+    if espacial.get('radio') is not None:
+        if _numeros(espacial['radio'], 3, "El radio (Este, Norte, metros)")[2] < 0:
+            raise ValueError("El radio debe ser positivo.")
+    if espacial.get('poligono'):
+        leer_poligonos(espacial['poligono'], espacial.get('seleccion'), espacial.get('crs'))
+
+
+def mascara_espacial(indice: IndiceGrilla, espacial: dict, log_queue: queue.Queue) -> np.ndarray:
+    """Combina con 'y' las condiciones de la especificación sobre un índice ya construido."""
+    mascara = np.ones(indice.n, dtype=bool)
+    if espacial.get('rectangulo') is not None:
+        rectangulo = [float(v) for v in espacial['rectangulo']]
+        log_queue.put(f"   - Rectángulo: Este {rectangulo[0]:.0f} a {rectangulo[2]:.0f}, Norte {rectangulo[1]:.0f} a {rectangulo[3]:.0f}")
+        mascara &= indice.en_rectangulo(*rectangulo)
+    if espacial.get('radio') is not None:
+        este, norte, metros = (float(v) for v in espacial['radio'])
+        log_queue.put(f"   - Radio de {metros:.0f} m alrededor de ({este:.0f}, {norte:.0f})")
+        mascara &= indice.en_radio(este, norte, metros)
+    if espacial.get('poligono'):
+        poligonos = leer_poligonos(espacial['poligono'], espacial.get('seleccion'), espacial.get('crs'))
+        log_queue.put(f"   - Polígonos de '{os.path.basename(espacial['poligono'])}': {len(poligonos)}")
+        mascara &= indice.en_poligonos(poligonos)
+    return mascara
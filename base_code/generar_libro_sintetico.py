@@ -0,0 +1,186 @@
+"""
+Generador de libros sintéticos con la forma del Excel 'Derechos_Concedidos' de la DGA,
+para medir el rendimiento sin depender de una exportación real.
+
+Genera:
+- un libro .xlsx con los títulos en la fila 7 (los mismos textos que espera
+  1_Filtrar_DB.py, con sus saltos de línea) y 68 columnas (A:BP);
+- opcionalmente, los CSV intermedios 1956.csv, 1969.csv y 1984.csv con el formato que
+  escribe exportar_por_datum, para medir los conversores y el unificador por separado.
+
+Los datos imitan el desorden de las exportaciones reales: coordenadas en kilómetros, con
+coma decimal o con dígitos de más, valores 'S/I', Datum vacío o escrito de distintas
+formas (1956, PSAD 1956, 1969, SAD 1969, 1984, WGS 1984) y textos con espacios y
+mayúsculas irregulares. Con la misma semilla, el resultado es siempre el mismo.
+
+Uso:
+    python generar_libro_sintetico.py 100000 libro_100k.xlsx
+    python generar_libro_sintetico.py 2000000 carpeta_csv --solo-csv
+"""
+import argparse
+import importlib
+import os
+import sys
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+filtrar_db = importlib.import_module('1_Filtrar_DB')
+
+MAX_FILAS_LIBRO = 1_048_576 - filtrar_db.FILA_ENCABEZADO  # Límite de filas de una hoja de Excel.
+
+# Posición (base 0) de cada columna usada dentro de las 68 del libro.
+POSICIONES = {
+    filtrar_db.COL_EXPEDIENTE: 2, filtrar_db.COL_SOLICITUD: 3, 'Región': 5, filtrar_db.COL_COMUNA: 6,
+    'Provincia': 7, filtrar_db.COL_SOLICITANTE: 10, filtrar_db.COL_TIPO_DERECHO: 12,
+    filtrar_db.COL_NATURALEZA: 13, 'Fecha de Resolución': 16, filtrar_db.COL_CAUDAL: 20,
+    'Unidad de Caudal': 21, filtrar_db.COL_NORTE: 30, filtrar_db.COL_ESTE: 31, 'Huso': 32,
+    filtrar_db.COL_DATUM: 33,
+}
+
+COMUNAS = ['Arica', 'Putre', 'Pica', 'Pozo Almonte', 'Iquique', 'Calama', 'San Pedro de Atacama',
+           'Copiapó', 'Vallenar', 'La Serena', 'Ovalle', 'Valparaíso', 'San Felipe', 'Rancagua',
+           'Curicó', 'Talca', 'Chillán', 'Los Ángeles', 'Temuco', 'Osorno']
+NATURALEZAS = ['Subterranea', 'Superficial y Corriente', 'Superficial y Detenida', 'SUBTERRANEA ', None]
+TIPOS_DERECHO = ['Consuntivo', 'No Consuntivo', ' consuntivo', None]
+SOLICITANTES = ['Juan Pérez', ' MARÍA SOTO', 'agrícola los andes ltda.', 'Comité de Agua Potable Rural', None, 'S/I']
+DATUMS = ['1956', 'PSAD 1956', '1969', 'SAD 1969', '1984', 'WGS 1984', None, '']
+PROB_DATUMS = [0.15, 0.05, 0.12, 0.04, 0.25, 0.19, 0.15, 0.05]
+
+
+def _coordenadas_desordenadas(rng: np.random.Generator, base: np.ndarray) -> np.ndarray:
+    """
+    Convierte coordenadas en metros a valores de celda con el desorden habitual: la mayoría
+    numéricas, algunas en kilómetros, con coma decimal, con un dígito de más, 0, 'S/I' o vacías.
+    """
+    n = len(base)
+    valores = base.astype(object)
+    tipo = rng.choice(8, size=n, p=[0.70, 0.08, 0.06, 0.03, 0.03, 0.03, 0.03, 0.04])
+    km = tipo == 1
+    valores[km] = np.round(base[km] / 1000, 3)
+    coma = tipo == 2
+    valores[coma] = [f"{v},{d}" for v, d in zip(base[coma], rng.integers(0, 10, coma.sum()))]
+    valores[tipo == 3] = base[tipo == 3] * 10            # Un dígito de más.
+    valores[tipo == 4] = 0
+    valores[tipo == 5] = 'S/I'
+    valores[tipo == 6] = None
+    texto = tipo == 7
+    valores[texto] = [f" {v} " for v in base[texto]]     # Número guardado como texto.
+    return valores
+
+
+def generar_tabla(n_filas: int, semilla: int = 0) -> pd.DataFrame:
+    """Devuelve un DataFrame con las columnas de POSICIONES y n_filas registros."""
+    rng = np.random.default_rng(semilla)
+    norte = rng.integers(6_200_000, 8_000_000, n_filas)
+    este = rng.integers(250_000, 500_000, n_filas)
+    caudal = np.round(rng.lognormal(1.0, 1.5, n_filas), 2).astype(object)
+    caudal_tipo = rng.choice(4, size=n_filas, p=[0.8, 0.1, 0.05, 0.05])
+    caudal[caudal_tipo == 1] = [str(v).replace('.', ',') for v in caudal[caudal_tipo == 1]]
+    caudal[caudal_tipo == 2] = 'S/I'
+    caudal[caudal_tipo == 3] = None
+
+    # Expedientes repetidos en parte (varias captaciones por expediente), como en la DGA.
+    n_expedientes = max(1, int(n_filas * 0.7))
+    expediente = rng.integers(1, n_expedientes + 1, n_filas)
+    region = rng.choice(['XV', 'I', 'II', 'III', 'IV', 'V', 'VI', 'VII', 'XVI', 'VIII', 'IX', 'X'], n_filas)
+    return pd.DataFrame({
+        filtrar_db.COL_EXPEDIENTE: [f" ND-{r}-{e:07d} " for r, e in zip(region, expediente)],
+        filtrar_db.COL_SOLICITUD: rng.integers(1, 4, n_filas),
+        'Región': region,
+        filtrar_db.COL_COMUNA: rng.choice(COMUNAS, n_filas),
+        'Provincia': rng.choice(['Arica', 'Tamarugal', 'El Loa', 'Copiapó', 'Elqui', 'Cachapoal'], n_filas),
+        filtrar_db.COL_SOLICITANTE: rng.choice(np.array(SOLICITANTES, dtype=object), n_filas),
+        filtrar_db.COL_TIPO_DERECHO: rng.choice(np.array(TIPOS_DERECHO, dtype=object), n_filas, p=[0.55, 0.35, 0.05, 0.05]),
+        filtrar_db.COL_NATURALEZA: rng.choice(np.array(NATURALEZAS, dtype=object), n_filas, p=[0.45, 0.35, 0.1, 0.05, 0.05]),
+        'Fecha de Resolución': [f"{d:02d}-{m:02d}-{a}" for d, m, a in zip(rng.integers(1, 29, n_filas), rng.integers(1, 13, n_filas), rng.integers(1980, 2025, n_filas))],
+        filtrar_db.COL_CAUDAL: caudal,
+        'Unidad de Caudal': rng.choice(['Lt/s', 'm3/s'], n_filas, p=[0.9, 0.1]),
+        filtrar_db.COL_NORTE: _coordenadas_desordenadas(rng, norte),
+        filtrar_db.COL_ESTE: _coordenadas_desordenadas(rng, este),
+        'Huso': rng.choice([18, 19], n_filas, p=[0.2, 0.8]),
+        filtrar_db.COL_DATUM: rng.choice(np.array(DATUMS, dtype=object), n_filas, p=PROB_DATUMS),
+    })
+
+
+def escribir_libro(df: pd.DataFrame, ruta: str):
+    """
+    Escribe el libro con seis filas de título, los encabezados en la fila 7 y los datos
+    desde la fila 8, en modo write_only para no cargar todas las celdas en memoria.
+    """
+    if len(df) > MAX_FILAS_LIBRO:
+        raise ValueError(f"Un libro de Excel admite como máximo {MAX_FILAS_LIBRO} filas de datos; use --solo-csv.")
+    libro = openpyxl.Workbook(write_only=True)
+    hoja = libro.create_sheet('Derechos Concedidos')
+    hoja.append(['DIRECCIÓN GENERAL DE AGUAS'])
+    hoja.append(['Derechos de Aprovechamiento de Aguas Registrados en DGA'])
+    for _ in range(filtrar_db.FILA_ENCABEZADO - 3):
+        hoja.append([])
+    encabezado = [f'Columna {i + 1}' for i in range(filtrar_db.MAX_COLUMNAS)]
+    for nombre, posicion in POSICIONES.items():
+        encabezado[posicion] = nombre
+    hoja.append(encabezado)
+
+    columnas = [df[nombre].to_numpy(dtype=object) for nombre in POSICIONES]
+    posiciones = list(POSICIONES.values())
+    for i in range(len(df)):
+        fila = [None] * filtrar_db.MAX_COLUMNAS
+        for posicion, columna in zip(posiciones, columnas):
+            fila[posicion] = columna[i]
+        hoja.append(fila)
+    libro.save(ruta)
+
+
+def escribir_csv_intermedios(n_filas: int, carpeta: str, semilla: int = 0) -> dict[str, str]:
+    """
+    Escribe 1956.csv, 1969.csv y 1984.csv con n_filas registros en total, ya limpios como
+    los deja exportar_por_datum (coordenadas en metros, algunas vacías, algunos Datum vacíos
+    en 1984.csv). Devuelve la ruta de cada archivo.
+    """
+    rng = np.random.default_rng(semilla + 1)
+    os.makedirs(carpeta, exist_ok=True)
+    datum = rng.choice(['1956', '1969', '1984'], n_filas, p=[0.3, 0.2, 0.5])
+    norte = rng.integers(6_200_000, 8_000_000, n_filas).astype(float)
+    este = rng.integers(250_000, 500_000, n_filas).astype(float)
+    norte[rng.random(n_filas) < 0.03] = np.nan
+    este[rng.random(n_filas) < 0.03] = np.nan
+    df = pd.DataFrame({
+        'Expediente': [f"ND-{e:07d}/{s}" for e, s in zip(rng.integers(1, max(2, int(n_filas * 0.8)), n_filas), rng.integers(1, 4, n_filas))],
+        'Nombre Solicitante': rng.choice(np.array(['Juan Pérez', 'María Soto', 'Agrícola Los Andes Ltda.', None], dtype=object), n_filas),
+        'Norte': pd.array(norte).astype('Int64'),
+        'Este': pd.array(este).astype('Int64'),
+        'Datum': datum.astype(object),
+    })
+    df.loc[(datum == '1984') & (rng.random(n_filas) < 0.1), 'Datum'] = None
+    rutas = {}
+    for datum_val, nombre in filtrar_db.ARCHIVOS_POR_DATUM.items():
+        rutas[datum_val] = os.path.join(carpeta, nombre)
+        seleccion = df['Datum'].eq(datum_val) | ((datum_val == '1984') & df['Datum'].isna())
+        df[seleccion].to_csv(rutas[datum_val], index=False, sep=';', encoding='utf-8-sig')
+    return rutas
+
+
+def crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Genera libros sintéticos con la forma del Excel de la DGA.")
+    parser.add_argument('filas', type=int, help="Cantidad de registros (10.000 a 2.000.000).")
+    parser.add_argument('salida', help="Archivo .xlsx a generar, o carpeta con --solo-csv.")
+    parser.add_argument('--csv', metavar='CARPETA', help="Además, escribe los CSV intermedios en CARPETA.")
+    parser.add_argument('--solo-csv', action='store_true', help="Sólo escribe los CSV intermedios (sin límite de filas).")
+    parser.add_argument('--semilla', type=int, default=0)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = crear_parser().parse_args(argv)
+    if args.solo_csv:
+        escribir_csv_intermedios(args.filas, args.salida, args.semilla)
+        return 0
+    escribir_libro(generar_tabla(args.filas, args.semilla), args.salida)
+    if args.csv:
+        escribir_csv_intermedios(args.filas, args.csv, args.semilla)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Procesamiento incremental del libro Derechos_Concedidos contra la ejecución anterior.
+
+La DGA publica el libro completo cada mes, pero sólo cambian algunas filas. Para no
+reprocesar todo, se guarda una huella por registro (hash de las columnas que usa el
+proceso, agrupado por 'Expediente/N° Solicitud') junto con el resultado unificado de la
+última ejecución. En la siguiente, las huellas indican qué registros se insertaron,
+modificaron o eliminaron; sólo esos pasan por la limpieza de coordenadas y la
+transformación de Datum, y su resultado reemplaza al anterior.
+
+El estado se guarda en una carpeta elegida por el usuario (estado.json, huellas y
+resultado en Parquet, o pickle si pyarrow no está disponible). Si cambian los filtros o
+la versión del estado, la ejecución se hace completa.
+"""
+import importlib
+import json
+import os
+import queue
+from datetime import datetime
+
+import pandas as pd
+
+filtrar_db = importlib.import_module('1_Filtrar_DB')
+
+VERSION_ESTADO = 1
+ARCHIVO_ESTADO = 'estado.json'
+TABLAS_ESTADO = ('huellas', 'resultado', 'conflictos')
+
+
+def claves_registro(df: pd.DataFrame) -> pd.Series:
+    """
+    Clave de cada fila del libro: 'Expediente/N° Solicitud', con el mismo formato que la
+    columna Expediente del resultado (ver preparar_exportacion).
+    """
+    return df[filtrar_db.COL_EXPEDIENTE].astype(str) + '/' + df[filtrar_db.COL_SOLICITUD].astype(str)
+
+
+def calcular_huellas(df: pd.DataFrame, claves: pd.Series) -> pd.Series:
+    """
+    Huella por clave: suma (módulo 2**64) del hash de las columnas de COLUMNAS_PIPELINE de
+    cada fila con esa clave. La suma no depende del orden de las filas, y cambia si una
+    fila de la clave se modifica, se agrega o se elimina.
+    """
+    columnas = [c for c in filtrar_db.COLUMNAS_PIPELINE if c in df.columns]
+    hashes = pd.util.hash_pandas_object(df[columnas], index=False)
+    return pd.Series(hashes.to_numpy(), index=claves.to_numpy()).groupby(level=0, sort=False).sum()
+
+
+def comparar_huellas(anteriores: pd.Series, actuales: pd.Series) -> dict[str, pd.Index]:
+    """
+    Compara las huellas de dos ejecuciones y devuelve las claves insertadas,
+    actualizadas y eliminadas.
+    """
+    comunes = actuales.index.intersection(anteriores.index)
+    distintas = actuales.loc[comunes].to_numpy() != anteriores.loc[comunes].to_numpy()
+    return {
+        'insertados': actuales.index.difference(anteriores.index),
+        'actualizados': comunes[distintas],
+        'eliminados': anteriores.index.difference(actuales.index),
+    }
+
+
+def _ruta_tabla(carpeta: str, nombre: str, formato: str) -> str:
+    return os.path.join(carpeta, nombre + ('.parquet' if formato == 'parquet' else '.pkl'))
+
+
+def leer_estado(carpeta: str, filtros: dict, log_queue: queue.Queue) -> dict | None:
+    """
+    Devuelve el estado de la ejecución anterior ({'huellas', 'resultado', 'conflictos'}),
+    o None si no existe, es de otra versión o se generó con otros filtros (o en otro modo de carga).
+    """
+    try:
+        with open(os.path.join(carpeta, ARCHIVO_ESTADO), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != VERSION_ESTADO:
+        return None
+    if meta.get('filtros') != filtros:
+        log_queue.put("   - Los filtros o el modo de carga cambiaron desde la ejecución anterior: se procesará todo el libro.")
+        return None
+
+    estado = {}
+    try:
+        for nombre in TABLAS_ESTADO:
+            ruta = _ruta_tabla(carpeta, nombre, meta.get('formato'))
+            estado[nombre] = pd.read_parquet(ruta) if meta.get('formato') == 'parquet' else pd.read_pickle(ruta)
+    except Exception as e:
+        log_queue.put(f"   - ⚠️ Advertencia: No se pudo leer el estado anterior ({e}). Se procesará todo el libro.")
+        return None
+    estado['huellas'] = estado['huellas'].set_index('clave')['huella']
+    log_queue.put(f"   - Estado anterior del {meta.get('fecha', '?')}: {len(estado['huellas'])} registros.")
+    return estado
+
+
+def guardar_estado(carpeta: str, filtros: dict, huellas: pd.Series, resultado: pd.DataFrame,
+                   conflictos: pd.DataFrame, log_queue: queue.Queue):
+    """
+    Guarda el estado de esta ejecución. Se intenta Parquet (requiere pyarrow) y, si no se
+    puede, pickle. Un fallo al guardar sólo se informa: el resultado ya está escrito.
+    """
+    tablas = {
+        'huellas': pd.DataFrame({'clave': huellas.index.astype(str), 'huella': huellas.to_numpy()}),
+        'resultado': resultado.reset_index(drop=True),
+        'conflictos': conflictos.reset_index(drop=True),
+    }
+    try:
+        os.makedirs(carpeta, exist_ok=True)
+        try:
+            for nombre, tabla in tablas.items():
+                tabla.to_parquet(_ruta_tabla(carpeta, nombre, 'parquet'), index=False)
+            formato = 'parquet'
+        except Exception:
+            for nombre, tabla in tablas.items():
+                tabla.to_pickle(_ruta_tabla(carpeta, nombre, 'pickle'))
+            formato = 'pickle'
+        meta = {'version': VERSION_ESTADO, 'filtros': filtros, 'formato': formato,
+                'fecha': datetime.now().isoformat(timespec='seconds')}
+        with open(os.path.join(carpeta, ARCHIVO_ESTADO), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+    except Exception as e:
+        log_queue.put(f"   - ⚠️ Advertencia: No se pudo guardar el estado incremental ({e}).")
+
+
+def aplicar_delta(anterior: pd.DataFrame, delta: pd.DataFrame, claves_cambiadas: pd.Index) -> pd.DataFrame:
+    """
+    Quita de la tabla anterior las filas cuyas claves cambiaron y agrega las del delta.
+    Las filas que no cambiaron conservan su posición; las nuevas quedan al final.
+    """
+    vigentes = anterior[~anterior['Expediente'].isin(claves_cambiadas)]
+    if vigentes.empty:
+        return delta.reset_index(drop=True)
+    if delta.empty:
+        return vigentes.reset_index(drop=True)
+    return pd.concat([vigentes, delta], ignore_index=True)
@@ -0,0 +1,209 @@
+"""
+Medición por etapa de las herramientas: tiempo real, tiempo de CPU, memoria, filas de
+entrada y salida y filas por segundo. Cada ejecución deja un informe JSON junto a sus
+archivos de salida, para comparar el rendimiento entre publicaciones de la DGA.
+
+Opcionalmente (perfilar=True o la variable de entorno AUTO_FILTER_PERFILAR=1) se guarda
+un volcado de cProfile por etapa, y con trazar_memoria=True (o AUTO_FILTER_TRAZAR_MEMORIA=1)
+se mide el pico de memoria de cada etapa con tracemalloc, que hace el proceso más lento.
+
+También se mide cuánto tarda en importarse cada módulo (medir_importaciones), para seguir
+el tiempo de arranque de las herramientas.
+"""
+import cProfile
+import importlib
+import json
+import os
+import platform
+import queue
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+
+def _opcion_entorno(nombre: str) -> bool:
+    return os.environ.get(nombre, '') not in ('', '0')
+
+
+def memoria_proceso_mb() -> tuple[float | None, float | None]:
+    """
+    Devuelve (memoria residente actual, pico de memoria residente del proceso) en MB.
+    Usa psutil si está instalado; si no, /proc en Linux y resource en el resto de Unix.
+    """
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        pico = getattr(info, 'peak_wset', None)  # Sólo existe en Windows.
+        return info.rss / 2**20, (pico / 2**20 if pico else None)
+    except ImportError:
+        pass
+    actual = pico = None
+    try:
+        with open('/proc/self/statm') as f:
+            actual = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        pico = maxrss / 2**20 if sys.platform == 'darwin' else maxrss / 2**10
+    except ImportError:
+        pass
+    return actual, pico
+
+
+class Etapa:
+    """Resultado de una etapa. filas_salida se completa dentro del bloque medido."""
+
+    def __init__(self, nombre: str, filas_entrada: int | None = None):
+        self.nombre = nombre
+        self.filas_entrada = filas_entrada
+        self.filas_salida = None
+        self.segundos = 0.0
+        self.cpu_segundos = 0.0
+        self.memoria_pico_mb = None
+        self.rss_mb = None
+        self.rss_pico_proceso_mb = None
+        self.perfil = None
+
+    def como_dict(self) -> dict:
+        filas = self.filas_entrada if self.filas_entrada is not None else self.filas_salida
+        return {
+            'etapa': self.nombre,
+            'segundos': round(self.segundos, 4),
+            'cpu_segundos': round(self.cpu_segundos, 4),
+            'filas_entrada': self.filas_entrada,
+            'filas_salida': self.filas_salida,
+            'filas_por_segundo': round(filas / self.segundos, 1) if filas and self.segundos > 0 else None,
+            'memoria_pico_mb': self.memoria_pico_mb,
+            'rss_mb': self.rss_mb,
+            'rss_pico_proceso_mb': self.rss_pico_proceso_mb,
+        }
+
+
+class MedidorEtapas:
+    """
+    Registra las etapas de una ejecución. Uso:
+
+        medidor = MedidorEtapas(log_queue)
+        with medidor.etapa('filtrar_datos', filas_entrada=len(df)) as etapa:
+            df_filtrado = filtrar_datos(df, filtros, log_queue)
+            etapa.filas_salida = len(df_filtrado)
+        medidor.guardar_informe(ruta_informe)
+
+    El tiempo de CPU es el del proceso completo (incluye otros hilos, no los procesos hijos).
+    """
+
+    def __init__(self, log_queue: queue.Queue | None = None, perfilar: bool | None = None,
+                 trazar_memoria: bool | None = None):
+        self.log_queue = log_queue
+        self.perfilar = _opcion_entorno('AUTO_FILTER_PERFILAR') if perfilar is None else perfilar
+        self.trazar_memoria = _opcion_entorno('AUTO_FILTER_TRAZAR_MEMORIA') if trazar_memoria is None else trazar_memoria
+        self.etapas: list[Etapa] = []
+        self.inicio = datetime.now()
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def etapa(self, nombre: str, filas_entrada: int | None = None):
+        etapa = Etapa(nombre, filas_entrada)
+        detener_traza = False
+        if self.trazar_memoria:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                detener_traza = True
+            tracemalloc.reset_peak()
+        perfil = cProfile.Profile() if self.perfilar else None
+        t0, cpu0 = time.perf_counter(), time.process_time()
+        if perfil is not None:
+            perfil.enable()
+        try:
+            yield etapa
+        finally:
+            if perfil is not None:
+                perfil.disable()
+                etapa.perfil = perfil
+            etapa.segundos = time.perf_counter() - t0
+            etapa.cpu_segundos = time.process_time() - cpu0
+            if self.trazar_memoria:
+                etapa.memoria_pico_mb = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+                if detener_traza:
+                    tracemalloc.stop()
+            rss, rss_pico = memoria_proceso_mb()
+            etapa.rss_mb = round(rss, 2) if rss is not None else None
+            etapa.rss_pico_proceso_mb = round(rss_pico, 2) if rss_pico is not None else None
+            self.etapas.append(etapa)
+            if self.log_queue is not None:
+                datos = etapa.como_dict()
+                velocidad = f", {datos['filas_por_segundo']:,.0f} filas/s" if datos['filas_por_segundo'] else ''
+                self.log_queue.put(f"   ⏱️ {nombre}: {etapa.segundos:.2f} s{velocidad}")
+
+    def informe(self) -> dict:
+        return {
+            'inicio': self.inicio.isoformat(timespec='seconds'),
+            'total_segundos': round(time.perf_counter() - self._t0, 4),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'etapas': [etapa.como_dict() for etapa in self.etapas],
+        }
+
+    def guardar_informe(self, ruta_json: str, extra: dict | None = None):
+        """
+        Escribe el informe JSON y, si se perfiló, un archivo .prof por etapa junto a él
+        (se abren con pstats o snakeviz). Un fallo al escribirlo sólo se informa.
+        """
+        try:
+            datos = self.informe()
+            if extra:
+                datos.update(extra)
+            with open(ruta_json, 'w', encoding='utf-8') as f:
+                json.dump(datos, f, ensure_ascii=False, indent=2)
+            base = os.path.splitext(ruta_json)[0]
+            for i, etapa in enumerate(self.etapas, start=1):
+                if etapa.perfil is not None:
+                    etapa.perfil.dump_stats(f"{base}_{i:02d}_{etapa.nombre}.prof")
+            if self.log_queue is not None:
+                self.log_queue.put(f"   - 📄 Informe de rendimiento guardado en: {ruta_json}")
+        except Exception as e:
+            if self.log_queue is not None:
+                self.log_queue.put(f"   - ⚠️ Advertencia: No se pudo guardar el informe de rendimiento ({e}).")
+
+
+def ruta_informe(ruta_salida: str) -> str:
+    """Ruta del informe que acompaña a un archivo de salida (o a una carpeta de destino)."""
+    if os.path.isdir(ruta_salida):
+        return os.path.join(ruta_salida, 'informe_ejecucion.json')
+    return os.path.splitext(ruta_salida)[0] + '_informe.json'
+
+
+# --- TIEMPOS DE IMPORTACIÓN ---
+def importar_medido(nombre: str):
+    """
+    Importa un módulo y devuelve (módulo, medida). Si ya estaba cargado la medida indica
+    ya_cargado y su tiempo es prácticamente cero.
+    """
+    ya_cargado = nombre in sys.modules
+    t0 = time.perf_counter()
+    modulo = importlib.import_module(nombre)
+    return modulo, {'modulo': nombre, 'segundos': round(time.perf_counter() - t0, 4), 'ya_cargado': ya_cargado}
+
+
+def medir_importaciones(modulos: list[str], proceso_nuevo: bool = True) -> list[dict]:
+    """
+    Importa los módulos en orden y mide cada uno. El tiempo de cada módulo excluye lo que ya
+    cargaron los anteriores: ['pandas', '1_Filtrar_DB'] separa pandas del resto de la
+    herramienta. Con proceso_nuevo se mide en un intérprete recién iniciado (arranque en
+    frío, como al abrir el programa) y no en el proceso actual.
+    """
+    if not proceso_nuevo:
+        return [importar_medido(nombre)[1] for nombre in modulos]
+    codigo = ("import json, sys, instrumentacion; "
+              "print(json.dumps(instrumentacion.medir_importaciones(sys.argv[1:], proceso_nuevo=False)))")
+    resultado = subprocess.run([sys.executable, '-c', codigo, *modulos], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if resultado.returncode != 0:
+        error = resultado.stderr.strip().splitlines()
+        raise RuntimeError(f"No se pudo medir la importación de {', '.join(modulos)}: {error[-1] if error else resultado.returncode}")
+    return json.loads(resultado.stdout.splitlines()[-1])
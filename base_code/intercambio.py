@@ -0,0 +1,112 @@
+"""
+Lectura y escritura de los archivos intermedios que se pasan entre las herramientas.
+
+Además del CSV separado por ';' de siempre, se admiten dos formatos binarios con tipos:
+Parquet (.parquet) y Arrow IPC / Feather v2 (.arrow, .feather). En ellos las coordenadas
+se guardan como enteros de 32 bits, Datum como categoría y Expediente como texto, así cada
+etapa abre su entrada sin volver a interpretar texto; los archivos Arrow además se leen
+mapeados en memoria. El formato se deduce de la extensión del archivo. Ambos requieren
+pyarrow. Los CSV pueden ir comprimidos (.csv.gz o .csv.zst; zstd requiere zstandard).
+"""
+import gzip
+import os
+
+import pandas as pd
+
+FORMATOS = {'.csv': 'csv', '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+EXTENSIONES = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+EXTENSIONES_COMPRESION = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def formato_de_ruta(ruta: str) -> str:
+    """Devuelve 'csv', 'parquet' o 'arrow' según la extensión (CSV si no se reconoce)."""
+    return FORMATOS.get(os.path.splitext(ruta)[1].lower(), 'csv')
+
+
+def nombre_archivo(base: str, formato: str, compresion: str | None = None) -> str:
+    """
+    Nombre de archivo para un formato. Los CSV comprimidos llevan la extensión de la
+    compresión (1956.csv.gz); Parquet y Arrow comprimen por dentro y no cambian de nombre.
+    """
+    nombre = base + EXTENSIONES[formato]
+    if formato == 'csv' and compresion:
+        nombre += EXTENSIONES_COMPRESION[compresion]
+    return nombre
+
+
+def abrir_texto(ruta: str, encoding: str = 'utf-8'):
+    """
+    Abre un archivo de texto para escritura, comprimido según su extensión (.gz, .zst).
+    Se usa newline='' para escribir tal cual los saltos de línea que genera to_csv.
+    """
+    if ruta.endswith('.gz'):
+        return gzip.open(ruta, 'wt', encoding=encoding, newline='')
+    if ruta.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("La compresión zstd requiere zstandard: pip install zstandard")
+        return zstandard.open(ruta, 'wt', encoding=encoding, newline='')
+    return open(ruta, 'w', encoding=encoding, newline='')
+
+
+def tipar_intermedio(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Asigna los tipos del formato intermedio: Expediente y Nombre Solicitante como texto,
+    Norte/Este como Int32 (admite vacíos) y Datum como categoría.
+    """
+    df = df.copy()
+    for col in ('Expediente', 'Nombre Solicitante'):
+        if col in df.columns:
+            df[col] = df[col].astype('string')
+    for col in ('Norte', 'Este'):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').round().astype('Int32')
+    if 'Datum' in df.columns:
+        datum = df['Datum']
+        df['Datum'] = datum.where(datum.isna(), datum.astype(str)).astype('category')
+    return df
+
+
+def _requiere_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("Los formatos Parquet y Arrow requieren pyarrow: pip install pyarrow")
+
+
+def guardar_intermedio(df: pd.DataFrame, ruta: str, encoding: str = 'utf-8', compresion: str | None = None):
+    """
+    Guarda un archivo intermedio en el formato que indica su extensión.
+    El parámetro encoding sólo se usa para CSV, cuya compresión también se deduce de la
+    extensión. Para Parquet, compresion puede ser 'gzip' o 'zstd'; Arrow sólo admite 'zstd'.
+    """
+    formato = formato_de_ruta(ruta.removesuffix('.gz').removesuffix('.zst'))
+    if formato == 'csv':
+        df.to_csv(ruta, index=False, sep=';', encoding=encoding)
+        return
+    _requiere_pyarrow()
+    df = tipar_intermedio(df)
+    if formato == 'parquet':
+        df.to_parquet(ruta, index=False, compression=compresion or 'snappy')
+    else:
+        if compresion not in (None, 'zstd'):
+            raise ValueError("El formato Arrow sólo admite compresión zstd.")
+        df.reset_index(drop=True).to_feather(ruta, compression=compresion or 'uncompressed')
+
+
+def leer_intermedio(ruta: str, columnas: list[str] | None = None) -> pd.DataFrame:
+    """
+    Lee un archivo intermedio en el formato que indica su extensión. Los Arrow IPC se
+    abren mapeados en memoria, así que leer la tabla Arrow no copia el archivo; la
+    conversión a DataFrame sí copia las columnas que pandas no puede compartir con Arrow
+    (con pandas 2, por ejemplo, los textos pasan a objetos de Python).
+    """
+    formato = formato_de_ruta(ruta)
+    if formato == 'csv':
+        return pd.read_csv(ruta, sep=';', dtype={'Expediente': str}, usecols=columnas)
+    _requiere_pyarrow()
+    if formato == 'parquet':
+        return pd.read_parquet(ruta, columns=columnas, memory_map=True)
+    from pyarrow import feather
+    return feather.read_table(ruta, columns=columnas, memory_map=True).to_pandas()
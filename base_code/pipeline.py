@@ -0,0 +1,538 @@
+"""
+Ejecución sin interfaz gráfica de las cuatro herramientas en un solo proceso:
+Excel -> filtros -> coordenadas -> transformación de Datum -> archivo unificado.
+
+Los DataFrames pasan de una etapa a la siguiente en memoria, sin escribir ni volver a
+leer los CSV intermedios (1956.csv, 1969.csv, 1984.csv y los convertidos).
+
+También permite procesar por lotes una lista de perfiles de filtro (JSON o YAML) con una
+sola lectura del Excel, escribiendo los CSV de cada perfil en su propia subcarpeta.
+
+Uso:
+    python pipeline.py Derechos_Concedidos.xlsx salida.xlsx --naturaleza Subterranea --tipo-derecho Consuntivo
+    python pipeline.py Derechos_Concedidos.xlsx carpeta_salida --perfiles perfiles.json
+    python pipeline.py Derechos_Concedidos.xlsx salida.xlsx --naturaleza Subterranea --tipo-derecho Consuntivo --incremental estado
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import incremental
+import transformacion
+from expresiones import compilar_expresion
+from filtro_espacial import validar_espacial
+from instrumentacion import MedidorEtapas, ruta_informe
+from registro import es_control
+
+# Los scripts de la suite empiezan con un número, por lo que se importan por nombre.
+filtrar_db = importlib.import_module('1_Filtrar_DB')
+conversor_final = importlib.import_module('4_Conversor_final')
+
+
+class LogConsola:
+    """
+    Sustituto de log_queue para ejecuciones sin interfaz: imprime cada mensaje en la
+    consola y omite los mensajes de control (FIN_...) que sólo interpretan las ventanas.
+    """
+    def __init__(self, silencioso: bool = False):
+        self.silencioso = silencioso
+        self._lock = threading.Lock()
+
+    def put(self, msg):
+        if self.silencioso or es_control(msg):
+            return
+        with self._lock:
+            print(msg, flush=True)
+
+
+class LogConPrefijo:
+    """
+    Antepone el nombre del perfil a cada mensaje, para distinguir los registros de
+    perfiles que se procesan al mismo tiempo. Los mensajes de control pasan sin cambios.
+    """
+    def __init__(self, log_queue, prefijo: str):
+        self.log_queue = log_queue
+        self.prefijo = prefijo
+
+    def put(self, msg):
+        if not es_control(msg):
+            msg = f"[{self.prefijo}] {msg.lstrip(chr(10))}"
+        self.log_queue.put(msg)
+
+
+def _como_csv_intermedio(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Deja los registros con los mismos tipos que tendrían tras escribirse y leerse como CSV:
+    coordenadas numéricas y textos vacíos como NaN.
+    """
+    return df.assign(**{
+        'Norte': _numerica_como_csv(df['Norte']),
+        'Este': _numerica_como_csv(df['Este']),
+        'Nombre Solicitante': df['Nombre Solicitante'].replace('', pd.NA),
+        'Datum': df['Datum'].astype(object),
+    })
+
+
+def _numerica_como_csv(serie: pd.Series) -> pd.Series:
+    numeros = pd.to_numeric(serie, errors='coerce')
+    if isinstance(numeros.dtype, pd.api.extensions.ExtensionDtype):
+        # Coordenadas Int32 del modo ligero: al leer el CSV serían int64, o float64 si hay vacíos.
+        numeros = numeros.astype('float64') if numeros.hasnans else numeros.astype('int64')
+    return numeros
+
+
+def transformar_y_unificar(df_exportacion: pd.DataFrame, log_queue, paralelo: bool = False,
+                           memoria: transformacion.MemoriaTransformaciones | None = None, deduplicar: bool = True,
+                           precedencia: tuple = conversor_final.PRECEDENCIA_ORIGEN) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Convierte a WGS 84 los registros 1956 y 1969 en una sola pasada y los une con los
+    registros 1984, con el mismo resultado que los programas 2, 3 y 4 ejecutados uno tras otro.
+    Devuelve (resultado, conflictos de coordenadas entre Expedientes repetidos).
+    """
+    log_queue.put("\n🔄 Transformando coordenadas a WGS 84...")
+    df_final = transformacion.transformar_multidatum(
+        _como_csv_intermedio(df_exportacion), log_queue, paralelo=paralelo, memoria=memoria, columna_origen='Origen'
+    )
+    if memoria is not None:
+        memoria.guardar()
+    log_queue.put(f"\n✅ Combinación completa. Total de filas: {len(df_final)}")
+    if deduplicar:
+        df_final, df_conflictos = conversor_final.deduplicar_por_expediente(df_final, log_queue, precedencia=precedencia)
+    else:
+        df_final, df_conflictos = df_final.drop(columns='Origen'), None
+    return conversor_final.unificar_datum(df_final, log_queue), df_conflictos
+
+
+def guardar_resultado(df: pd.DataFrame, ruta_salida: str, log_queue, df_conflictos: pd.DataFrame | None = None):
+    """
+    Guarda el resultado unificado. La extensión define el formato (.xlsx o .csv).
+    Si hay conflictos entre Expedientes repetidos, su informe queda junto al archivo.
+    """
+    if ruta_salida.lower().endswith('.csv'):
+        df.to_csv(ruta_salida, index=False, encoding='utf-8-sig', sep=';')
+    else:
+        conversor_final.exportar_excel_streaming(df, ruta_salida, log_queue)
+    conversor_final.guardar_conflictos(df_conflictos, ruta_salida, log_queue)
+    log_queue.put(f"✨ ¡Éxito! Archivo final guardado en: {ruta_salida} ({len(df)} registros).")
+
+
+def ejecutar_pipeline(ruta_excel: str, filtros: dict, ruta_salida: str | None, log_queue,
+                      modo_streaming: bool = False, usar_cache: bool = True, paralelo: bool = False,
+                      carpeta_memoria: str | None = None, deduplicar: bool = True,
+                      precedencia: tuple = conversor_final.PRECEDENCIA_ORIGEN,
+                      medidor: MedidorEtapas | None = None, ligero: bool = False) -> pd.DataFrame | None:
+    """
+    Ejecuta el flujo completo y devuelve el DataFrame unificado (o None si no hubo datos).
+    Si ruta_salida es None, el resultado sólo se devuelve. Con carpeta_memoria, los puntos
+    ya transformados en ejecuciones anteriores se reutilizan en vez de proyectarse de nuevo.
+    Con deduplicar, queda un registro por Expediente según precedencia (ver deduplicar_por_expediente).
+    Cada etapa se mide con medidor; si hay ruta_salida, el informe se guarda junto a ella.
+    Con ligero, la tabla se carga con tipos compactos (ver cargar_datos).
+    """
+    medidor = medidor or MedidorEtapas(log_queue)
+    try:
+        return _ejecutar_etapas(medidor, ruta_excel, filtros, ruta_salida, log_queue, modo_streaming, usar_cache,
+                                paralelo, carpeta_memoria, deduplicar, precedencia, ligero)
+    finally:
+        if ruta_salida:
+            medidor.guardar_informe(ruta_informe(ruta_salida), extra={'herramienta': 'pipeline', 'archivo': ruta_excel, 'filtros': filtros})
+
+
+def _ejecutar_etapas(medidor, ruta_excel, filtros, ruta_salida, log_queue, modo_streaming, usar_cache,
+                     paralelo, carpeta_memoria, deduplicar, precedencia, ligero) -> pd.DataFrame | None:
+    if modo_streaming:
+        with medidor.etapa('cargar_datos_filtrados') as etapa:
+            df_filtrado = filtrar_db.cargar_datos_filtrados(ruta_excel, filtros, log_queue)
+            etapa.filas_salida = len(df_filtrado) if df_filtrado is not None else 0
+        if df_filtrado is None:
+            return None
+    else:
+        with medidor.etapa('cargar_datos') as etapa:
+            df_original = filtrar_db.cargar_datos(ruta_excel, log_queue, usar_cache=usar_cache, ligero=ligero,
+                                                  columnas_extra=filtrar_db.columnas_de_expresiones([filtros]))
+            etapa.filas_salida = len(df_original) if df_original is not None else 0
+        if df_original is None:
+            return None
+        with medidor.etapa('filtrar_datos', filas_entrada=len(df_original)) as etapa:
+            df_filtrado = filtrar_db.filtrar_datos(df_original, filtros, log_queue)
+            etapa.filas_salida = len(df_filtrado) if df_filtrado is not None else 0
+        del df_original
+        if df_filtrado is None:
+            return None
+
+    if df_filtrado.empty:
+        log_queue.put("⏹️ No se encontraron registros que cumplan los criterios.")
+        return None
+
+    with medidor.etapa('procesar_coordenadas', filas_entrada=len(df_filtrado)) as etapa:
+        df_procesado = filtrar_db.procesar_coordenadas(df_filtrado, log_queue, como_entero=ligero)
+        etapa.filas_salida = len(df_procesado)
+    if filtros.get('espacial'):
+        with medidor.etapa('filtrar_espacial', filas_entrada=len(df_procesado)) as etapa:
+            df_procesado = filtrar_db.filtrar_espacial(df_procesado, filtros['espacial'], log_queue)
+            etapa.filas_salida = len(df_procesado)
+        if df_procesado.empty:
+            log_queue.put("⏹️ Ningún registro cumple el filtro espacial.")
+            return None
+    if df_procesado.empty:
+        log_queue.put("⏹️ No quedaron registros con coordenadas válidas.")
+        return None
+
+    with medidor.etapa('transformar_y_unificar', filas_entrada=len(df_procesado)) as etapa:
+        df_exportacion = filtrar_db.preparar_exportacion(df_procesado, log_queue)
+        memoria = transformacion.MemoriaTransformaciones(carpeta_memoria) if carpeta_memoria else None
+        df_final, df_conflictos = transformar_y_unificar(
+            df_exportacion, log_queue, paralelo=paralelo, memoria=memoria, deduplicar=deduplicar, precedencia=precedencia,
+        )
+        etapa.filas_salida = len(df_final)
+
+    if ruta_salida:
+        with medidor.etapa('guardar_resultado', filas_entrada=len(df_final)) as etapa:
+            guardar_resultado(df_final, ruta_salida, log_queue, df_conflictos)
+            etapa.filas_salida = len(df_final)
+    return df_final
+
+
+# --- PROCESAMIENTO INCREMENTAL ---
+
+def _filtros_estado(filtros: dict, ligero: bool = False) -> dict:
+    """
+    Filtros con que se guarda el estado incremental. Incluyen el modo de carga: las huellas
+    y el resultado del modo ligero usan otros tipos, así que cambiar de modo obliga a
+    procesar todo el libro. Si el filtro espacial usa un archivo de polígonos, se agrega el
+    hash de su contenido: editar el archivo cambia los filtros.
+    """
+    filtros_estado = dict(filtros, ligero=ligero)
+    espacial = filtros.get('espacial')
+    if espacial and espacial.get('poligono'):
+        filtros_estado['espacial'] = dict(espacial, hash_poligono=filtrar_db.hash_contenido(espacial['poligono']))
+    return filtros_estado
+
+
+def ejecutar_incremental(ruta_excel: str, filtros: dict, ruta_salida: str | None, carpeta_estado: str, log_queue,
+                         usar_cache: bool = True, paralelo: bool = False, carpeta_memoria: str | None = None,
+                         deduplicar: bool = True, precedencia: tuple = conversor_final.PRECEDENCIA_ORIGEN,
+                         ligero: bool = False) -> pd.DataFrame | None:
+    """
+    Como ejecutar_pipeline, pero sólo procesa los registros que cambiaron respecto de la
+    ejecución guardada en carpeta_estado (ver incremental.py) y parcha su resultado. La
+    primera vez, o si cambian los filtros o el modo ligero, todos los registros cuentan
+    como insertados.
+    """
+    df_original = filtrar_db.cargar_datos(ruta_excel, log_queue, usar_cache=usar_cache, ligero=ligero,
+                                          columnas_extra=filtrar_db.columnas_de_expresiones([filtros]))
+    if df_original is None:
+        return None
+    # Se valida antes de comparar: si no hubiera cambios, la expresión nunca llegaría a
+    # evaluarse y el estado se guardaría con un filtro que no puede aplicarse.
+    try:
+        filtrar_db.validar_campos_expresion(filtros, df_original.columns)
+    except ValueError as e:
+        log_queue.put(f"❌ ERROR: {e}")
+        return None
+
+    log_queue.put("\n🔄 Comparando con la ejecución anterior...")
+    claves = incremental.claves_registro(df_original)
+    huellas = incremental.calcular_huellas(df_original, claves)
+    filtros_estado = _filtros_estado(filtros, ligero)
+    estado = incremental.leer_estado(carpeta_estado, filtros_estado, log_queue) or {
+        'huellas': pd.Series(dtype='uint64'),
+        'resultado': pd.DataFrame(columns=['Expediente', 'Nombre Solicitante', 'Norte', 'Este', 'Datum']),
+        'conflictos': pd.DataFrame(columns=conversor_final.COLUMNAS_CONFLICTOS),
+    }
+    cambios = incremental.comparar_huellas(estado['huellas'], huellas)
+    log_queue.put(f"   - Insertados: {len(cambios['insertados'])}, actualizados: {len(cambios['actualizados'])}, "
+                  f"eliminados: {len(cambios['eliminados'])}.")
+
+    # Sólo los registros insertados o actualizados vuelven a pasar por el proceso.
+    claves_delta = cambios['insertados'].union(cambios['actualizados'])
+    df_final = pd.DataFrame(columns=estado['resultado'].columns)
+    df_conflictos = pd.DataFrame(columns=conversor_final.COLUMNAS_CONFLICTOS)
+    df_delta = df_original[claves.isin(claves_delta).to_numpy()]
+    if not df_delta.empty:
+        df_filtrado = filtrar_db.filtrar_datos(df_delta, filtros, log_queue)
+        if df_filtrado is None:
+            return None
+        df_procesado = filtrar_db.procesar_coordenadas(df_filtrado, log_queue, como_entero=ligero) if not df_filtrado.empty else df_filtrado
+        if filtros.get('espacial') and not df_procesado.empty:
+            df_procesado = filtrar_db.filtrar_espacial(df_procesado, filtros['espacial'], log_queue)
+        if not df_procesado.empty:
+            df_exportacion = filtrar_db.preparar_exportacion(df_procesado, log_queue)
+            memoria = transformacion.MemoriaTransformaciones(carpeta_memoria) if carpeta_memoria else None
+            df_final, conflictos_delta = transformar_y_unificar(
+                df_exportacion, log_queue, paralelo=paralelo, memoria=memoria, deduplicar=deduplicar, precedencia=precedencia,
+            )
+            if conflictos_delta is not None:
+                df_conflictos = conflictos_delta
+
+    claves_cambiadas = claves_delta.union(cambios['eliminados'])
+    df_final = incremental.aplicar_delta(estado['resultado'], df_final, claves_cambiadas)
+    df_conflictos = incremental.aplicar_delta(estado['conflictos'], df_conflictos, claves_cambiadas)
+    log_queue.put(f"   - ✅ Resultado actualizado: {len(df_final)} registros.")
+
+    if ruta_salida:
+        guardar_resultado(df_final, ruta_salida, log_queue, df_conflictos)
+    incremental.guardar_estado(carpeta_estado, filtros_estado, huellas, df_final, df_conflictos, log_queue)
+    return df_final
+
+
+# --- PROCESAMIENTO POR LOTES DE PERFILES ---
+CAMPOS_PERFIL = ('comuna', 'naturaleza', 'tipo_derecho', 'caudal', 'expresion', 'espacial')
+
+
+def cargar_perfiles(ruta_perfiles: str) -> list[dict]:
+    """
+    Lee una lista de perfiles de filtro desde JSON o YAML. Cada perfil tiene un 'nombre'
+    (opcional, define la subcarpeta) y los mismos campos que el diccionario de filtros;
+    'naturaleza' y 'tipo_derecho' son obligatorios. El archivo puede ser directamente la
+    lista o un objeto con la clave 'perfiles'.
+    """
+    with open(ruta_perfiles, encoding='utf-8') as f:
+        if ruta_perfiles.lower().endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("Para leer perfiles en YAML instala PyYAML: pip install pyyaml")
+            datos = yaml.safe_load(f)
+        else:
+            datos = json.load(f)
+    if isinstance(datos, dict):
+        datos = datos.get('perfiles', [])
+
+    perfiles = []
+    carpeta_base = os.path.dirname(os.path.abspath(ruta_perfiles))
+    for i, perfil in enumerate(datos, start=1):
+        nombre = str(perfil.get('nombre') or f"perfil_{i}")
+        try:
+            filtros = validar_filtros(perfil, carpeta_base)
+        except ValueError as e:
+            raise ValueError(f"El perfil {i}: {e}")
+        perfiles.append({'nombre': nombre, 'filtros': filtros})
+    return perfiles
+
+
+def validar_filtros(datos: dict, carpeta_base: str | None = None) -> dict:
+    """
+    Arma el diccionario de filtros con los campos de CAMPOS_PERFIL de datos (un perfil o
+    una consulta) y lo valida: 'naturaleza' y 'tipo_derecho' obligatorios, expresión y
+    filtro espacial bien formados. Las rutas de polígonos relativas se buscan en
+    carpeta_base. Lanza ValueError con el motivo.
+    """
+    if not datos.get('naturaleza') or not datos.get('tipo_derecho'):
+        raise ValueError("Debe indicar 'naturaleza' y 'tipo_derecho'.")
+    filtros = {campo: datos.get(campo) or '' for campo in CAMPOS_PERFIL}
+    if filtros['expresion']:
+        try:
+            compilar_expresion(filtros['expresion'])
+        except ValueError as e:
+            raise ValueError(f"La expresión no es válida: {e}")
+    if filtros['espacial']:
+        if not isinstance(filtros['espacial'], dict):
+            raise ValueError("'espacial' debe ser un objeto (rectangulo, radio, poligono).")
+        if filtros['espacial'].get('poligono') and carpeta_base:
+            filtros['espacial'] = dict(filtros['espacial'], poligono=os.path.join(carpeta_base, filtros['espacial']['poligono']))
+        try:
+            validar_espacial(filtros['espacial'])
+        except (OSError, ValueError) as e:
+            raise ValueError(f"El filtro espacial no es válido: {e}")
+    return filtros
+
+
+def _nombre_carpeta(nombre: str) -> str:
+    return re.sub(r'[^\w\-. ]', '_', nombre).strip() or 'perfil'
+
+
+def procesar_perfil(df: pd.DataFrame, indice, perfil: dict, carpeta_destino: str, log_queue,
+                    formato: str = 'csv', compresion: str | None = None, datum_vacio_aparte: bool = False,
+                    ligero: bool = False, unificar: bool = False) -> int | None:
+    """
+    Filtra la tabla compartida con un perfil y exporta sus archivos por Datum en la
+    subcarpeta del perfil (ver exportar_por_datum). Con unificar, en cambio, transforma y
+    une los registros como los programas 2, 3 y 4 y guarda '<perfil>.xlsx' en
+    carpeta_destino. Devuelve la cantidad de archivos generados, o None si los filtros
+    del perfil no pudieron aplicarse.
+    """
+    log = LogConPrefijo(log_queue, perfil['nombre'])
+    df_filtrado = filtrar_db.filtrar_datos(df, perfil['filtros'], log, indice=indice)
+    if df_filtrado is None:
+        return None
+    if df_filtrado.empty:
+        log.put("⏹️ No se encontraron registros que cumplan los criterios.")
+        return 0
+    df_procesado = filtrar_db.procesar_coordenadas(df_filtrado, log, como_entero=ligero)
+    if perfil['filtros'].get('espacial'):
+        df_procesado = filtrar_db.filtrar_espacial(df_procesado, perfil['filtros']['espacial'], log)
+    if df_procesado.empty:
+        log.put("⏹️ No quedaron registros con coordenadas válidas.")
+        return 0
+    if unificar:
+        df_exportacion = filtrar_db.preparar_exportacion(df_procesado, log)
+        df_final, df_conflictos = transformar_y_unificar(df_exportacion, log)
+        os.makedirs(carpeta_destino, exist_ok=True)
+        guardar_resultado(df_final, os.path.join(carpeta_destino, _nombre_carpeta(perfil['nombre']) + '.xlsx'), log, df_conflictos)
+        return 1
+    carpeta_perfil = os.path.join(carpeta_destino, _nombre_carpeta(perfil['nombre']))
+    os.makedirs(carpeta_perfil, exist_ok=True)
+    return filtrar_db.exportar_por_datum(
+        df_procesado, log, carpeta_perfil, formato=formato, compresion=compresion, datum_vacio_aparte=datum_vacio_aparte,
+    )
+
+
+def ejecutar_perfiles(ruta_excel: str, ruta_perfiles: str, carpeta_destino: str, log_queue,
+                      max_hilos: int | None = None, usar_cache: bool = True, formato: str = 'csv',
+                      compresion: str | None = None, datum_vacio_aparte: bool = False,
+                      ligero: bool = False, unificar: bool = False) -> dict[str, int | None] | None:
+    """
+    Carga el Excel una sola vez y evalúa todos los perfiles sobre la misma tabla en memoria,
+    en un pool de hilos. La tabla y su IndiceFiltros sólo se leen, así que se comparten
+    sin copiarlos. Devuelve los archivos generados por perfil, con None en los perfiles
+    que fallaron (ver perfiles_fallidos), o None si falló la carga.
+    """
+    perfiles = cargar_perfiles(ruta_perfiles)
+    log_queue.put(f"📋 Se leyeron {len(perfiles)} perfiles de filtro.")
+
+    df = filtrar_db.cargar_datos(ruta_excel, log_queue, usar_cache=usar_cache, ligero=ligero,
+                                 columnas_extra=filtrar_db.columnas_de_expresiones([p['filtros'] for p in perfiles]))
+    if df is None:
+        return None
+    indice = filtrar_db.IndiceFiltros(df)
+
+    with ThreadPoolExecutor(max_workers=max_hilos) as pool:
+        tareas = {p['nombre']: pool.submit(procesar_perfil, df, indice, p, carpeta_destino, log_queue,
+                                           formato, compresion, datum_vacio_aparte, ligero, unificar) for p in perfiles}
+        resultados = {}
+        for nombre, tarea in tareas.items():
+            try:
+                resultados[nombre] = tarea.result()
+            except Exception as e:
+                log_queue.put(f"[{nombre}] ❌ ERROR: {e}")
+                resultados[nombre] = None
+
+    log_queue.put(f"\n✨ Lote finalizado: {sum(1 for n in resultados.values() if n)} de {len(perfiles)} perfiles generaron archivos.")
+    fallidos = perfiles_fallidos(resultados)
+    if fallidos:
+        log_queue.put(f"❌ ERROR: {len(fallidos)} perfiles fallaron: {', '.join(fallidos)}.")
+    return resultados
+
+
+def perfiles_fallidos(resultados: dict[str, int | None]) -> list[str]:
+    """Nombres de los perfiles que fallaron en un resultado de ejecutar_perfiles."""
+    return [nombre for nombre, archivos in resultados.items() if archivos is None]
+
+
+def _filtros_desde_argumentos(args) -> dict:
+    return {
+        'comuna': args.comuna or '',
+        'naturaleza': args.naturaleza,
+        'tipo_derecho': args.tipo_derecho,
+        'caudal': args.caudal or '',
+        'expresion': args.expresion or '',
+        'espacial': _espacial_desde_argumentos(args),
+    }
+
+
+def _espacial_desde_argumentos(args) -> dict | None:
+    espacial = {}
+    if args.rectangulo:
+        espacial['rectangulo'] = args.rectangulo
+    if args.radio:
+        espacial['radio'] = args.radio
+    if args.poligono:
+        espacial['poligono'] = os.path.abspath(args.poligono)
+        espacial['seleccion'] = args.seleccion_poligono
+    return espacial or None
+
+
+def crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Procesa un Excel de derechos de agua de punta a punta, sin interfaz gráfica.")
+    parser.add_argument('excel', help="Archivo Excel de origen (.xlsx o .xls).")
+    parser.add_argument('salida', help="Archivo final unificado (.xlsx o .csv), o carpeta de destino con --perfiles.")
+    parser.add_argument('--comuna', action='append', help="Filtro de comuna (opcional, se puede repetir para varias comunas).")
+    parser.add_argument('--naturaleza', help="Naturaleza del agua, ej. Subterranea (obligatorio sin --perfiles).")
+    parser.add_argument('--tipo-derecho', help="Tipo de derecho, ej. Consuntivo (obligatorio sin --perfiles).")
+    parser.add_argument('--caudal', help="Filtro de caudal, ej. '>= 10'.")
+    parser.add_argument('--expresion', help="Expresión de filtro sobre columnas numéricas y fechas, ej. '1 <= caudal < 50 y norte > 7000000'.")
+    parser.add_argument('--rectangulo', nargs=4, type=float, metavar=('ESTE_MIN', 'NORTE_MIN', 'ESTE_MAX', 'NORTE_MAX'),
+                        help="Sólo los puntos dentro del rectángulo (UTM 19S, WGS 84).")
+    parser.add_argument('--radio', nargs=3, type=float, metavar=('ESTE', 'NORTE', 'METROS'),
+                        help="Sólo los puntos a METROS o menos del punto (UTM 19S, WGS 84).")
+    parser.add_argument('--poligono', metavar='ARCHIVO', help="Sólo los puntos dentro de los polígonos del archivo GeoJSON o WKT.")
+    parser.add_argument('--seleccion-poligono', metavar='PROPIEDAD=VALOR', help="Con --poligono, usa sólo las Features con esa propiedad.")
+    parser.add_argument('--streaming', action='store_true', help="Lee el Excel fila a fila (menor uso de memoria).")
+    parser.add_argument('--ligero', action='store_true', help="Carga sólo las columnas usadas, con tipos compactos (menor uso de memoria).")
+    parser.add_argument('--paralelo', action='store_true', help="Reparte la transformación de Datum entre todos los núcleos.")
+    parser.add_argument('--memoria-transformaciones', metavar='CARPETA', help="Carpeta donde recordar los puntos ya transformados entre ejecuciones.")
+    parser.add_argument('--precedencia', default=','.join(conversor_final.PRECEDENCIA_ORIGEN),
+                        help="Orden de preferencia de los Datum de origen cuando un Expediente se repite (por defecto 1984,1956,1969).")
+    parser.add_argument('--sin-deduplicar', action='store_true', help="Conserva todos los registros aunque el Expediente se repita.")
+    parser.add_argument('--incremental', metavar='CARPETA', help="Guarda el estado en CARPETA y en las siguientes ejecuciones sólo procesa los registros que cambiaron.")
+    parser.add_argument('--perfiles', metavar='ARCHIVO', help="Lista de perfiles de filtro (JSON/YAML): exporta los CSV de cada perfil en su subcarpeta.")
+    parser.add_argument('--formato', choices=['csv', 'parquet', 'arrow'], default='csv', help="Formato de los archivos por Datum con --perfiles.")
+    parser.add_argument('--compresion', choices=['gzip', 'zstd'], help="Comprime los archivos por Datum con --perfiles.")
+    parser.add_argument('--sin-datum-aparte', action='store_true', help="Con --perfiles, escribe los registros sin Datum una vez en 'sin_datum' en vez de repetirlos en cada archivo.")
+    parser.add_argument('--unificar', action='store_true', help="Con --perfiles, guarda por perfil el reporte unificado en WGS 84 (<perfil>.xlsx) en vez de los archivos por Datum.")
+    parser.add_argument('--hilos', type=int, help="Perfiles procesados en paralelo (por defecto, según los núcleos).")
+    parser.add_argument('--perfilar', action='store_true', help="Guarda un volcado de cProfile por etapa junto al informe de rendimiento.")
+    parser.add_argument('--trazar-memoria', action='store_true', help="Mide el pico de memoria de cada etapa con tracemalloc (más lento).")
+    parser.add_argument('--sin-cache', action='store_true', help="Ignora la caché del libro de origen.")
+    parser.add_argument('--silencioso', action='store_true', help="No muestra el registro de actividad.")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+    log = LogConsola(silencioso=args.silencioso)
+
+    if args.perfiles:
+        resultados = ejecutar_perfiles(
+            args.excel, args.perfiles, args.salida, log, max_hilos=args.hilos, usar_cache=not args.sin_cache,
+            formato=args.formato, compresion=args.compresion, datum_vacio_aparte=args.sin_datum_aparte,
+            ligero=args.ligero, unificar=args.unificar,
+        )
+        return 0 if resultados is not None and not perfiles_fallidos(resultados) else 1
+
+    if not args.naturaleza or not args.tipo_derecho:
+        parser.error("--naturaleza y --tipo-derecho son obligatorios (salvo con --perfiles).")
+    precedencia = tuple(p.strip() for p in args.precedencia.split(','))
+    if sorted(precedencia) != sorted(conversor_final.PRECEDENCIA_ORIGEN):
+        parser.error("--precedencia debe ordenar los tres Datum: 1984, 1956 y 1969.")
+    if args.expresion:
+        try:
+            compilar_expresion(args.expresion)
+        except ValueError as e:
+            parser.error(f"--expresion no es válida: {e}")
+    filtros = _filtros_desde_argumentos(args)
+    if filtros['espacial']:
+        try:
+            validar_espacial(filtros['espacial'])
+        except (OSError, ValueError) as e:
+            parser.error(f"El filtro espacial no es válido: {e}")
+    if args.incremental:
+        df_final = ejecutar_incremental(
+            args.excel, filtros, args.salida, args.incremental, log,
+            usar_cache=not args.sin_cache, paralelo=args.paralelo, carpeta_memoria=args.memoria_transformaciones,
+            deduplicar=not args.sin_deduplicar, precedencia=precedencia, ligero=args.ligero,
+        )
+        return 0 if df_final is not None else 1
+    df_final = ejecutar_pipeline(
+        args.excel, filtros, args.salida, log,
+        modo_streaming=args.streaming, usar_cache=not args.sin_cache, paralelo=args.paralelo,
+        carpeta_memoria=args.memoria_transformaciones, deduplicar=not args.sin_deduplicar,
+        precedencia=precedencia, medidor=MedidorEtapas(log, perfilar=args.perfilar, trazar_memoria=args.trazar_memoria),
+        ligero=args.ligero,
+    )
+    return 0 if df_final is not None else 1
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Canal de registro entre los hilos de trabajo y el área de registro de las ventanas.
+
+Los procesos siguen escribiendo con log_queue.put(...), uno por evento. La interfaz, en
+vez de insertar cada mensaje por separado en el ScrolledText, vacía el canal una vez por
+ciclo (drenar) y recibe las líneas ya agrupadas en un solo bloque de texto, que se
+inserta con una sola actualización del widget (mostrar_en_registro). Además:
+
+- cada mensaje se clasifica por nivel (info, advertencia, error) y se cuenta;
+- las advertencias que se repiten con distinto valor (p. ej. una por coordenada) se
+  muestran sólo las primeras veces; el resto se resume en una sola línea por tipo, con
+  el total, cuando termina el proceso (ver es_fin);
+- el widget conserva sólo las últimas MAX_LINEAS_VISIBLES líneas.
+
+Los mensajes de control (diccionarios y textos que empiezan con 'FIN_') se entregan
+aparte y en orden, para que cada ventana los maneje como antes.
+"""
+import queue
+import re
+import tkinter as tk
+from collections import Counter
+
+MAX_LINEAS_VISIBLES = 5000          # Líneas que conserva el área de registro.
+MAX_MENSAJES_POR_CICLO = 10_000     # Mensajes que se procesan en cada ciclo de la interfaz.
+MAX_REPETICIONES_VISIBLES = 5       # Advertencias iguales (salvo valores) que se muestran completas.
+
+# Valores entre comillas y números: lo que cambia entre advertencias del mismo tipo.
+_PATRON_VALORES = re.compile(r"'[^']*'|\"[^\"]*\"|\d+(?:[.,]\d+)*")
+
+
+def es_control(msg) -> bool:
+    """Mensajes que no se muestran en el registro sino que maneja la ventana."""
+    return isinstance(msg, dict) or (isinstance(msg, str) and msg.startswith('FIN_'))
+
+
+def es_fin(msg) -> bool:
+    """Mensajes de control con que termina un proceso ('FIN_...' o el resultado de 4_Conversor_final)."""
+    return (isinstance(msg, str) and msg.startswith('FIN_')) or (isinstance(msg, dict) and 'dataframe_final' in msg)
+
+
+def nivel_de(msg: str) -> str:
+    if '❌' in msg:
+        return 'error'
+    if '⚠️' in msg:
+        return 'advertencia'
+    return 'info'
+
+
+class CanalRegistro(queue.Queue):
+    """
+    Cola de registro con niveles, contadores y resumen de advertencias repetidas.
+    Se usa igual que queue.Queue desde los hilos de trabajo.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.contadores = Counter()
+        self._repeticiones = Counter()
+        # Advertencias ocultas por tipo, pendientes de resumir al terminar el proceso.
+        self._omitidas = Counter()
+
+    def reiniciar(self):
+        """Descarta los contadores del proceso anterior."""
+        self.contadores.clear()
+        self._repeticiones.clear()
+        self._omitidas.clear()
+
+    def drenar(self, max_mensajes: int = MAX_MENSAJES_POR_CICLO) -> list[tuple[str, object]]:
+        """
+        Vacía hasta max_mensajes del canal. Devuelve, en orden, tuplas ('texto', bloque)
+        con las líneas consecutivas ya unidas y ('control', mensaje) para los de control.
+        """
+        eventos = []
+        lineas = []
+        for _ in range(max_mensajes):
+            try:
+                msg = self.get_nowait()
+            except queue.Empty:
+                break
+            if es_control(msg):
+                if es_fin(msg):
+                    self._agregar_resumen(lineas)
+                if lineas:
+                    eventos.append(('texto', '\n'.join(lineas)))
+                    lineas = []
+                eventos.append(('control', msg))
+                continue
+
+            msg = str(msg)
+            nivel = nivel_de(msg)
+            self.contadores[nivel] += 1
+            if nivel == 'advertencia':
+                tipo = _PATRON_VALORES.sub('#', msg)
+                self._repeticiones[tipo] += 1
+                if self._repeticiones[tipo] > MAX_REPETICIONES_VISIBLES:
+                    self._omitidas[tipo] += 1
+                    continue
+            lineas.append(msg)
+
+        if lineas:
+            eventos.append(('texto', '\n'.join(lineas)))
+        return eventos
+
+    def _agregar_resumen(self, lineas: list[str]):
+        """Una línea por cada tipo de advertencia oculto desde el último resumen."""
+        for tipo, n in self._omitidas.items():
+            lineas.append(f"   ⚠️ ... {n} advertencias similares más (total: {self._repeticiones[tipo]}): {tipo.strip()}")
+        self._omitidas.clear()
+
+
+def mostrar_en_registro(area, texto: str, max_lineas: int = MAX_LINEAS_VISIBLES):
+    """
+    Agrega un bloque de texto al área de registro en una sola actualización y descarta
+    las líneas más antiguas si se supera max_lineas.
+    """
+    area.config(state='normal')
+    area.insert(tk.END, texto + '\n')
+    exceso = int(area.index('end-1c').split('.')[0]) - 1 - max_lineas
+    if exceso > 0:
+        area.delete('1.0', f'{exceso + 1}.0')
+    area.config(state='disabled')
+    area.see(tk.END)
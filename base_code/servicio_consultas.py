@@ -0,0 +1,371 @@
+"""
+Servicio local de consultas sobre el libro de derechos de agua ya cargado.
+
+Cada ventana (y cada ejecución de pipeline.py) vuelve a importar pandas y pyproj y a leer
+el Excel o su caché. Este servicio lo hace una sola vez: carga el libro con cargar_datos,
+estandariza las coordenadas de toda la tabla, construye su IndiceFiltros y su índice
+espacial, y atiende consultas HTTP/JSON en localhost sobre la tabla en memoria. Como la
+estandarización es fila a fila, hacerla antes de filtrar da el mismo resultado que el
+orden de las ventanas, y cada consulta sólo paga el filtro. Cada consulta se atiende en su
+propio hilo; la tabla y los índices sólo se leen, así que se comparten sin copiarlos (como
+en los perfiles por lotes de pipeline.py).
+
+Uso:
+    python servicio_consultas.py Derechos_Concedidos.xlsx --puerto 8765 --carpeta-exportacion exportaciones
+
+Rutas (los filtros usan los mismos campos que los perfiles: naturaleza, tipo_derecho,
+comuna, caudal, expresion y espacial):
+    GET  /estado       archivo cargado, filas, tiempo de carga y consultas atendidas
+    POST /consultar    {"naturaleza": "Subterranea", "tipo_derecho": "Consuntivo", "limite": 100, "desde": 0}
+                       con "wgs84": true, devuelve el resultado unificado en WGS 84
+    POST /transformar  {"datum": "1956", "puntos": [[este, norte], ...]}
+    POST /exportar     {"naturaleza": ..., "tipo_derecho": ..., "destino": "pica"}  (carpeta: CSV por Datum)
+                       {"naturaleza": ..., "tipo_derecho": ..., "destino": "pica.xlsx"}  (reporte unificado)
+    POST /recargar     vuelve a leer el libro si cambió ({"forzar": true} para leerlo igual)
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+import transformacion
+import filtro_espacial
+from registro import es_control
+
+filtrar_db = importlib.import_module('1_Filtrar_DB')
+
+HOST_POR_DEFECTO = '127.0.0.1'
+PUERTO_POR_DEFECTO = 8765
+LIMITE_POR_DEFECTO = 1000
+FORMATOS_EXPORTACION = ('csv', 'parquet', 'arrow')
+
+# Columnas que devuelve /consultar y su nombre en la respuesta.
+COLUMNAS_CONSULTA = {
+    **filtrar_db.RENOMBRAR_COLUMNAS,
+    filtrar_db.COL_SOLICITUD: 'Solicitud',
+    filtrar_db.COL_COMUNA: 'Comuna',
+    filtrar_db.COL_NATURALEZA: 'Naturaleza',
+    filtrar_db.COL_TIPO_DERECHO: 'Tipo Derecho',
+    filtrar_db.COL_CAUDAL: 'Caudal',
+}
+
+
+class RegistroConsulta:
+    """log_queue de una consulta: guarda los mensajes para devolverlos en la respuesta."""
+    def __init__(self):
+        self.mensajes = []
+
+    def put(self, msg):
+        if not es_control(msg) and str(msg).strip():
+            self.mensajes.append(str(msg).strip())
+
+
+def _registros(df: pd.DataFrame) -> list[dict]:
+    # to_json ya escribe NaN/NA como null y las fechas en ISO.
+    return json.loads(df.to_json(orient='records', force_ascii=False, date_format='iso'))
+
+
+def _entero(datos: dict, campo: str, por_defecto: int) -> int:
+    try:
+        valor = int(datos.get(campo, por_defecto))
+    except (TypeError, ValueError):
+        raise ValueError(f"'{campo}' debe ser un número entero.")
+    if valor < 0:
+        raise ValueError(f"'{campo}' no puede ser negativo.")
+    return valor
+
+
+class ServicioConsultas:
+    """
+    Estado del servicio: la tabla cargada, su índice y los contadores de consultas.
+    Al recargar, la tabla nueva reemplaza a la anterior de una vez; las consultas en curso
+    terminan con la tabla con que empezaron.
+    """
+
+    def __init__(self, ruta_excel: str, log_queue, ligero: bool = False, carpeta_exportacion: str | None = None):
+        self.ruta_excel = os.path.abspath(ruta_excel)
+        self.log_queue = log_queue
+        self.ligero = ligero
+        self.carpeta_exportacion = os.path.abspath(carpeta_exportacion) if carpeta_exportacion else None
+        self.consultas = 0
+        self._lock = threading.Lock()
+        self._lock_carga = threading.Lock()
+        self.firma = None
+        self.cargar()
+
+    # --- CARGA ---
+    def _firma_archivo(self) -> tuple[int, int]:
+        info = os.stat(self.ruta_excel)
+        return info.st_mtime_ns, info.st_size
+
+    def cargar(self):
+        """Carga e indexa el libro, y prepara de antemano lo que usan casi todas las consultas."""
+        with self._lock_carga:
+            inicio = time.perf_counter()
+            firma = self._firma_archivo()
+            df = filtrar_db.cargar_datos(self.ruta_excel, self.log_queue, ligero=self.ligero)
+            if df is None:
+                raise ValueError(f"No se pudo cargar '{os.path.basename(self.ruta_excel)}'.")
+            df = filtrar_db.procesar_coordenadas(df, self.log_queue, como_entero=self.ligero)
+            indice = filtrar_db.IndiceFiltros(df)
+            indice.columna_expresion('caudal', 'numero')
+            indice_espacial = filtrar_db.construir_indice_espacial(df)
+            # Las consultas recortan sólo las columnas que devuelven o exportan; el índice
+            # conserva la tabla completa para las expresiones sobre cualquier columna.
+            df_consulta = df[[c for c in COLUMNAS_CONSULTA if c in df.columns]]
+            with self._lock:
+                self.df, self.indice, self.indice_espacial, self.firma = df_consulta, indice, indice_espacial, firma
+                self.cargado_en = datetime.now().isoformat(timespec='seconds')
+                self.tiempo_carga = time.perf_counter() - inicio
+            self.log_queue.put(f"✅ Libro listo para consultas: {len(df)} filas en {self.tiempo_carga:.2f} s.")
+
+    def tabla(self) -> tuple[pd.DataFrame, filtrar_db.IndiceFiltros, filtro_espacial.IndiceGrilla]:
+        with self._lock:
+            return self.df, self.indice, self.indice_espacial
+
+    def contar_consulta(self):
+        with self._lock:
+            self.consultas += 1
+
+    # --- CONSULTAS ---
+    def _filtrar(self, datos: dict, log) -> pd.DataFrame:
+        """Filtros y filtro espacial sobre la tabla cargada (coordenadas ya estandarizadas)."""
+        filtros = pipeline.validar_filtros(datos)
+        df, indice, indice_espacial = self.tabla()
+        # Un campo inexistente es un error de la consulta (400), no una consulta sin resultados.
+        filtrar_db.validar_campos_expresion(filtros, indice.df.columns)
+        df_resultado = filtrar_db.filtrar_datos(df, filtros, log, indice=indice)
+        if filtros['espacial'] and not df_resultado.empty:
+            # El índice espacial es de la tabla completa: se toma la máscara de las filas filtradas.
+            mascara = filtro_espacial.mascara_espacial(indice_espacial, filtros['espacial'], log)
+            df_resultado = df_resultado[mascara[df.index.get_indexer(df_resultado.index)]]
+            log.put(f"✅ Filtro espacial aplicado. Quedan {len(df_resultado)} registros.")
+        return df_resultado
+
+    def _unificar(self, df_procesado: pd.DataFrame, datos: dict, log) -> tuple[pd.DataFrame, pd.DataFrame | None]:
+        # preparar_exportacion escribe en su tabla: se le pasa una copia, no la porción de _filtrar.
+        df_exportacion = filtrar_db.preparar_exportacion(df_procesado.copy(), log)
+        return pipeline.transformar_y_unificar(df_exportacion, log, deduplicar=datos.get('deduplicar', True))
+
+    def estado(self, datos: dict) -> dict:
+        with self._lock:
+            return {
+                'archivo': self.ruta_excel, 'filas': len(self.df), 'ligero': self.ligero,
+                'cargado_en': self.cargado_en, 'tiempo_carga_s': round(self.tiempo_carga, 3),
+                'consultas': self.consultas, 'exportacion': self.carpeta_exportacion,
+            }
+
+    def consultar(self, datos: dict) -> dict:
+        desde = _entero(datos, 'desde', 0)
+        limite = _entero(datos, 'limite', LIMITE_POR_DEFECTO)
+        log = RegistroConsulta()
+        df_resultado = self._filtrar(datos, log)
+        if datos.get('wgs84'):
+            if not df_resultado.empty:
+                df_resultado, _ = self._unificar(df_resultado, datos, log)
+        else:
+            columnas = [c for c in COLUMNAS_CONSULTA if c in df_resultado.columns]
+            df_resultado = df_resultado[columnas].rename(columns=COLUMNAS_CONSULTA)
+        return {
+            'total': len(df_resultado), 'desde': desde,
+            'registros': _registros(df_resultado.iloc[desde:desde + limite]), 'registro': log.mensajes,
+        }
+
+    def transformar(self, datos: dict) -> dict:
+        datum = str(datos.get('datum', ''))
+        if datum not in transformacion.CRS_POR_DATUM:
+            raise ValueError(f"'datum' debe ser uno de: {', '.join(transformacion.CRS_POR_DATUM)}.")
+        try:
+            puntos = np.asarray(datos.get('puntos') or [], dtype=float).reshape(-1, 2)
+        except (TypeError, ValueError):
+            raise ValueError("'puntos' debe ser una lista de pares [este, norte].")
+        este, norte = transformacion.transformar_arreglos(puntos[:, 0].copy(), puntos[:, 1].copy(), transformacion.CRS_POR_DATUM[datum])
+        # Igual que transformar_datum: metros enteros, y null si el punto no se pudo transformar.
+        return {'datum': 'WGS 84', 'puntos': [
+            [int(round(e)), int(round(n))] if np.isfinite(e) and np.isfinite(n) else None for e, n in zip(este, norte)
+        ]}
+
+    def _ruta_exportacion(self, destino: str) -> str:
+        if not self.carpeta_exportacion:
+            raise ValueError("El servicio se inició sin --carpeta-exportacion: no puede escribir archivos.")
+        ruta = os.path.abspath(os.path.join(self.carpeta_exportacion, str(destino)))
+        if os.path.commonpath([ruta, self.carpeta_exportacion]) != self.carpeta_exportacion or ruta == self.carpeta_exportacion:
+            raise ValueError("'destino' debe ser un archivo o carpeta dentro de la carpeta de exportación.")
+        return ruta
+
+    def exportar(self, datos: dict) -> dict:
+        if not datos.get('destino'):
+            raise ValueError("Debe indicar 'destino' (carpeta para los CSV por Datum, o archivo .xlsx/.csv unificado).")
+        ruta = self._ruta_exportacion(datos['destino'])
+        formato = str(datos.get('formato', 'csv')).lower()
+        if formato not in FORMATOS_EXPORTACION:
+            raise ValueError(f"'formato' debe ser uno de: {', '.join(FORMATOS_EXPORTACION)}.")
+        log = RegistroConsulta()
+        df_procesado = self._filtrar(datos, log)
+        if df_procesado.empty:
+            return {'ruta': ruta, 'archivos': 0, 'filas': 0, 'registro': log.mensajes}
+
+        if ruta.lower().endswith(('.xlsx', '.csv')):
+            df_final, df_conflictos = self._unificar(df_procesado, datos, log)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            pipeline.guardar_resultado(df_final, ruta, log, df_conflictos)
+            return {'ruta': ruta, 'archivos': 1, 'filas': len(df_final), 'registro': log.mensajes}
+
+        os.makedirs(ruta, exist_ok=True)
+        archivos = filtrar_db.exportar_por_datum(
+            df_procesado.copy(), log, ruta, formato=formato, compresion=datos.get('compresion'),
+            datum_vacio_aparte=bool(datos.get('sin_datum_aparte')),
+        )
+        return {'ruta': ruta, 'archivos': archivos, 'filas': len(df_procesado), 'registro': log.mensajes}
+
+    def recargar(self, datos: dict) -> dict:
+        # Como estado: la firma y la tabla se leen bajo el candado, porque otra recarga puede reemplazarlas.
+        with self._lock:
+            firma, filas = self.firma, len(self.df)
+        if not datos.get('forzar') and self._firma_archivo() == firma:
+            return {'recargado': False, 'filas': filas}
+        self.cargar()
+        with self._lock:
+            return {'recargado': True, 'filas': len(self.df)}
+
+
+# --- SERVIDOR HTTP ---
+RUTAS = {
+    ('GET', '/estado'): 'estado',
+    ('POST', '/consultar'): 'consultar',
+    ('POST', '/transformar'): 'transformar',
+    ('POST', '/exportar'): 'exportar',
+    ('POST', '/recargar'): 'recargar',
+}
+
+
+class ManejadorConsultas(BaseHTTPRequestHandler):
+    """Traduce cada petición a un método de ServicioConsultas y responde en JSON."""
+
+    def do_GET(self):
+        self._atender('GET')
+
+    def do_POST(self):
+        self._atender('POST')
+
+    def _leer_json(self) -> dict:
+        largo = int(self.headers.get('Content-Length') or 0)
+        datos = json.loads(self.rfile.read(largo) or b'{}')
+        if not isinstance(datos, dict):
+            raise ValueError("El cuerpo de la petición debe ser un objeto JSON.")
+        return datos
+
+    def _atender(self, metodo: str):
+        inicio = time.perf_counter()
+        ruta = urlsplit(self.path).path.rstrip('/') or '/'
+        accion = RUTAS.get((metodo, ruta))
+        servicio = self.server.servicio
+        try:
+            if accion is None:
+                codigo, cuerpo = 404, {'error': f"Ruta no encontrada: {metodo} {ruta}"}
+            else:
+                servicio.contar_consulta()
+                datos = self._leer_json() if metodo == 'POST' else {}
+                codigo, cuerpo = 200, getattr(servicio, accion)(datos)
+        except ValueError as e:
+            codigo, cuerpo = 400, {'error': str(e)}
+        except Exception as e:
+            codigo, cuerpo = 500, {'error': f"Error inesperado: {e}"}
+            servicio.log_queue.put(f"❌ ERROR en {metodo} {ruta}: {e}")
+
+        cuerpo['tiempo_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+        contenido = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(contenido)))
+        self.end_headers()
+        self.wfile.write(contenido)
+        servicio.log_queue.put(f"   - {metodo} {ruta} → {codigo} ({cuerpo['tiempo_ms']} ms)")
+
+    def log_message(self, format, *args):
+        # Cada petición ya queda en el registro del servicio (ver _atender).
+        pass
+
+
+class ServidorConsultas(ThreadingHTTPServer):
+    """
+    Atiende cada petición en un grupo fijo de hilos en vez de crear uno nuevo por petición:
+    pyproj prepara su contexto una vez por hilo (unos 80 ms), así que los hilos se
+    reutilizan y se preparan todos al iniciar.
+    """
+    daemon_threads = True
+
+    def __init__(self, direccion: tuple[str, int], servicio: ServicioConsultas, hilos: int | None = None):
+        super().__init__(direccion, ManejadorConsultas)
+        self.servicio = servicio
+        self.hilos = hilos or min(32, (os.cpu_count() or 1) + 4)
+        self.pool = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='consulta')
+        self._calentar_hilos()
+
+    def _calentar_hilos(self):
+        # La barrera obliga a que cada tarea ocupe un hilo distinto del grupo.
+        barrera = threading.Barrier(self.hilos, timeout=30)
+        punto = np.array([345678.0]), np.array([6325123.0])
+
+        def calentar():
+            for crs_origen in transformacion.CRS_POR_DATUM.values():
+                transformacion.transformar_arreglos(punto[0].copy(), punto[1].copy(), crs_origen)
+            barrera.wait()
+
+        for tarea in [self.pool.submit(calentar) for _ in range(self.hilos)]:
+            tarea.result()
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Servicio local de consultas sobre el libro de derechos de agua ya cargado.")
+    parser.add_argument('excel', help="Archivo Excel de origen (.xlsx o .xls).")
+    parser.add_argument('--host', default=HOST_POR_DEFECTO, help=f"Dirección en que escuchar (por defecto {HOST_POR_DEFECTO}, sólo este equipo).")
+    parser.add_argument('--puerto', type=int, default=PUERTO_POR_DEFECTO)
+    parser.add_argument('--hilos', type=int, help="Consultas atendidas al mismo tiempo (por defecto, según los núcleos).")
+    parser.add_argument('--ligero', action='store_true', help="Carga sólo las columnas usadas, con tipos compactos (menor uso de memoria).")
+    parser.add_argument('--carpeta-exportacion', metavar='CARPETA', help="Carpeta donde /exportar puede escribir archivos (sin ella, /exportar no está disponible).")
+    parser.add_argument('--silencioso', action='store_true', help="No muestra el registro de actividad.")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = crear_parser().parse_args(argv)
+    log = pipeline.LogConsola(silencioso=args.silencioso)
+    try:
+        servicio = ServicioConsultas(args.excel, log, ligero=args.ligero, carpeta_exportacion=args.carpeta_exportacion)
+    except (OSError, ValueError) as e:
+        log.put(f"❌ ERROR: {e}")
+        return 1
+
+    servidor = ServidorConsultas((args.host, args.puerto), servicio, hilos=args.hilos)
+    log.put(f"🌐 Servicio de consultas escuchando en http://{args.host}:{servidor.server_address[1]} (Ctrl+C para detener).")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    log.put("⏹️ Servicio detenido.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""
+Configuración común de las pruebas. Los módulos de la suite viven en base_code/ sin
+paquete (y algunos empiezan con un dígito), así que se importan agregando esa carpeta a
+sys.path, igual que al ejecutarlos desde ella.
+"""
+import importlib
+import os
+import sys
+
+import pytest
+
+CARPETA_CODIGO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if CARPETA_CODIGO not in sys.path:
+    sys.path.insert(0, CARPETA_CODIGO)
+
+
+@pytest.fixture(autouse=True)
+def cache_temporal(tmp_path_factory, monkeypatch):
+    """Las cachés del libro y de pyproj van a una carpeta temporal, no a la del usuario."""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path_factory.getbasetemp() / 'cache'))
+    monkeypatch.setenv('LOCALAPPDATA', str(tmp_path_factory.getbasetemp() / 'cache'))
+
+
+@pytest.fixture(scope='session')
+def filtrar_db():
+    return importlib.import_module('1_Filtrar_DB')
+
+
+@pytest.fixture(scope='session')
+def tabla_sintetica():
+    generar_libro_sintetico = importlib.import_module('generar_libro_sintetico')
+    return generar_libro_sintetico.generar_tabla(3000, semilla=7)
+
+
+@pytest.fixture(scope='session')
+def libro_sintetico(tmp_path_factory, tabla_sintetica):
+    """Libro de 3000 filas con la forma del Excel de la DGA (ver generar_libro_sintetico.py)."""
+    generar_libro_sintetico = importlib.import_module('generar_libro_sintetico')
+    ruta = tmp_path_factory.mktemp('libros') / 'Derechos_Concedidos.xlsx'
+    generar_libro_sintetico.escribir_libro(tabla_sintetica, str(ruta))
+    return str(ruta)
@@ -0,0 +1,88 @@
+import os
+import queue
+import shutil
+
+import pandas as pd
+import pytest
+
+
+def mensajes(log: queue.Queue) -> list[str]:
+    return [log.get() for _ in range(log.qsize())]
+
+
+@pytest.fixture
+def libro(tmp_path):
+    """Un archivo cualquiera hace de libro: la caché sólo mira su tamaño, fecha y contenido."""
+    ruta = tmp_path / 'libro.xlsx'
+    ruta.write_bytes(b'contenido original')
+    return str(ruta)
+
+
+@pytest.fixture
+def tabla():
+    return pd.DataFrame({'Comuna': ['Pica', 'Arica'], 'Caudal': [1.5, 2.0]})
+
+
+def test_acierto_con_el_mismo_libro(filtrar_db, libro, tabla):
+    log = queue.Queue()
+    filtrar_db.guardar_cache(libro, tabla, log)
+    pd.testing.assert_frame_equal(filtrar_db.leer_cache(libro, log), tabla)
+    assert any(m.startswith("⚡") for m in mensajes(log))
+
+
+def test_variantes_separadas(filtrar_db, libro, tabla):
+    filtrar_db.guardar_cache(libro, tabla, queue.Queue(), 'ligero')
+    assert filtrar_db.leer_cache(libro, queue.Queue()) is None
+    assert filtrar_db.leer_cache(libro, queue.Queue(), 'ligero') is not None
+
+
+def test_falla_si_cambia_el_tamano(filtrar_db, libro, tabla):
+    filtrar_db.guardar_cache(libro, tabla, queue.Queue())
+    with open(libro, 'ab') as f:
+        f.write(b' y algo mas')
+    assert filtrar_db.leer_cache(libro, queue.Queue()) is None
+
+
+def test_sin_cambios_de_contenido_la_fecha_no_invalida(filtrar_db, libro, tabla):
+    filtrar_db.guardar_cache(libro, tabla, queue.Queue())
+    stat = os.stat(libro)
+    os.utime(libro, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert filtrar_db.leer_cache(libro, queue.Queue()) is not None
+
+
+def test_falla_si_cambia_el_contenido_con_el_mismo_tamano(filtrar_db, libro, tabla):
+    filtrar_db.guardar_cache(libro, tabla, queue.Queue())
+    stat = os.stat(libro)
+    with open(libro, 'wb') as f:
+        f.write(b'contenido cambiado')
+    os.utime(libro, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert os.path.getsize(libro) == stat.st_size
+    assert filtrar_db.leer_cache(libro, queue.Queue()) is None
+
+
+def test_falla_si_cambia_la_version(filtrar_db, libro, tabla, monkeypatch):
+    filtrar_db.guardar_cache(libro, tabla, queue.Queue())
+    monkeypatch.setattr(filtrar_db, 'VERSION_CACHE', filtrar_db.VERSION_CACHE + 1)
+    assert filtrar_db.leer_cache(libro, queue.Queue()) is None
+
+
+def test_cache_corrupta_vuelve_al_libro(filtrar_db, libro_sintetico, tmp_path):
+    ruta = str(tmp_path / 'Derechos_Concedidos.xlsx')
+    shutil.copy(libro_sintetico, ruta)
+    esperado = filtrar_db.cargar_datos(ruta, queue.Queue())
+    ruta_meta, base_datos = filtrar_db._rutas_cache(ruta)
+    for extension in ('.parquet', '.pkl'):
+        if os.path.exists(base_datos + extension):
+            with open(base_datos + extension, 'wb') as f:
+                f.write(b'no es una tabla')
+
+    log = queue.Queue()
+    df = filtrar_db.cargar_datos(ruta, log)
+    registro = mensajes(log)
+    assert any("No se pudo leer la caché" in m for m in registro)
+    assert not any(m.startswith("⚡") for m in registro)
+    pd.testing.assert_frame_equal(df, esperado)
+    # La caché se vuelve a escribir y la lectura siguiente ya la usa.
+    log = queue.Queue()
+    pd.testing.assert_frame_equal(filtrar_db.cargar_datos(ruta, log), esperado)
+    assert any(m.startswith("⚡") for m in mensajes(log))
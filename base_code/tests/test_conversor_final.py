@@ -0,0 +1,121 @@
+import importlib
+import queue
+
+import numpy as np
+import pandas as pd
+import pytest
+
+conversor_final = importlib.import_module('4_Conversor_final')
+
+N = np.nan
+INVERSA = ('1969', '1956', '1984')
+
+
+def tabla(filas: list[tuple]) -> pd.DataFrame:
+    """Filas (Expediente, Norte, Este, Origen); 'Fila' identifica cada registro en el resultado."""
+    df = pd.DataFrame(filas, columns=['Expediente', 'Norte', 'Este', 'Origen'])
+    return df.assign(Fila=range(len(df)))
+
+
+# (filas, precedencia, filas que quedan)
+CASOS_DEDUPLICACION = {
+    'gana 1984 sobre 1956': ([('A', 1, 1, '1956'), ('A', 1, 1, '1984')], conversor_final.PRECEDENCIA_ORIGEN, [1]),
+    'gana 1956 sobre 1969': ([('A', 1, 1, '1969'), ('A', 1, 1, '1956')], conversor_final.PRECEDENCIA_ORIGEN, [1]),
+    'precedencia elegida': ([('A', 1, 1, '1984'), ('A', 1, 1, '1956'), ('A', 1, 1, '1969')], INVERSA, [2]),
+    'origen desconocido al final': ([('A', 1, 1, 'otro'), ('A', 1, 1, '1969')], conversor_final.PRECEDENCIA_ORIGEN, [1]),
+    'mismo origen, gana el que tiene coordenadas': (
+        [('A', N, 1, '1984'), ('A', 1, N, '1984'), ('A', 1, 1, '1984')], conversor_final.PRECEDENCIA_ORIGEN, [2]),
+    'mismo origen y coordenadas, gana el primero': (
+        [('A', 1, 1, '1956'), ('A', 2, 2, '1956')], conversor_final.PRECEDENCIA_ORIGEN, [0]),
+    'el origen pesa más que las coordenadas': (
+        [('A', 1, 1, '1956'), ('A', N, N, '1984')], conversor_final.PRECEDENCIA_ORIGEN, [1]),
+    'sin coordenadas en ninguno, gana el primero': (
+        [('A', N, N, '1984'), ('A', N, N, '1984')], conversor_final.PRECEDENCIA_ORIGEN, [0]),
+    'sin expediente se conservan todos': (
+        [(None, 1, 1, '1984'), ('', 1, 1, '1956'), ('  ', 1, 1, '1956')], conversor_final.PRECEDENCIA_ORIGEN, [0, 1, 2]),
+    'espacios alrededor del expediente': ([(' A', 1, 1, '1969'), ('A ', 1, 1, '1984')], conversor_final.PRECEDENCIA_ORIGEN, [1]),
+    'varios expedientes conservan su orden': (
+        [('B', 1, 1, '1956'), ('A', 1, 1, '1969'), ('B', 1, 1, '1984'), ('A', 1, 1, '1956'), ('C', 1, 1, '1969')],
+        conversor_final.PRECEDENCIA_ORIGEN, [2, 3, 4]),
+}
+
+
+@pytest.mark.parametrize('filas, precedencia, quedan', CASOS_DEDUPLICACION.values(), ids=CASOS_DEDUPLICACION.keys())
+def test_deduplicar_por_expediente(filas, precedencia, quedan):
+    df, _ = conversor_final.deduplicar_por_expediente(tabla(filas), queue.Queue(), precedencia=precedencia)
+    assert df['Fila'].tolist() == quedan
+    assert 'Origen' not in df.columns
+
+
+# (filas, filas del informe de conflictos)
+CASOS_CONFLICTOS = {
+    'coordenadas iguales': ([('A', 7000000, 400000, '1956'), ('A', 7000000, 400000, '1984')], []),
+    'dentro de la tolerancia': ([('A', 7000000, 400000, '1956'), ('A', 7000000.9, 399999.5, '1984')], []),
+    'norte distinto': (
+        [('A', 7000000, 400000, '1969'), ('A', 7000050, 400000, '1984'), ('A', 7000020, 400000, '1956')],
+        [('A', 3, '1984,1956,1969', '1984', 7000000, 7000050, 400000, 400000)]),
+    'este distinto, sin una coordenada': (
+        [('B', N, 400000, '1984'), ('B', 7000000, 400010, '1984')],
+        [('B', 2, '1984', '1984', 7000000, 7000000, 400000, 400010)]),
+    'sólo los expedientes en conflicto, en orden de aparición': (
+        [('C', 1, 1, '1969'), ('B', 1, 1, '1984'), ('C', 1, 9, '1956'), ('B', 1, 1, '1956'), ('A', 5, 1, '1984'), ('A', 1, 1, '1969')],
+        [('C', 2, '1956,1969', '1956', 1, 1, 1, 9), ('A', 2, '1984,1969', '1984', 1, 5, 1, 1)]),
+    'sin repetidos': ([('A', 1, 1, '1984'), ('B', 9, 9, '1956'), (None, 1, 1, '1984'), (None, 9, 9, '1984')], []),
+}
+
+
+@pytest.mark.parametrize('filas, esperado', CASOS_CONFLICTOS.values(), ids=CASOS_CONFLICTOS.keys())
+def test_informe_de_conflictos(filas, esperado):
+    _, df_conflictos = conversor_final.deduplicar_por_expediente(tabla(filas), queue.Queue())
+    assert list(df_conflictos.columns) == conversor_final.COLUMNAS_CONFLICTOS
+    assert list(df_conflictos.itertuples(index=False, name=None)) == esperado
+
+
+def test_guardar_conflictos(tmp_path):
+    ruta_salida = str(tmp_path / 'final.xlsx')
+    filas = CASOS_CONFLICTOS['sólo los expedientes en conflicto, en orden de aparición'][0]
+    _, df_conflictos = conversor_final.deduplicar_por_expediente(tabla(filas), queue.Queue())
+    conversor_final.guardar_conflictos(df_conflictos, ruta_salida, queue.Queue())
+
+    leido = pd.read_csv(conversor_final.ruta_conflictos(ruta_salida), sep=';', encoding='utf-8-sig')
+    assert list(leido.columns) == conversor_final.COLUMNAS_CONFLICTOS
+    assert leido['Expediente'].tolist() == ['C', 'A']
+    assert leido['Origenes'].tolist() == ['1956,1969', '1984,1969']
+
+
+@pytest.mark.parametrize('df_conflictos', [None, pd.DataFrame(columns=conversor_final.COLUMNAS_CONFLICTOS)])
+def test_sin_conflictos_no_se_escribe_informe(tmp_path, df_conflictos):
+    ruta_salida = str(tmp_path / 'final.xlsx')
+    conversor_final.guardar_conflictos(df_conflictos, ruta_salida, queue.Queue())
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize('n_filas, filas_por_hoja, hojas', [(10, 4, 3), (8, 4, 2), (3, 4, 1), (0, 4, 1)])
+def test_exportar_excel_streaming_reparte_en_hojas(tmp_path, monkeypatch, n_filas, filas_por_hoja, hojas):
+    import openpyxl
+
+    # Bloques de 3 filas en hojas de 4: cada hoja debe cortar su último bloque en el borde.
+    monkeypatch.setattr(conversor_final, 'FILAS_POR_BLOQUE_EXCEL', 3)
+    df = pd.DataFrame({
+        'Expediente': [f"ND-{i}" for i in range(n_filas)],
+        'Norte': [None if i == 5 else 7000000 + i for i in range(n_filas)],
+        'Este': [400000.5 + i for i in range(n_filas)],
+    })
+    ruta = str(tmp_path / 'final.xlsx')
+    log = queue.Queue()
+    assert conversor_final.exportar_excel_streaming(df, ruta, log, filas_por_hoja=filas_por_hoja) == hojas
+
+    libro = openpyxl.load_workbook(ruta, read_only=True)
+    assert libro.sheetnames == [f"Sheet{i + 1}" for i in range(hojas)]
+    filas = []
+    for hoja in libro.worksheets:
+        encabezado, *datos = hoja.iter_rows(values_only=True)
+        assert list(encabezado) == list(df.columns)
+        assert len(datos) <= filas_por_hoja
+        filas += datos
+    libro.close()
+    esperado = [tuple(None if pd.isna(v) else v for v in fila) for fila in df.itertuples(index=False, name=None)]
+    assert filas == esperado
+
+    progreso = [m['progreso_exportacion'] for m in (log.get() for _ in range(log.qsize())) if isinstance(m, dict)]
+    assert progreso == sorted(progreso) and (not n_filas or progreso[-1] == 100)
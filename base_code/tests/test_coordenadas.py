@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+NORTE, ESTE = 7, 6
+
+
+def referencia(valor_celda, digitos: int) -> str:
+    """
+    Versión escalar, celda a celda, que reemplazó estandarizar_coordenadas (la función
+    estandarizar_y_convertir_coord original, sin los avisos al registro).
+    """
+    if pd.isna(valor_celda) or str(valor_celda).strip() == '':
+        return ""
+    try:
+        numero = float(str(valor_celda).replace(',', '.'))
+    except (ValueError, TypeError):
+        return ""
+    if numero == 0:
+        return ""
+    numero_en_metros = numero
+    if numero != int(numero):
+        if len(str(int(numero))) <= 5:
+            numero_en_metros = numero * 1000
+    s_final = str(int(numero_en_metros))
+    if len(s_final) > digitos:
+        return s_final[:digitos]
+    return s_final.ljust(digitos, '0')
+
+
+CASOS = [
+    (7012345, NORTE), (345678, ESTE),
+    ('7012345,6', NORTE), ('345678,9', ESTE), (' 7012345 ', NORTE),   # coma decimal y espacios
+    (7012.3456, NORTE), ('345,678', ESTE), (345.6, ESTE), (12345.678, NORTE), (0.4, NORTE), (0.0004, NORTE),  # KM
+    (123456.7, NORTE),                                                  # parte entera de 6 dígitos: ya en metros
+    (70123456, NORTE), (3456789, ESTE), (1e16, NORTE),                  # se trunca
+    (701234, NORTE), (34567, ESTE), (7, ESTE),                          # se rellena con ceros
+    (-33.45, ESTE), (-70.5, ESTE), (-7012345, NORTE), ('-345678,2', ESTE),  # negativos
+    ('', NORTE), ('   ', ESTE), (None, NORTE), (np.nan, ESTE), ('S/I', NORTE), ('s/d', ESTE),
+    ('abc', NORTE), (0, NORTE), ('0', ESTE), ('0,0', NORTE),            # vacías o sin información
+]
+
+
+@pytest.mark.parametrize('valor, digitos', CASOS)
+def test_igual_a_la_version_escalar(filtrar_db, valor, digitos):
+    esperado = referencia(valor, digitos)
+    serie = pd.Series([valor], dtype=object)
+    texto, _ = filtrar_db.estandarizar_coordenadas(serie, digitos)
+    assert texto.iloc[0] == esperado
+    enteros, _ = filtrar_db.estandarizar_coordenadas(serie, digitos, como_entero=True)
+    if esperado == '':
+        assert enteros.iloc[0] is pd.NA
+    else:
+        assert enteros.iloc[0] == int(esperado)
+
+
+@pytest.mark.parametrize('digitos', [NORTE, ESTE])
+def test_columna_numerica_igual_a_la_version_escalar(filtrar_db, digitos):
+    numeros = [v for v, _ in CASOS if isinstance(v, (int, float)) or v is None]
+    serie = pd.Series(numeros, dtype=float)
+    texto, resumen = filtrar_db.estandarizar_coordenadas(serie, digitos)
+    assert texto.tolist() == [referencia(v, digitos) for v in serie]
+    assert resumen['invalidas'] == 0
+
+
+def test_resumen_de_km_e_invalidas(filtrar_db):
+    serie = pd.Series(['7012,345', 'S/I', '7012345', 'abc', '', 6500.1], dtype=object)
+    _, resumen = filtrar_db.estandarizar_coordenadas(serie, NORTE, n_muestra=1)
+    assert (resumen['km'], resumen['muestra_km']) == (2, ['7012,345'])
+    assert (resumen['invalidas'], resumen['muestra_invalidas']) == (2, ['S/I'])
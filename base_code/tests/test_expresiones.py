@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from expresiones import compilar_expresion, resolver_campo
+
+COLUMNAS = {
+    'caudal': np.array([0.5, 1.0, 5.0, 50.0, np.nan]),
+    'norte': np.array([7_100_000, 6_900_000, 7_200_000, 6_800_000, 7_000_001], dtype=float),
+    'fecha': np.array(['2010-05-01', '2015-01-01', '2020-12-31', 'NaT', '2014-12-31'], dtype='datetime64[ns]'),
+}
+
+
+def evaluar(texto: str) -> list[bool]:
+    return compilar_expresion(texto).evaluar(lambda campo, tipo: COLUMNAS[campo]).tolist()
+
+
+def test_comparaciones_encadenadas():
+    assert evaluar("1 <= caudal < 50") == [False, True, True, False, False]
+
+
+def test_y_tiene_precedencia_sobre_o():
+    # caudal < 1 o (caudal > 10 y norte > 7000000)
+    assert evaluar("caudal < 1 o caudal > 10 y norte > 7000000") == [True, False, False, False, False]
+    assert evaluar("(caudal < 1 o caudal > 10) y norte > 7000000") == [True, False, False, False, False]
+    assert evaluar("caudal < 1 o caudal > 1 y norte < 7000000") == [True, False, False, True, False]
+    assert evaluar("(caudal < 1 o caudal > 1) y norte < 7000000") == [False, False, False, True, False]
+
+
+def test_negacion_y_palabras_en_ingles():
+    assert evaluar("no caudal > 1") == [True, True, False, False, True]
+    assert evaluar("not (caudal > 1) and norte > 7000000") == [True, False, False, False, True]
+
+
+def test_pertenencia():
+    assert evaluar("caudal en [1, 50]") == [False, True, False, True, False]
+
+
+def test_fechas_y_valores_faltantes():
+    assert evaluar("fecha >= 2015-01-01") == [False, True, True, False, False]
+    # Como en pandas, una comparación con un faltante es falsa, salvo '!='.
+    assert evaluar("caudal != 1") == [True, False, True, True, True]
+
+
+def test_campos_en_orden_de_aparicion():
+    expresion = compilar_expresion('norte > 1 y "Caudal Anual Prom" < 2 o norte < 0')
+    assert expresion.campos == ('norte', 'Caudal Anual Prom')
+
+
+def test_compilacion_reutilizada():
+    assert compilar_expresion("caudal > 1") is compilar_expresion("caudal > 1")
+
+
+@pytest.mark.parametrize('texto, mensaje', [
+    ("", "vacía"),
+    ("caudal >", "incompleta"),
+    ("caudal 5", "Falta un comparador"),
+    ("(caudal > 5", r"Se esperaba '\)'"),
+    ("caudal > 5)", "Sobra"),
+    ("1 < 2", "al menos un campo"),
+    ("caudal en [1, 2015-01-01]", "mezclar"),
+    ("5 en [1, 2]", "después de un campo"),
+    ("caudal > 5 y", "incompleta"),
+    ("caudal ~ 5", "no válid"),
+])
+def test_errores(texto, mensaje):
+    with pytest.raises(ValueError, match=mensaje):
+        compilar_expresion(texto)
+
+
+def test_resolver_campo():
+    columnas = ['Caudal \nAnual\nProm', 'Fecha de Resolución']
+    alias = {'caudal': 'Caudal \nAnual\nProm'}
+    assert resolver_campo('caudal', alias, columnas) == 'Caudal \nAnual\nProm'
+    assert resolver_campo('caudal anual  PROM', alias, columnas) == 'Caudal \nAnual\nProm'
+    with pytest.raises(ValueError, match="no existe"):
+        resolver_campo('fecha', alias, columnas[:1])
@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from filtro_espacial import IndiceGrilla, leer_poligonos, puntos_en_poligono, validar_espacial
+
+
+def anillo(*vertices) -> np.ndarray:
+    return np.array(vertices + vertices[:1], dtype=float)
+
+
+CUADRADO = [anillo((0, 0), (10, 0), (10, 10), (0, 10))]
+CON_HUECO = CUADRADO + [anillo((3, 3), (7, 3), (7, 7), (3, 7))]
+
+
+def dentro(x, y, poligono) -> list[bool]:
+    return puntos_en_poligono(np.asarray(x, dtype=float), np.asarray(y, dtype=float), poligono).tolist()
+
+
+def test_hueco_queda_fuera():
+    assert dentro([1, 5, 8, 11, 5], [1, 5, 8, 5, -1], CON_HUECO) == [True, False, True, False, False]
+
+
+def test_anillo_abierto_o_cerrado_da_lo_mismo():
+    # El orden de los vértices (horario o antihorario) tampoco cambia el resultado.
+    invertido = [CON_HUECO[0][::-1], CON_HUECO[1]]
+    x, y = np.random.default_rng(0).uniform(-2, 12, (2, 2000))
+    assert dentro(x, y, invertido) == dentro(x, y, CON_HUECO)
+
+
+def test_bordes_semiabiertos():
+    # Los lados izquierdo e inferior cuentan como dentro; el derecho y el superior, fuera.
+    assert dentro([0, 10, 5, 5], [5, 5, 0, 10], CUADRADO) == [True, False, True, False]
+
+
+def test_borde_compartido_se_asigna_a_un_solo_poligono():
+    izquierdo = [anillo((0, 0), (5, 0), (5, 10), (0, 10))]
+    derecho = [anillo((5, 0), (10, 0), (10, 10), (5, 10))]
+    x = np.full(9, 5.0)
+    y = np.arange(1, 10, dtype=float)
+    en_izquierdo = puntos_en_poligono(x, y, izquierdo)
+    en_derecho = puntos_en_poligono(x, y, derecho)
+    assert (en_izquierdo ^ en_derecho).all()
+
+
+def test_vertices_y_lados_horizontales():
+    # Triángulo con un lado horizontal: los puntos a la altura de un vértice no se cuentan doble.
+    triangulo = [anillo((0, 0), (10, 0), (5, 10))]
+    assert dentro([5, 5, 1, 9, 5], [0, 5, 5, 5, 10], triangulo) == [True, True, False, False, False]
+
+
+@pytest.fixture(scope='module')
+def nube():
+    rng = np.random.default_rng(1)
+    return rng.uniform(300_000, 400_000, 20_000), rng.uniform(7_000_000, 7_100_000, 20_000)
+
+
+def test_indice_igual_a_fuerza_bruta(nube):
+    este, norte = nube
+    indice = IndiceGrilla(este, norte)
+    rectangulo = (320_000, 7_010_000, 350_500, 7_080_000)
+    esperado = (este >= rectangulo[0]) & (este <= rectangulo[2]) & (norte >= rectangulo[1]) & (norte <= rectangulo[3])
+    assert (indice.en_rectangulo(*rectangulo) == esperado).all()
+
+    centro, metros = (350_000, 7_050_000), 12_345
+    esperado = (este - centro[0]) ** 2 + (norte - centro[1]) ** 2 <= metros ** 2
+    assert (indice.en_radio(*centro, metros) == esperado).all()
+
+    poligono = [anillo((310_000, 7_005_000), (390_000, 7_020_000), (360_000, 7_095_000)),
+                anillo((340_000, 7_030_000), (360_000, 7_030_000), (350_000, 7_050_000))]
+    assert (indice.en_poligonos([poligono]) == puntos_en_poligono(este, norte, poligono)).all()
+
+
+def test_indice_ignora_coordenadas_vacias():
+    este = np.array([1.0, np.nan, 3.0])
+    norte = np.array([1.0, 2.0, np.nan])
+    assert IndiceGrilla(este, norte).en_rectangulo(0, 0, 5, 5).tolist() == [True, False, False]
+
+
+def test_leer_wkt_y_geojson_con_seleccion(tmp_path):
+    wkt = tmp_path / 'zona.wkt'
+    wkt.write_text("POLYGON ((0 0, 10 0, 10 10, 0 10, 0 0), (3 3, 7 3, 7 7, 3 7, 3 3))", encoding='utf-8')
+    [poligono] = leer_poligonos(str(wkt))
+    assert len(poligono) == 2
+
+    geojson = tmp_path / 'cuencas.geojson'
+    geojson.write_text('''{"type": "FeatureCollection", "crs": {"properties": {"name": "EPSG:32719"}}, "features": [
+        {"type": "Feature", "properties": {"NOM_CUENCA": "Rio Loa"},
+         "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [10, 0], [10, 10]]]}},
+        {"type": "Feature", "properties": {"NOM_CUENCA": "Rio Lluta"},
+         "geometry": {"type": "Polygon", "coordinates": [[[20, 0], [30, 0], [30, 10]]]}}]}''', encoding='utf-8')
+    assert len(leer_poligonos(str(geojson))) == 2
+    [loa] = leer_poligonos(str(geojson), 'nom_cuenca=rio loa')
+    assert loa[0][:, 0].max() == 10
+    with pytest.raises(ValueError):
+        validar_espacial({'poligono': str(geojson), 'seleccion': 'NOM_CUENCA=Inexistente'})
+
+
+@pytest.mark.parametrize('espacial', [
+    {'radio': [1, 2]},
+    {'radio': [1, 2, -5]},
+    {'rectangulo': [10, 0, 0, 10]},
+    {'rectangulo': ['a', 0, 1, 1]},
+])
+def test_validar_espacial(espacial):
+    with pytest.raises(ValueError):
+        validar_espacial(espacial)
@@ -0,0 +1,47 @@
+import os
+import queue
+
+import pytest
+
+import pipeline
+import servicio_consultas
+
+FILTROS = {'comuna': '', 'naturaleza': 'Subterranea', 'tipo_derecho': 'Consuntivo', 'caudal': '',
+           'expresion': '"Columna Inexistente" > 0', 'espacial': None}
+
+
+def mensajes(log: queue.Queue) -> list[str]:
+    return [log.get() for _ in range(log.qsize())]
+
+
+def test_filtrar_datos_falla_con_un_campo_inexistente(filtrar_db, tabla_sintetica):
+    log = queue.Queue()
+    assert filtrar_db.filtrar_datos(tabla_sintetica, FILTROS, log) is None
+    assert any(m.startswith("❌ ERROR: El campo 'Columna Inexistente' no existe") for m in mensajes(log))
+
+
+def test_filtrar_datos_sin_resultados_no_es_un_error(filtrar_db, tabla_sintetica):
+    df = filtrar_db.filtrar_datos(tabla_sintetica, dict(FILTROS, expresion='caudal < -1'), queue.Queue())
+    assert df is not None and df.empty
+
+
+@pytest.mark.parametrize('ligero', [False, True])
+def test_pipeline_falla_con_un_campo_inexistente(libro_sintetico, tmp_path, ligero):
+    ruta_salida = str(tmp_path / 'resultado.xlsx')
+    assert pipeline.ejecutar_pipeline(libro_sintetico, FILTROS, ruta_salida, queue.Queue(), ligero=ligero) is None
+    assert not os.path.exists(ruta_salida)
+
+
+def test_incremental_no_guarda_estado_con_un_campo_inexistente(libro_sintetico, tmp_path):
+    carpeta_estado = tmp_path / 'estado'
+    assert pipeline.ejecutar_incremental(libro_sintetico, FILTROS, None, str(carpeta_estado), queue.Queue()) is None
+    assert not carpeta_estado.exists() or not any(carpeta_estado.iterdir())
+
+
+def test_servicio_responde_error_con_un_campo_inexistente(libro_sintetico):
+    log = queue.Queue()
+    servicio = servicio_consultas.ServicioConsultas(libro_sintetico, log)
+    servicio.cargar()
+    with pytest.raises(ValueError, match="'Columna Inexistente' no existe"):
+        servicio.consultar(dict(FILTROS))
+    assert servicio.consultar(dict(FILTROS, expresion='caudal >= 0'))['total'] > 0
@@ -0,0 +1,88 @@
+import importlib
+import queue
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import incremental
+import pipeline
+
+generar_libro_sintetico = importlib.import_module('generar_libro_sintetico')
+
+FILTROS = {'comuna': '', 'naturaleza': 'Subterranea', 'tipo_derecho': 'Consuntivo', 'caudal': '>= 1',
+           'expresion': '', 'espacial': None}
+
+
+def ordenado(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.astype(str)
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def test_comparar_huellas():
+    anteriores = pd.Series([1, 2, 3], index=['a', 'b', 'c'], dtype='uint64')
+    actuales = pd.Series([1, 20, 4], index=['a', 'b', 'd'], dtype='uint64')
+    cambios = incremental.comparar_huellas(anteriores, actuales)
+    assert cambios['insertados'].tolist() == ['d']
+    assert cambios['actualizados'].tolist() == ['b']
+    assert cambios['eliminados'].tolist() == ['c']
+
+
+def test_huellas_no_dependen_del_orden(filtrar_db, tabla_sintetica):
+    df = tabla_sintetica.head(200)
+    claves = incremental.claves_registro(df)
+    invertida = df.iloc[::-1]
+    huellas = incremental.calcular_huellas(df, claves)
+    assert huellas.sort_index().equals(incremental.calcular_huellas(invertida, incremental.claves_registro(invertida)).sort_index())
+
+
+def test_aplicar_delta():
+    anterior = pd.DataFrame({'Expediente': ['a', 'b', 'c'], 'Norte': [1, 2, 3]})
+    delta = pd.DataFrame({'Expediente': ['b', 'd'], 'Norte': [20, 4]})
+    resultado = incremental.aplicar_delta(anterior, delta, pd.Index(['b', 'c', 'd']))
+    assert resultado.to_dict('list') == {'Expediente': ['a', 'b', 'd'], 'Norte': [1, 20, 4]}
+
+
+def modificar(tabla: pd.DataFrame) -> pd.DataFrame:
+    """Siguiente 'publicación': filas eliminadas, modificadas y agregadas."""
+    rng = np.random.default_rng(3)
+    tabla = tabla.drop(index=tabla.index[rng.choice(len(tabla), 150, replace=False)])
+    cambiadas = tabla.index[rng.choice(len(tabla), 200, replace=False)]
+    tabla.loc[cambiadas[:100], generar_libro_sintetico.filtrar_db.COL_CAUDAL] = 3.5
+    tabla.loc[cambiadas[100:], generar_libro_sintetico.filtrar_db.COL_NORTE] = 7_300_123
+    nuevas = generar_libro_sintetico.generar_tabla(300, semilla=99)
+    return pd.concat([tabla, nuevas], ignore_index=True)
+
+
+@pytest.mark.parametrize('ligero', [False, True])
+def test_incremental_igual_a_ejecucion_completa(tmp_path, tabla_sintetica, libro_sintetico, ligero):
+    log = queue.Queue()
+    estado = str(tmp_path / 'estado')
+    primera = pipeline.ejecutar_incremental(libro_sintetico, FILTROS, None, estado, log, usar_cache=False, ligero=ligero)
+    completa = pipeline.ejecutar_pipeline(libro_sintetico, FILTROS, None, log, usar_cache=False, ligero=ligero)
+    pd.testing.assert_frame_equal(ordenado(primera), ordenado(completa))
+
+    libro_nuevo = str(tmp_path / 'Derechos_Concedidos_2.xlsx')
+    generar_libro_sintetico.escribir_libro(modificar(tabla_sintetica), libro_nuevo)
+    log = queue.Queue()
+    segunda = pipeline.ejecutar_incremental(libro_nuevo, FILTROS, None, estado, log, usar_cache=False, ligero=ligero)
+    mensajes = [m for m in log.queue if isinstance(m, str)]
+    # Sólo se reprocesaron los registros que cambiaron, no el libro completo.
+    assert any(m.strip().startswith('- Insertados:') and 'actualizados: 0,' not in m for m in mensajes)
+    completa = pipeline.ejecutar_pipeline(libro_nuevo, FILTROS, None, log, usar_cache=False, ligero=ligero)
+    pd.testing.assert_frame_equal(ordenado(segunda), ordenado(completa))
+    assert len(segunda) != len(primera)
+
+
+@pytest.mark.parametrize('primero', [False, True])
+def test_cambiar_el_modo_ligero_procesa_todo_el_libro(tmp_path, libro_sintetico, primero):
+    estado = str(tmp_path / 'estado')
+    pipeline.ejecutar_incremental(libro_sintetico, FILTROS, None, estado, queue.Queue(), usar_cache=False, ligero=primero)
+    log = queue.Queue()
+    resultado = pipeline.ejecutar_incremental(libro_sintetico, FILTROS, None, estado, log, usar_cache=False, ligero=not primero)
+    mensajes = [m.strip() for m in log.queue if isinstance(m, str)]
+    assert any(m.startswith('- Los filtros o el modo de carga cambiaron') for m in mensajes)
+    # Todo cuenta como insertado (no como actualizado), igual que la primera ejecución.
+    assert any(m.startswith('- Insertados:') and m.endswith('actualizados: 0, eliminados: 0.') for m in mensajes)
+    completa = pipeline.ejecutar_pipeline(libro_sintetico, FILTROS, None, queue.Queue(), usar_cache=False, ligero=not primero)
+    pd.testing.assert_frame_equal(ordenado(resultado), ordenado(completa))
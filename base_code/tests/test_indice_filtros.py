@@ -0,0 +1,36 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+def lenta(funcion, llamadas: list):
+    """Envuelve una conversión para que tarde: sin candado, los hilos se cruzarían en ella."""
+    def envoltura(*args, **kwargs):
+        llamadas.append(args)
+        time.sleep(0.05)
+        return funcion(*args, **kwargs)
+    return envoltura
+
+
+@pytest.mark.parametrize('campo, tipo', [('norte', 'numero'), ('caudal', 'numero'), ('fecha', 'fecha')])
+def test_columnas_de_expresion_se_convierten_una_vez_entre_hilos(filtrar_db, tabla_sintetica, monkeypatch, campo, tipo):
+    llamadas = []
+    monkeypatch.setattr(filtrar_db, 'estandarizar_coordenadas', lenta(filtrar_db.estandarizar_coordenadas, llamadas))
+    monkeypatch.setattr(filtrar_db.pd, 'to_numeric', lenta(filtrar_db.pd.to_numeric, llamadas))
+    monkeypatch.setattr(filtrar_db.pd, 'to_datetime', lenta(filtrar_db.pd.to_datetime, llamadas))
+    # Llamadas de una sola conversión, hecha desde un hilo.
+    filtrar_db.IndiceFiltros(tabla_sintetica).columna_expresion(campo, tipo)
+    por_conversion = len(llamadas)
+    llamadas.clear()
+    indice = filtrar_db.IndiceFiltros(tabla_sintetica)
+
+    barrera = threading.Barrier(8)
+    def pedir(_):
+        barrera.wait()
+        return indice.columna_expresion(campo, tipo)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        resultados = list(pool.map(pedir, range(8)))
+    assert all(r is resultados[0] for r in resultados)
+    assert len(llamadas) == por_conversion
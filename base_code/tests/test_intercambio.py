@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from intercambio import formato_de_ruta, guardar_intermedio, leer_intermedio, nombre_archivo, tipar_intermedio
+
+INTERMEDIO = pd.DataFrame({
+    'Expediente': ['ND-0101-0000001/1', '00123/2', 'ND-0101-0000003/1'],
+    'Nombre Solicitante': ['Juan Pérez', None, 'Agrícola Ñuble Ltda.'],
+    'Norte': [7_123_456, None, 6_543_210],
+    'Este': [345_678, 400_000, None],
+    'Datum': ['1956', None, '1984'],
+})
+
+
+def normalizado(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Misma tabla con tipos comparables entre formatos. El CSV no conserva tipos: un Datum
+    sólo numérico vuelve como número (1956.0), así que se compara por su valor.
+    """
+    df = tipar_intermedio(df)
+    datum = pd.to_numeric(df['Datum'].astype(object), errors='coerce')
+    df['Datum'] = datum.astype('Int64')
+    return df
+
+
+@pytest.mark.parametrize('nombre, compresion', [
+    ('1956.csv', None), ('1956.csv.gz', None), ('1956.parquet', None), ('1956.parquet', 'zstd'),
+    ('1956.arrow', None), ('1956.arrow', 'zstd'), ('1956.feather', None),
+])
+def test_ida_y_vuelta(tmp_path, nombre, compresion):
+    if not nombre.endswith(('.csv', '.gz')):
+        pytest.importorskip('pyarrow')
+    ruta = str(tmp_path / nombre)
+    guardar_intermedio(INTERMEDIO, ruta, compresion=compresion)
+    leido = leer_intermedio(ruta)
+    # El Expediente se lee siempre como texto: no pierde ceros a la izquierda.
+    assert leido['Expediente'].astype(str).tolist() == INTERMEDIO['Expediente'].tolist()
+    pd.testing.assert_frame_equal(normalizado(leido), normalizado(INTERMEDIO), check_categorical=False)
+
+
+def test_csv_zstd(tmp_path):
+    pytest.importorskip('zstandard')
+    ruta = str(tmp_path / '1969.csv.zst')
+    guardar_intermedio(INTERMEDIO, ruta)
+    pd.testing.assert_frame_equal(normalizado(leer_intermedio(ruta)), normalizado(INTERMEDIO), check_categorical=False)
+
+
+def test_tipos_binarios(tmp_path):
+    pytest.importorskip('pyarrow')
+    ruta = str(tmp_path / '1984.parquet')
+    guardar_intermedio(INTERMEDIO, ruta)
+    leido = leer_intermedio(ruta, columnas=['Norte', 'Datum'])
+    assert list(leido.columns) == ['Norte', 'Datum']
+    assert leido['Norte'].dtype == 'Int32'
+    assert isinstance(leido['Datum'].dtype, pd.CategoricalDtype)
+
+
+def test_arrow_sin_compresion_zstd(tmp_path):
+    pytest.importorskip('pyarrow')
+    with pytest.raises(ValueError):
+        guardar_intermedio(INTERMEDIO, str(tmp_path / 'x.arrow'), compresion='gzip')
+
+
+def test_nombres_y_formatos():
+    assert nombre_archivo('1956', 'csv', 'gzip') == '1956.csv.gz'
+    assert nombre_archivo('1956', 'parquet', 'zstd') == '1956.parquet'
+    assert formato_de_ruta('A.FEATHER') == 'arrow'
+    assert formato_de_ruta('sin_extension') == 'csv'
+
+
+def test_coordenadas_redondeadas_a_entero():
+    df = tipar_intermedio(pd.DataFrame({'Norte': ['7123456.6', 'S/I'], 'Este': [np.nan, 345678.2]}))
+    assert df['Norte'].tolist() == [7123457, pd.NA]
+    assert df['Este'].tolist() == [pd.NA, 345678]
@@ -0,0 +1,49 @@
+import queue
+
+import pandas as pd
+import pytest
+
+import incremental
+import pipeline
+
+FILTROS = {'comuna': '', 'naturaleza': 'Subterranea', 'tipo_derecho': 'Consuntivo', 'caudal': '',
+           'expresion': '', 'espacial': None}
+
+
+def expedientes(df: pd.DataFrame) -> list[str]:
+    """Claves 'Expediente/N° Solicitud' de las filas, para comparar sin depender del orden."""
+    return sorted(incremental.claves_registro(df))
+
+
+@pytest.mark.parametrize('expresion', [
+    "fecha >= 2015-01-01 y caudal < 20",
+    '"Huso" = 19 y fecha < 2000-01-01',
+])
+def test_ligero_y_normal_dan_las_mismas_filas(filtrar_db, libro_sintetico, expresion):
+    filtros = dict(FILTROS, expresion=expresion)
+    extra = filtrar_db.columnas_de_expresiones([filtros])
+    log = queue.Queue()
+    normal = filtrar_db.filtrar_datos(filtrar_db.cargar_datos(libro_sintetico, log, usar_cache=False), filtros, log)
+    ligero = filtrar_db.filtrar_datos(
+        filtrar_db.cargar_datos(libro_sintetico, log, usar_cache=False, ligero=True, columnas_extra=extra), filtros, log)
+    streaming = filtrar_db.cargar_datos_filtrados(libro_sintetico, filtros, log)
+    assert len(normal) > 0
+    assert expedientes(ligero) == expedientes(normal) == expedientes(streaming)
+
+
+def test_ligero_conserva_la_fecha_en_la_cache(filtrar_db, libro_sintetico):
+    log = queue.Queue()
+    filtrar_db.cargar_datos(libro_sintetico, log, ligero=True)
+    desde_cache = filtrar_db.cargar_datos(libro_sintetico, log, ligero=True)
+    assert filtrar_db.COL_FECHA_RESOLUCION in desde_cache.columns
+    # Una columna extra usa otra entrada de la caché, no la tabla ligera sin ella.
+    con_huso = filtrar_db.cargar_datos(libro_sintetico, log, ligero=True, columnas_extra=('Huso',))
+    assert 'Huso' in con_huso.columns and 'Huso' not in desde_cache.columns
+
+
+def test_pipeline_ligero_igual_al_normal(libro_sintetico):
+    filtros = dict(FILTROS, expresion="fecha >= 2015-01-01 y caudal < 20")
+    log = queue.Queue()
+    normal = pipeline.ejecutar_pipeline(libro_sintetico, filtros, None, log, usar_cache=False)
+    ligero = pipeline.ejecutar_pipeline(libro_sintetico, filtros, None, log, usar_cache=False, ligero=True)
+    pd.testing.assert_frame_equal(ligero.astype(str), normal.astype(str))
@@ -0,0 +1,102 @@
+import tkinter as tk
+
+import registro
+
+
+def advertencia(i: int) -> str:
+    return f"   - ⚠️ Advertencia: No se pudo convertir la coordenada '{i}'. Se tratará como vacía."
+
+
+def textos(eventos) -> list[str]:
+    return [linea for tipo, msg in eventos if tipo == 'texto' for linea in msg.split('\n')]
+
+
+def test_agrupa_las_lineas_y_respeta_el_orden_de_los_controles():
+    canal = registro.CanalRegistro()
+    for msg in ("uno", "dos", {'progreso_exportacion': 50}, "tres", "FIN_CON_EXITO:3"):
+        canal.put(msg)
+    assert canal.drenar() == [
+        ('texto', "uno\ndos"), ('control', {'progreso_exportacion': 50}), ('texto', "tres"), ('control', "FIN_CON_EXITO:3"),
+    ]
+
+
+def test_una_sola_linea_de_resumen_por_tipo_al_terminar():
+    canal = registro.CanalRegistro()
+    lineas = []
+    # Una avalancha de advertencias que llega en varios ciclos de la interfaz.
+    for ciclo in range(4):
+        for i in range(10):
+            canal.put(advertencia(ciclo * 10 + i))
+        canal.put(f"❌ ERROR: fila {ciclo}")
+        lineas += textos(canal.drenar(max_mensajes=6))
+        lineas += textos(canal.drenar())
+    assert [l for l in lineas if 'similares' in l] == []
+    assert lineas[:registro.MAX_REPETICIONES_VISIBLES] == [advertencia(i) for i in range(registro.MAX_REPETICIONES_VISIBLES)]
+
+    canal.put("⚠️ Otra advertencia '1'")
+    canal.put("FIN_CON_EXITO:10")
+    lineas += textos(canal.drenar())
+    resumenes = [l for l in lineas if 'similares' in l]
+    assert len(resumenes) == 1
+    assert "35 advertencias similares más (total: 40)" in resumenes[0]
+    assert lineas[-1] == resumenes[0]
+    assert (canal.contadores['advertencia'], canal.contadores['error']) == (41, 4)
+
+    # Después del resumen, el mismo tipo sigue oculto y se vuelve a resumir al terminar.
+    canal.put(advertencia(99))
+    canal.put({'dataframe_final': None})
+    assert textos(canal.drenar()) == ["   ⚠️ ... 1 advertencias similares más (total: 41): " + registro._PATRON_VALORES.sub('#', advertencia(99)).strip()]
+
+
+def test_reiniciar_vuelve_a_mostrar_las_advertencias():
+    canal = registro.CanalRegistro()
+    for i in range(registro.MAX_REPETICIONES_VISIBLES + 3):
+        canal.put(advertencia(i))
+    canal.drenar()
+    canal.reiniciar()
+    canal.put(advertencia(0))
+    canal.put("FIN_SIN_DATOS")
+    assert textos(canal.drenar()) == [advertencia(0)]
+    assert canal.contadores['advertencia'] == 1
+
+
+class AreaFalsa:
+    """Lo mínimo de un ScrolledText para mostrar_en_registro, sin abrir una ventana."""
+
+    def __init__(self):
+        self.lineas: list[str] = []
+        self.estados: list[str] = []
+
+    def config(self, state):
+        self.estados.append(state)
+
+    def insert(self, indice, texto):
+        assert indice == tk.END
+        self.lineas += texto.split('\n')[:-1]
+
+    def index(self, indice):
+        # Como Tk: 'end-1c' queda en la línea vacía que sigue a la última línea escrita.
+        assert indice == 'end-1c'
+        return f"{len(self.lineas) + 1}.0"
+
+    def delete(self, desde, hasta):
+        assert desde == '1.0'
+        del self.lineas[:int(hasta.split('.')[0]) - 1]
+
+    def see(self, indice):
+        pass
+
+
+def test_mostrar_en_registro_conserva_las_ultimas_lineas():
+    area = AreaFalsa()
+    for bloque in range(5):
+        registro.mostrar_en_registro(area, '\n'.join(f"linea {bloque * 4 + i}" for i in range(4)), max_lineas=10)
+        assert len(area.lineas) <= 10
+    assert area.lineas == [f"linea {i}" for i in range(10, 20)]
+    assert area.estados[-1] == 'disabled'
+
+
+def test_mostrar_en_registro_bloque_mayor_que_el_limite():
+    area = AreaFalsa()
+    registro.mostrar_en_registro(area, '\n'.join(str(i) for i in range(25)), max_lineas=10)
+    assert area.lineas == [str(i) for i in range(15, 25)]
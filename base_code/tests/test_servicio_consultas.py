@@ -0,0 +1,114 @@
+import json
+import os
+import queue
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import servicio_consultas
+
+FILTROS = {'naturaleza': 'Subterranea', 'tipo_derecho': 'Consuntivo'}
+
+
+@pytest.fixture(scope='module')
+def servidor(tmp_path_factory, libro_sintetico):
+    """Un ServidorConsultas real en un puerto libre, compartido por las pruebas del módulo."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('XDG_CACHE_HOME', str(tmp_path_factory.getbasetemp() / 'cache'))
+        mp.setenv('LOCALAPPDATA', str(tmp_path_factory.getbasetemp() / 'cache'))
+        carpeta = tmp_path_factory.mktemp('exportaciones')
+        servicio = servicio_consultas.ServicioConsultas(libro_sintetico, queue.Queue(), carpeta_exportacion=str(carpeta))
+        srv = servicio_consultas.ServidorConsultas(('127.0.0.1', 0), servicio, hilos=2)
+        hilo = threading.Thread(target=srv.serve_forever, daemon=True)
+        hilo.start()
+        yield srv
+        srv.shutdown()
+        srv.server_close()
+        hilo.join()
+
+
+def pedir(servidor, metodo: str, ruta: str, datos: dict | None = None) -> tuple[int, dict]:
+    url = f"http://127.0.0.1:{servidor.server_address[1]}{ruta}"
+    cuerpo = json.dumps(datos).encode('utf-8') if datos is not None else None
+    peticion = urllib.request.Request(url, data=cuerpo, method=metodo, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(peticion, timeout=60) as respuesta:
+            return respuesta.status, json.loads(respuesta.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+PETICIONES = {
+    ('GET', '/estado'): None,
+    ('POST', '/consultar'): dict(FILTROS, limite=5),
+    ('POST', '/transformar'): {'datum': '1956', 'puntos': [[345678, 6325123]]},
+    ('POST', '/exportar'): dict(FILTROS, destino='rutas'),
+    ('POST', '/recargar'): {},
+}
+
+
+def test_cada_ruta_de_la_tabla_responde(servidor):
+    assert set(PETICIONES) == set(servicio_consultas.RUTAS)
+    for (metodo, ruta), datos in PETICIONES.items():
+        codigo, cuerpo = pedir(servidor, metodo, ruta, datos)
+        assert codigo == 200, (ruta, cuerpo)
+        assert 'tiempo_ms' in cuerpo
+    filas = len(servidor.servicio.tabla()[0])
+    assert pedir(servidor, 'GET', '/estado/')[1]['filas'] == filas
+    recarga = pedir(servidor, 'POST', '/recargar', {})[1]
+    assert (recarga['recargado'], recarga['filas']) == (False, filas)
+
+
+@pytest.mark.parametrize('metodo, ruta', [('GET', '/no-existe'), ('GET', '/consultar'), ('POST', '/estado')])
+def test_ruta_desconocida_responde_404(servidor, metodo, ruta):
+    codigo, cuerpo = pedir(servidor, metodo, ruta, {} if metodo == 'POST' else None)
+    assert codigo == 404
+    assert cuerpo['error'] == f"Ruta no encontrada: {metodo} {ruta}"
+
+
+@pytest.mark.parametrize('datos, mensaje', [
+    ({'naturaleza': 'Subterranea'}, "Debe indicar 'naturaleza' y 'tipo_derecho'"),
+    (dict(FILTROS, expresion='caudal >>= 1'), "La expresión no es válida"),
+    (dict(FILTROS, expresion='"Columna Inexistente" > 0'), "'Columna Inexistente' no existe"),
+    (dict(FILTROS, espacial='Pica'), "'espacial' debe ser un objeto"),
+    (dict(FILTROS, limite='muchos'), "'limite'"),
+])
+def test_filtros_invalidos_responden_400(servidor, datos, mensaje):
+    codigo, cuerpo = pedir(servidor, 'POST', '/consultar', datos)
+    assert codigo == 400
+    assert mensaje in cuerpo['error']
+
+
+@pytest.mark.parametrize('destino', ['../fuera', '../fuera.xlsx', 'a/../../fuera', '.', '/tmp/fuera.xlsx'])
+def test_exportar_no_escribe_fuera_de_la_carpeta(servidor, destino):
+    carpeta = servidor.servicio.carpeta_exportacion
+    antes = set(os.listdir(os.path.dirname(carpeta)))
+    codigo, cuerpo = pedir(servidor, 'POST', '/exportar', dict(FILTROS, destino=destino))
+    assert codigo == 400
+    assert "dentro de la carpeta de exportación" in cuerpo['error']
+    assert set(os.listdir(os.path.dirname(carpeta))) == antes
+
+
+def test_exportar_sin_carpeta_de_exportacion(servidor):
+    servicio = servidor.servicio
+    carpeta, servicio.carpeta_exportacion = servicio.carpeta_exportacion, None
+    try:
+        codigo, cuerpo = pedir(servidor, 'POST', '/exportar', dict(FILTROS, destino='pica'))
+    finally:
+        servicio.carpeta_exportacion = carpeta
+    assert codigo == 400
+    assert "--carpeta-exportacion" in cuerpo['error']
+
+
+@pytest.mark.filterwarnings('error')
+@pytest.mark.parametrize('destino', ['unificado.xlsx', 'por_datum'])
+def test_exportar_no_modifica_la_tabla_cargada(servidor, destino):
+    servicio = servidor.servicio
+    df, _, _ = servicio.tabla()
+    antes = df.copy()
+    resultado = servicio.exportar(dict(FILTROS, destino=destino))
+    assert resultado['filas'] > 0
+    assert servicio.tabla()[0] is df
+    assert df.equals(antes)
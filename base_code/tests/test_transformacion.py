@@ -0,0 +1,80 @@
+import queue
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import transformacion
+
+DATUMS = ['1956', 'PSAD 1956', 'sad 1969', 'WGS 1984', '1956/1984', '1984/1956', '1969 o 1984', '1956-1969', None, '', 'otro']
+ESPERADO = ['1956', '1956', '1969', '1984', '1956', '1956', '1969', '1956', None, None, None]
+
+
+@pytest.mark.parametrize('categorica', [False, True])
+def test_clasificar_datum_usa_la_precedencia(categorica):
+    serie = pd.Series(DATUMS, index=range(10, 10 + len(DATUMS)), dtype='category' if categorica else object)
+    datum = transformacion.clasificar_datum(serie)
+    assert list(datum.index) == list(serie.index)
+    assert list(datum.cat.categories) == list(transformacion.PRECEDENCIA_DATUM)
+    assert [None if pd.isna(d) else d for d in datum] == ESPERADO
+
+
+def test_exportacion_y_conversores_separan_igual(filtrar_db):
+    """Cada registro con Datum va a un solo archivo, el mismo que elige su conversor."""
+    n = len(DATUMS)
+    df = pd.DataFrame({
+        filtrar_db.COL_EXPEDIENTE: [f"ND-{i}" for i in range(n)], filtrar_db.COL_SOLICITUD: [str(i) for i in range(n)],
+        filtrar_db.COL_SOLICITANTE: 'X', filtrar_db.COL_NORTE: '7000000', filtrar_db.COL_ESTE: '400000',
+        filtrar_db.COL_DATUM: DATUMS,
+    })
+    grupos, _ = filtrar_db.agrupar_por_datum(filtrar_db.preparar_exportacion(df, queue.Queue()))
+    for datum_val, df_grupo in grupos.items():
+        esperados = [d for d, e in zip(DATUMS, ESPERADO) if e == datum_val]
+        assert df_grupo['Datum'].tolist() == esperados
+        assert transformacion.seleccionar_registros(df_grupo, datum_val)['Datum'].tolist() == esperados
+        for otro in set(grupos) - {datum_val}:
+            assert transformacion.seleccionar_registros(df_grupo, otro).empty
+
+
+def test_memoria_no_repite_pares_al_recargar_y_agregar(tmp_path):
+    crs = transformacion.CRS_POR_DATUM['1956']
+    pares = np.array([[400000.0, 7000000.0], [410000.0, 7010000.0], [400000.0, 7000000.0]])
+    resultados = np.array([[399800.0, 6999600.0], [409800.0, 7009600.0], [0.0, 0.0]])
+    memoria = transformacion.MemoriaTransformaciones(str(tmp_path))
+    memoria.agregar(pares, resultados, crs)
+    memoria.agregar(pares[:2], resultados[:2] + 1, crs)
+    memoria.guardar()
+
+    recargada = transformacion.MemoriaTransformaciones(str(tmp_path))
+    recargada.agregar(pares, resultados, crs)
+    encontrados, obtenidos = recargada.buscar(pares[::-1], crs)
+    assert encontrados.all()
+    # Cada par conserva el primer resultado guardado.
+    np.testing.assert_array_equal(obtenidos, resultados[[0, 1, 0]])
+    recargada.guardar()
+    with np.load(recargada._ruta((crs, transformacion.CRS_DESTINO))) as datos:
+        assert len(datos['tabla']) == 2
+
+
+def test_memoria_tolera_un_archivo_con_pares_repetidos(tmp_path):
+    crs = transformacion.CRS_POR_DATUM['1969']
+    memoria = transformacion.MemoriaTransformaciones(str(tmp_path))
+    with open(memoria._ruta((crs, transformacion.CRS_DESTINO)), 'wb') as f:
+        np.savez(f, tabla=np.array([[1.0, 2.0, 3.0, 4.0], [1.0, 2.0, 5.0, 6.0]]))
+    encontrados, obtenidos = memoria.buscar(np.array([[1.0, 2.0], [7.0, 8.0]]), crs)
+    assert encontrados.tolist() == [True, False]
+    np.testing.assert_array_equal(obtenidos[0], [3.0, 4.0])
+
+
+@pytest.mark.parametrize('datum_val', ['1956', '1969'])
+def test_transformacion_en_paralelo_igual_a_la_secuencial(datum_val):
+    crs = transformacion.CRS_POR_DATUM[datum_val]
+    rng = np.random.default_rng(3)
+    este, norte = rng.uniform(250000, 550000, 1001), rng.uniform(6300000, 8000000, 1001)
+    este[7] = np.nan
+    esperado = transformacion.transformar_arreglos(este.copy(), norte.copy(), crs)
+    # Con un umbral bajo, 1001 pares alcanzan para tres fragmentos en el pool de procesos.
+    obtenido = transformacion.transformar_arreglos_paralelo(este.copy(), norte.copy(), crs, n_procesos=3, min_filas_por_fragmento=200)
+    assert transformacion._pool is not None and transformacion._pool_procesos == 3
+    np.testing.assert_array_equal(obtenido[0], esperado[0])
+    np.testing.assert_array_equal(obtenido[1], esperado[1])
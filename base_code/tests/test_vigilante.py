@@ -0,0 +1,53 @@
+import json
+import queue
+
+import pytest
+
+import pipeline
+import vigilante
+
+PERFIL = {'nombre': 'base', 'naturaleza': 'Subterranea', 'tipo_derecho': 'Consuntivo', 'caudal': '>= 20'}
+PERFIL_INVALIDO = {'nombre': 'invalido', 'naturaleza': 'Subterranea', 'tipo_derecho': 'Consuntivo',
+                   'expresion': '"Columna Inexistente" > 0'}
+
+
+def escribir_perfiles(tmp_path, *perfiles) -> str:
+    ruta = tmp_path / 'perfiles.json'
+    ruta.write_text(json.dumps({'perfiles': list(perfiles)}), encoding='utf-8')
+    return str(ruta)
+
+
+def test_ejecutar_perfiles_informa_los_fallidos(libro_sintetico, tmp_path):
+    ruta_perfiles = escribir_perfiles(tmp_path, PERFIL, PERFIL_INVALIDO)
+    resultados = pipeline.ejecutar_perfiles(libro_sintetico, ruta_perfiles, str(tmp_path / 'salida'), queue.Queue(),
+                                            usar_cache=False, unificar=True)
+    assert resultados == {'base': 1, 'invalido': None}
+    assert pipeline.perfiles_fallidos(resultados) == ['invalido']
+
+
+@pytest.mark.parametrize('perfiles, registrado', [((PERFIL,), True), ((PERFIL, PERFIL_INVALIDO), False)])
+def test_procesar_registra_el_hash_solo_sin_perfiles_fallidos(libro_sintetico, tmp_path, perfiles, registrado):
+    v = vigilante.Vigilante(str(tmp_path), str(tmp_path / 'salida'), escribir_perfiles(tmp_path, *perfiles), queue.Queue())
+    v.procesar(libro_sintetico, 'huella')
+    assert ('huella' in v.procesados) == registrado
+    assert ('huella' in v._leer_estado()) == registrado
+
+
+def test_revisar_reintenta_un_libro_que_no_se_pudo_leer(tmp_path, monkeypatch):
+    carpeta = tmp_path / 'entrada'
+    carpeta.mkdir()
+    (carpeta / 'Derechos_Concedidos_2024.xlsx').write_bytes(b'libro')
+    v = vigilante.Vigilante(str(carpeta), str(tmp_path / 'salida'), escribir_perfiles(tmp_path, PERFIL), queue.Queue())
+    # Una cola que el hilo trabajador no atiende, para ver qué se encoló.
+    monkeypatch.setattr(v, '_cola', queue.Queue())
+
+    hash_contenido = vigilante.filtrar_db.hash_contenido
+    def falla(ruta):
+        raise PermissionError("el archivo está en uso")
+    monkeypatch.setattr(vigilante.filtrar_db, 'hash_contenido', falla)
+    assert v.revisar(sin_espera=True) == 0
+
+    monkeypatch.setattr(vigilante.filtrar_db, 'hash_contenido', hash_contenido)
+    assert v.revisar(sin_espera=True) == 1
+    assert v.revisar(sin_espera=True) == 0
+    assert v._cola.qsize() == 1
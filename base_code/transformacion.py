@@ -0,0 +1,368 @@
+"""
+Motor común de transformación de Datum para los convertidores y el pipeline.
+
+Los registros se agrupan por Datum (PSAD56, SAD69 o ya en WGS 84) y cada grupo se
+transforma en una sola llamada vectorizada. Los objetos pyproj.Transformer se crean una
+sola vez por proceso y se reutilizan desde un registro indexado por (origen, destino).
+pyproj se importa recién al crear el primer Transformer, para que las herramientas que
+usan este módulo abran su ventana sin esperarlo.
+"""
+import atexit
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURACIÓN DE SISTEMAS DE REFERENCIA (CRS) ---
+CRS_DESTINO = "EPSG:32719"  # WGS 84 / UTM zone 19S
+CRS_POR_DATUM = {
+    '1956': "EPSG:24879",  # PSAD56 / UTM zone 19S
+    '1969': "EPSG:24819",  # SAD69 / UTM zone 19S
+}
+DATUM_WGS84 = '1984'
+# Orden en que se entregan los grupos: el mismo del reporte unificado (1984, 1956, 1969).
+ORDEN_DATUM = (DATUM_WGS84, '1956', '1969')
+# Si el texto del Datum nombra más de uno (ej. '1956/1984'), gana el primero de esta lista.
+PRECEDENCIA_DATUM = ('1956', '1969', DATUM_WGS84)
+# Filas por bloque en el modo de procesamiento por bloques.
+TAMANO_BLOQUE = 50_000
+# Por debajo de este tamaño de fragmento no compensa repartir el trabajo entre procesos.
+# pyproj proyecta del orden de un millón de puntos por segundo por núcleo, así que un
+# fragmento de 10.000 pares (ya únicos, ver transformar_pares_unicos) tarda unos 10 ms,
+# bastante más que enviarlo a un trabajador del pool ya creado.
+MIN_FILAS_POR_FRAGMENTO = 10_000
+
+_transformers: dict[tuple[str, str], 'pyproj.Transformer'] = {}
+_lock_transformers = threading.Lock()
+_pool: ProcessPoolExecutor | None = None
+_pool_procesos = 0
+_lock_pool = threading.Lock()
+
+
+def obtener_transformer(crs_origen: str, crs_destino: str = CRS_DESTINO) -> 'pyproj.Transformer':
+    """
+    Devuelve el Transformer para (crs_origen, crs_destino), creándolo sólo la primera vez.
+    Desde pyproj 3.1 un Transformer puede usarse desde varios hilos.
+    """
+    clave = (crs_origen, crs_destino)
+    transformer = _transformers.get(clave)
+    if transformer is None:
+        with _lock_transformers:
+            transformer = _transformers.get(clave)
+            if transformer is None:
+                import pyproj
+                transformer = pyproj.Transformer.from_crs(pyproj.CRS(crs_origen), pyproj.CRS(crs_destino), always_xy=True)
+                _transformers[clave] = transformer
+    return transformer
+
+
+def clasificar_datum(serie: pd.Series) -> pd.Series:
+    """
+    Asigna a cada registro '1956', '1969' o '1984' según el texto de su Datum, como
+    categoría; si nombra más de uno, según PRECEDENCIA_DATUM. Los registros sin Datum
+    reconocible quedan como NaN. Es la única regla para separar los registros por Datum:
+    la usan la exportación de 1_Filtrar_DB, los conversores y el pipeline.
+    Cada texto distinto se clasifica una sola vez.
+    """
+    codigos, valores = pd.factorize(serie)
+    texto = pd.Series(valores, dtype=object).astype(str)
+    condiciones = [texto.str.contains(datum_val, case=False, regex=False).to_numpy() for datum_val in PRECEDENCIA_DATUM]
+    # El código -1 (sin valor) toma la última posición, que queda sin Datum.
+    clases = np.append(np.select(condiciones, range(len(PRECEDENCIA_DATUM)), default=-1), -1)
+    return pd.Series(pd.Categorical.from_codes(clases[codigos], categories=list(PRECEDENCIA_DATUM)), index=serie.index)
+
+
+def seleccionar_registros(df: pd.DataFrame, datum_val: str) -> pd.DataFrame:
+    """
+    Devuelve los registros cuyo Datum se clasifica como datum_val (ver clasificar_datum).
+    """
+    return df[(clasificar_datum(df['Datum']) == datum_val).to_numpy()]
+
+
+def transformar_arreglos(este: np.ndarray, norte: np.ndarray, crs_origen: str, crs_destino: str = CRS_DESTINO) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Transforma arreglos de coordenadas en una sola llamada. Los resultados infinitos
+    (puntos fuera del dominio de la proyección) se devuelven como NaN.
+    """
+    este_transformado, norte_transformado = obtener_transformer(crs_origen, crs_destino).transform(este, norte)
+    este_transformado = np.asarray(este_transformado, dtype=float)
+    norte_transformado = np.asarray(norte_transformado, dtype=float)
+    este_transformado[np.isinf(este_transformado)] = np.nan
+    norte_transformado[np.isinf(norte_transformado)] = np.nan
+    return este_transformado, norte_transformado
+
+
+def _transformar_fragmento(nombre_memoria: str, n_filas: int, inicio: int, fin: int, crs_origen: str, crs_destino: str):
+    """
+    Tarea de cada proceso trabajador: transforma en el lugar las filas [inicio, fin) de los
+    arreglos Este/Norte alojados en memoria compartida. El Transformer queda en el registro
+    del proceso, así cada trabajador lo crea una sola vez.
+    """
+    memoria = shared_memory.SharedMemory(name=nombre_memoria)
+    try:
+        coords = np.ndarray((2, n_filas), dtype=np.float64, buffer=memoria.buf)
+        este, norte = coords[0, inicio:fin], coords[1, inicio:fin]
+        obtener_transformer(crs_origen, crs_destino).transform(este, norte, inplace=True)
+        este[np.isinf(este)] = np.nan
+        norte[np.isinf(norte)] = np.nan
+        del coords, este, norte
+    finally:
+        memoria.close()
+
+
+def _obtener_pool(n_procesos: int) -> ProcessPoolExecutor:
+    """
+    Devuelve el pool de procesos compartido, recreándolo sólo si cambia la cantidad de
+    procesos. Mantenerlo vivo conserva los Transformer ya creados en cada trabajador.
+    """
+    global _pool, _pool_procesos
+    with _lock_pool:
+        if _pool is None or _pool_procesos != n_procesos:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = ProcessPoolExecutor(max_workers=n_procesos)
+            _pool_procesos = n_procesos
+        return _pool
+
+
+@atexit.register
+def _cerrar_pool():
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+
+
+def transformar_arreglos_paralelo(este: np.ndarray, norte: np.ndarray, crs_origen: str, crs_destino: str = CRS_DESTINO,
+                                  n_procesos: int | None = None,
+                                  min_filas_por_fragmento: int = MIN_FILAS_POR_FRAGMENTO) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Igual que transformar_arreglos, pero reparte las coordenadas en fragmentos que se
+    transforman en paralelo en un ProcessPoolExecutor. Los arreglos se pasan por memoria
+    compartida (sin serializarlos) y el resultado conserva el orden original. Si no
+    alcanzan para dos fragmentos de min_filas_por_fragmento, o hay un solo núcleo, se usa
+    directamente la versión secuencial.
+    """
+    n_filas = len(este)
+    n_procesos = n_procesos or os.cpu_count() or 1
+    n_fragmentos = min(n_procesos, n_filas // max(min_filas_por_fragmento, 1))
+    if n_fragmentos < 2:
+        return transformar_arreglos(este, norte, crs_origen, crs_destino)
+
+    memoria = shared_memory.SharedMemory(create=True, size=2 * n_filas * np.dtype(np.float64).itemsize)
+    try:
+        coords = np.ndarray((2, n_filas), dtype=np.float64, buffer=memoria.buf)
+        coords[0] = este
+        coords[1] = norte
+        limites = np.linspace(0, n_filas, n_fragmentos + 1, dtype=np.int64)
+        pool = _obtener_pool(n_procesos)
+        tareas = [
+            pool.submit(_transformar_fragmento, memoria.name, n_filas, int(inicio), int(fin), crs_origen, crs_destino)
+            for inicio, fin in zip(limites[:-1], limites[1:])
+        ]
+        for tarea in tareas:
+            tarea.result()
+        este_transformado, norte_transformado = coords[0].copy(), coords[1].copy()
+        del coords
+    finally:
+        memoria.close()
+        memoria.unlink()
+    return este_transformado, norte_transformado
+
+
+class MemoriaTransformaciones:
+    """
+    Memoria en disco de pares de coordenadas ya transformados, para no volver a proyectar
+    entre ejecuciones los puntos que se repiten. Se guarda un archivo .npz por cada par
+    (CRS origen, CRS destino) dentro de la carpeta indicada.
+    """
+    def __init__(self, carpeta: str):
+        self.carpeta = carpeta
+        self._tablas: dict[tuple[str, str], np.ndarray] = {}
+        self._modificadas: set[tuple[str, str]] = set()
+        self._lock = threading.Lock()
+
+    def _ruta(self, clave: tuple[str, str]) -> str:
+        return os.path.join(self.carpeta, f"{clave[0]}__{clave[1]}.npz".replace(':', '_'))
+
+    def _tabla(self, clave: tuple[str, str]) -> np.ndarray:
+        """Tabla (n, 4) con columnas este/norte de origen y este/norte transformados."""
+        if clave not in self._tablas:
+            try:
+                with np.load(self._ruta(clave)) as datos:
+                    self._tablas[clave] = datos['tabla']
+            except (OSError, KeyError, ValueError):
+                self._tablas[clave] = np.empty((0, 4), dtype=np.float64)
+        return self._tablas[clave]
+
+    def buscar(self, pares: np.ndarray, crs_origen: str, crs_destino: str = CRS_DESTINO) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Busca pares (n, 2) de coordenadas de origen. Devuelve una máscara de los pares
+        encontrados y un arreglo (n, 2) con sus resultados (NaN en los no encontrados).
+        """
+        with self._lock:
+            tabla = self._tabla((crs_origen, crs_destino))
+        resultados = np.full(pares.shape, np.nan)
+        if len(tabla) == 0 or len(pares) == 0:
+            return np.zeros(len(pares), dtype=bool), resultados
+        indice = pd.MultiIndex.from_arrays([tabla[:, 0], tabla[:, 1]])
+        if not indice.is_unique:
+            # Memorias guardadas antes de que agregar descartara los pares repetidos.
+            unicos = ~indice.duplicated()
+            tabla, indice = tabla[unicos], indice[unicos]
+        posiciones = indice.get_indexer(pd.MultiIndex.from_arrays([pares[:, 0], pares[:, 1]]))
+        encontrados = posiciones >= 0
+        resultados[encontrados] = tabla[posiciones[encontrados], 2:]
+        return encontrados, resultados
+
+    def agregar(self, pares: np.ndarray, resultados: np.ndarray, crs_origen: str, crs_destino: str = CRS_DESTINO):
+        """
+        Agrega pares (n, 2) con sus resultados. Los pares que ya están en la tabla (por
+        ejemplo, si dos hilos transformaron el mismo punto) conservan su primer resultado.
+        """
+        if len(pares) == 0:
+            return
+        clave = (crs_origen, crs_destino)
+        with self._lock:
+            tabla = np.vstack([self._tabla(clave), np.hstack([pares, resultados])])
+            repetidos = pd.MultiIndex.from_arrays([tabla[:, 0], tabla[:, 1]]).duplicated()
+            self._tablas[clave] = tabla[~repetidos]
+            self._modificadas.add(clave)
+
+    def guardar(self):
+        """Escribe en disco las tablas con pares nuevos (escritura atómica)."""
+        with self._lock:
+            os.makedirs(self.carpeta, exist_ok=True)
+            for clave in self._modificadas:
+                ruta = self._ruta(clave)
+                with open(ruta + '.tmp', 'wb') as f:
+                    np.savez(f, tabla=self._tablas[clave])
+                os.replace(ruta + '.tmp', ruta)
+            self._modificadas.clear()
+
+
+def transformar_pares_unicos(este: np.ndarray, norte: np.ndarray, crs_origen: str, crs_destino: str = CRS_DESTINO,
+                             paralelo: bool = False, memoria: MemoriaTransformaciones | None = None) -> tuple[np.ndarray, np.ndarray, dict]:
+    """
+    Transforma sólo los pares (Este, Norte) distintos y reparte los resultados a todas las
+    filas. Muchos registros comparten el mismo punto de captación, por lo que el número de
+    proyecciones baja a la cantidad de puntos únicos. Si se entrega una memoria, los pares
+    ya conocidos se toman de ella y los nuevos se agregan. Devuelve también un resumen
+    con el número de pares únicos y de pares obtenidos desde la memoria.
+    """
+    pares, inverso = np.unique(np.column_stack((este, norte)), axis=0, return_inverse=True)
+    inverso = inverso.reshape(-1)
+
+    if memoria is not None:
+        encontrados, resultados = memoria.buscar(pares, crs_origen, crs_destino)
+    else:
+        encontrados, resultados = np.zeros(len(pares), dtype=bool), np.full(pares.shape, np.nan)
+
+    pendientes = pares[~encontrados]
+    if len(pendientes):
+        transformar = transformar_arreglos_paralelo if paralelo else transformar_arreglos
+        este_nuevo, norte_nuevo = transformar(pendientes[:, 0].copy(), pendientes[:, 1].copy(), crs_origen, crs_destino)
+        resultados[~encontrados] = np.column_stack((este_nuevo, norte_nuevo))
+        if memoria is not None:
+            memoria.agregar(pendientes, resultados[~encontrados], crs_origen, crs_destino)
+
+    resumen = {'unicos': len(pares), 'desde_memoria': int(encontrados.sum())}
+    return resultados[inverso, 0], resultados[inverso, 1], resumen
+
+
+def limpiar_coordenadas(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Asegura que las coordenadas son numéricas y elimina filas inválidas o con ceros.
+    """
+    df = df.copy()
+    df['Norte'] = pd.to_numeric(df['Norte'], errors='coerce')
+    df['Este'] = pd.to_numeric(df['Este'], errors='coerce')
+    df.dropna(subset=['Norte', 'Este'], inplace=True)
+    return df[(df['Norte'] != 0) & (df['Este'] != 0)]
+
+
+def transformar_datum(df: pd.DataFrame, datum_val: str, log_queue: queue.Queue | None, paralelo: bool = False,
+                      memoria: MemoriaTransformaciones | None = None) -> pd.DataFrame:
+    """
+    Transforma a WGS 84 las coordenadas de registros que están todos en el Datum datum_val.
+    Descarta filas con coordenadas inválidas, en cero o que no se pudieron transformar.
+    Sólo se proyectan los pares de coordenadas distintos (ver transformar_pares_unicos).
+    Con paralelo=True la transformación se reparte entre los núcleos disponibles.
+    """
+    crs_origen = CRS_POR_DATUM[datum_val]
+    df = limpiar_coordenadas(df)
+
+    if log_queue is not None:
+        log_queue.put(f"   - Transformando {len(df)} registros desde {crs_origen}...")
+    este, norte, resumen = transformar_pares_unicos(
+        df['Este'].to_numpy(dtype=float), df['Norte'].to_numpy(dtype=float), crs_origen, paralelo=paralelo, memoria=memoria
+    )
+    if log_queue is not None and len(df):
+        log_queue.put(f"   - Puntos distintos: {resumen['unicos']} ({resumen['desde_memoria']} ya conocidos de ejecuciones anteriores).")
+
+    df['Este'] = este
+    df['Norte'] = norte
+    df = df.dropna(subset=['Norte', 'Este'])
+
+    df['Norte'] = df['Norte'].round(0).astype(np.int64)
+    df['Este'] = df['Este'].round(0).astype(np.int64)
+    df['Datum'] = 'WGS 84'
+    return df
+
+
+def transformar_multidatum(df: pd.DataFrame, log_queue: queue.Queue, paralelo: bool = False,
+                           memoria: MemoriaTransformaciones | None = None, columna_origen: str | None = None) -> pd.DataFrame:
+    """
+    Transforma un DataFrame con registros de distintos Datum en una sola pasada.
+    Los registros PSAD56 y SAD69 se convierten a WGS 84 (un llamado vectorizado por grupo);
+    los que ya están en WGS 84 pasan sin cambios y los que no tienen Datum se descartan.
+    Los grupos se entregan en ORDEN_DATUM, conservando el orden original dentro de cada uno.
+    Con columna_origen, cada registro indica en esa columna el Datum del que proviene.
+    """
+    datum = clasificar_datum(df['Datum'])
+    n_sin_datum = int(datum.isna().sum())
+    if n_sin_datum:
+        log_queue.put(f"   - Se omitieron {n_sin_datum} registros sin Datum reconocible.")
+
+    grupos = []
+    for datum_val in ORDEN_DATUM:
+        df_grupo = df[datum == datum_val]
+        if df_grupo.empty:
+            continue
+        if datum_val == DATUM_WGS84:
+            log_queue.put(f"   - {len(df_grupo)} registros ya están en WGS 84.")
+            grupos.append(df_grupo.assign(**{columna_origen: datum_val}) if columna_origen else df_grupo)
+            continue
+        df_convertido = transformar_datum(df_grupo, datum_val, log_queue, paralelo=paralelo, memoria=memoria)
+        log_queue.put(f"   - ✅ Datum {datum_val}: se transformaron {len(df_convertido)} de {len(df_grupo)} registros.")
+        grupos.append(df_convertido.assign(**{columna_origen: datum_val}) if columna_origen else df_convertido)
+
+    if not grupos:
+        return df.iloc[0:0]
+    return pd.concat(grupos, ignore_index=True)
+
+
+def transformar_csv_por_bloques(ruta_entrada: str, ruta_salida: str, datum_val: str, log_queue: queue.Queue,
+                                tamano_bloque: int = TAMANO_BLOQUE, paralelo: bool = False,
+                                memoria: MemoriaTransformaciones | None = None) -> tuple[int, int]:
+    """
+    Transforma un CSV separado por ';' leyendo y escribiendo de a tamano_bloque filas, de
+    modo que la memoria usada no depende del tamaño del archivo. Cada bloque se agrega al
+    archivo de salida apenas se transforma. Devuelve (registros con el Datum pedido,
+    registros transformados y escritos). Si no se escribe ningún registro, no se crea la salida.
+    """
+    total_seleccionados = 0
+    total_escritos = 0
+    with pd.read_csv(ruta_entrada, sep=';', dtype={'Expediente': str}, chunksize=tamano_bloque) as lector:
+        for n_bloque, bloque in enumerate(lector, start=1):
+            df = seleccionar_registros(bloque, datum_val)
+            total_seleccionados += len(df)
+            if not df.empty:
+                df = transformar_datum(df, datum_val, None, paralelo=paralelo, memoria=memoria)
+            if not df.empty:
+                df.to_csv(ruta_salida, index=False, sep=';', mode='w' if total_escritos == 0 else 'a', header=total_escritos == 0)
+                total_escritos += len(df)
+            log_queue.put(f"   - Bloque {n_bloque}: {len(bloque)} filas leídas, {len(df)} transformadas (total escrito: {total_escritos}).")
+    return total_seleccionados, total_escritos
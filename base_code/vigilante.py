@@ -0,0 +1,235 @@
+"""
+Vigilancia de una carpeta: cuando llega (o cambia) un libro Derechos_Concedidos_*.xlsx,
+ejecuta sin interfaz todo el flujo para una lista de perfiles de filtro:
+carga -> filtros de cada perfil -> coordenadas -> transformación de Datum -> reporte unificado.
+
+La carpeta se revisa cada cierto intervalo (sin dependencias del sistema operativo). Un
+libro se procesa recién cuando su tamaño y fecha de modificación no cambian durante el
+tiempo de espera, para no leer un archivo que todavía se está copiando. Los libros
+listos pasan a una cola que se atiende de a uno. El hash del contenido de cada libro
+procesado queda en 'vigilante_estado.json' (en la carpeta de salida): un libro con el
+mismo contenido, aunque tenga otro nombre, no se vuelve a procesar.
+
+Los resultados de cada libro quedan en una subcarpeta con su nombre: '<perfil>.xlsx' por
+perfil (ver pipeline.ejecutar_perfiles con unificar).
+
+Uso:
+    python vigilante.py carpeta_entrada carpeta_salida --perfiles perfiles.json
+    python vigilante.py carpeta_entrada carpeta_salida --perfiles perfiles.json --una-vez
+"""
+import argparse
+import fnmatch
+import importlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+import pipeline
+
+filtrar_db = importlib.import_module('1_Filtrar_DB')
+
+PATRON_LIBROS = 'Derechos_Concedidos_*.xlsx'
+INTERVALO_REVISION = 30   # Segundos entre revisiones de la carpeta.
+ESPERA_ESTABLE = 60       # Segundos sin cambios antes de considerar completo un libro.
+ARCHIVO_ESTADO = 'vigilante_estado.json'
+
+
+class Vigilante:
+    """
+    Revisa la carpeta, decide qué libros están listos y los procesa en un hilo aparte, de
+    a uno. revisar() se puede llamar desde un bucle (ejecutar) o directamente.
+    """
+
+    def __init__(self, carpeta: str, carpeta_salida: str, ruta_perfiles: str, log_queue,
+                 patron: str = PATRON_LIBROS, espera: float = ESPERA_ESTABLE, ligero: bool = False,
+                 max_hilos: int | None = None):
+        self.carpeta = os.path.abspath(carpeta)
+        self.carpeta_salida = os.path.abspath(carpeta_salida)
+        self.ruta_perfiles = os.path.abspath(ruta_perfiles)
+        self.log_queue = log_queue
+        self.patron = patron
+        self.espera = espera
+        self.ligero = ligero
+        self.max_hilos = max_hilos
+        self.ruta_estado = os.path.join(self.carpeta_salida, ARCHIVO_ESTADO)
+        self.procesados = self._leer_estado()
+        # ruta -> (firma, momento en que se vio esa firma por primera vez)
+        self._vistos: dict[str, tuple[tuple[int, int], float]] = {}
+        # ruta -> firma ya encolada o descartada; no se vuelve a mirar hasta que cambie.
+        self._revisados: dict[str, tuple[int, int]] = {}
+        self._en_cola: set[str] = set()
+        self._cola: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._trabajador = threading.Thread(target=self._atender_cola, daemon=True)
+        self._trabajador.start()
+
+    # --- ESTADO ---
+    def _leer_estado(self) -> dict:
+        try:
+            with open(self.ruta_estado, encoding='utf-8') as f:
+                return json.load(f).get('procesados', {})
+        except (OSError, ValueError):
+            return {}
+
+    def _guardar_estado(self):
+        os.makedirs(self.carpeta_salida, exist_ok=True)
+        temporal = self.ruta_estado + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({'procesados': self.procesados}, f, ensure_ascii=False, indent=1)
+        os.replace(temporal, self.ruta_estado)
+
+    # --- REVISIÓN DE LA CARPETA ---
+    def _libros(self) -> list[str]:
+        try:
+            nombres = os.listdir(self.carpeta)
+        except OSError as e:
+            self.log_queue.put(f"❌ ERROR: No se puede leer la carpeta '{self.carpeta}': {e}")
+            return []
+        # '~$...' son los archivos de bloqueo de Excel mientras el libro está abierto.
+        return sorted(os.path.join(self.carpeta, n) for n in nombres
+                      if fnmatch.fnmatch(n.lower(), self.patron.lower()) and not n.startswith('~$'))
+
+    def revisar(self, ahora: float | None = None, sin_espera: bool = False) -> int:
+        """
+        Revisa la carpeta una vez y encola los libros que ya no cambian. Con sin_espera, los
+        libros se encolan aunque no haya pasado el tiempo de espera. Devuelve cuántos se encolaron.
+        """
+        ahora = time.monotonic() if ahora is None else ahora
+        encolados = 0
+        for ruta in self._libros():
+            try:
+                info = os.stat(ruta)
+            except OSError:
+                continue
+            firma = (info.st_mtime_ns, info.st_size)
+            if self._revisados.get(ruta) == firma:
+                continue
+            anterior = self._vistos.get(ruta)
+            if anterior is None or anterior[0] != firma:
+                self._vistos[ruta] = (firma, ahora)
+                if not sin_espera:
+                    continue
+            elif not sin_espera and ahora - anterior[1] < self.espera:
+                continue
+            try:
+                encolados += self._encolar(ruta)
+            except OSError as e:
+                # Sin marcarlo como revisado: se vuelve a intentar en la próxima revisión.
+                self.log_queue.put(f"   - ⚠️ Advertencia: No se pudo leer '{os.path.basename(ruta)}' ({e}).")
+                continue
+            self._revisados[ruta] = firma
+        return encolados
+
+    def _encolar(self, ruta: str) -> int:
+        """
+        Encola el libro si su contenido no se procesó antes. Devuelve 1 si se encoló y 0 si
+        se descartó por repetido; lanza OSError si no se pudo leer.
+        """
+        huella = filtrar_db.hash_contenido(ruta)
+        with self._lock:
+            if huella in self.procesados or huella in self._en_cola:
+                previo = self.procesados.get(huella, {}).get('archivo', 'otro archivo')
+                self.log_queue.put(f"⏭️ '{os.path.basename(ruta)}' ya fue procesado (mismo contenido que '{previo}').")
+                return 0
+            self._en_cola.add(huella)
+        self.log_queue.put(f"📥 Libro nuevo en cola: '{os.path.basename(ruta)}'.")
+        self._cola.put((ruta, huella))
+        return 1
+
+    # --- PROCESAMIENTO ---
+    def _atender_cola(self):
+        while True:
+            ruta, huella = self._cola.get()
+            try:
+                self.procesar(ruta, huella)
+            except Exception as e:
+                self.log_queue.put(f"❌ ERROR al procesar '{os.path.basename(ruta)}': {e}")
+            finally:
+                with self._lock:
+                    self._en_cola.discard(huella)
+                self._cola.task_done()
+
+    def procesar(self, ruta: str, huella: str):
+        """
+        Ejecuta los perfiles sobre un libro y registra su hash sólo si ningún perfil falló:
+        un libro con perfiles fallidos se vuelve a procesar si cambia o al reiniciar.
+        """
+        nombre = os.path.splitext(os.path.basename(ruta))[0]
+        carpeta_libro = os.path.join(self.carpeta_salida, nombre)
+        self.log_queue.put(f"\n🚀 Procesando '{os.path.basename(ruta)}' → {carpeta_libro}")
+        inicio = time.perf_counter()
+        # Cada libro se lee una sola vez: no vale la pena guardarlo en la caché.
+        resultados = pipeline.ejecutar_perfiles(
+            ruta, self.ruta_perfiles, carpeta_libro, self.log_queue, max_hilos=self.max_hilos,
+            usar_cache=False, ligero=self.ligero, unificar=True,
+        )
+        if resultados is None or pipeline.perfiles_fallidos(resultados):
+            self.log_queue.put(f"❌ ERROR: No se pudo procesar '{os.path.basename(ruta)}'; se reintentará si el archivo cambia.")
+            return
+        with self._lock:
+            self.procesados[huella] = {
+                'archivo': os.path.basename(ruta), 'carpeta': carpeta_libro, 'perfiles': resultados,
+                'procesado_en': datetime.now().isoformat(timespec='seconds'),
+                'segundos': round(time.perf_counter() - inicio, 2),
+            }
+            self._guardar_estado()
+        self.log_queue.put(f"✅ '{os.path.basename(ruta)}' procesado en {time.perf_counter() - inicio:.1f} s.")
+
+    def esperar_cola(self):
+        """Bloquea hasta que la cola quede vacía."""
+        self._cola.join()
+
+    def ejecutar(self, intervalo: float = INTERVALO_REVISION):
+        """Revisa la carpeta cada intervalo segundos hasta que se interrumpa (Ctrl+C)."""
+        self.log_queue.put(f"👀 Vigilando '{self.carpeta}' ({self.patron}) cada {intervalo:g} s; espera de {self.espera:g} s.")
+        while True:
+            self.revisar()
+            time.sleep(intervalo)
+
+
+def crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Procesa automáticamente los libros nuevos que llegan a una carpeta.")
+    parser.add_argument('carpeta', help="Carpeta donde llegan los libros exportados de la DGA.")
+    parser.add_argument('salida', help="Carpeta donde se escriben los resultados (una subcarpeta por libro).")
+    parser.add_argument('--perfiles', required=True, metavar='ARCHIVO', help="Lista de perfiles de filtro (JSON/YAML), como en pipeline.py.")
+    parser.add_argument('--patron', default=PATRON_LIBROS, help=f"Nombres de archivo a vigilar (por defecto '{PATRON_LIBROS}').")
+    parser.add_argument('--intervalo', type=float, default=INTERVALO_REVISION, help="Segundos entre revisiones de la carpeta.")
+    parser.add_argument('--espera', type=float, default=ESPERA_ESTABLE, help="Segundos que un libro debe quedar sin cambios antes de procesarlo.")
+    parser.add_argument('--una-vez', action='store_true', help="Procesa los libros que ya están en la carpeta y termina.")
+    parser.add_argument('--ligero', action='store_true', help="Carga sólo las columnas usadas, con tipos compactos (menor uso de memoria).")
+    parser.add_argument('--hilos', type=int, help="Perfiles procesados en paralelo (por defecto, según los núcleos).")
+    parser.add_argument('--silencioso', action='store_true', help="No muestra el registro de actividad.")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+    log = pipeline.LogConsola(silencioso=args.silencioso)
+    if not os.path.isdir(args.carpeta):
+        parser.error(f"La carpeta '{args.carpeta}' no existe.")
+    try:
+        # Los perfiles se validan al iniciar; se vuelven a leer en cada libro.
+        pipeline.cargar_perfiles(args.perfiles)
+    except (OSError, ValueError) as e:
+        parser.error(f"No se pudieron leer los perfiles: {e}")
+
+    vigilante = Vigilante(args.carpeta, args.salida, args.perfiles, log, patron=args.patron, espera=args.espera,
+                          ligero=args.ligero, max_hilos=args.hilos)
+    try:
+        if args.una_vez:
+            vigilante.revisar(sin_espera=True)
+            vigilante.esperar_cola()
+        else:
+            vigilante.ejecutar(args.intervalo)
+    except KeyboardInterrupt:
+        log.put("⏹️ Vigilancia detenida.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())